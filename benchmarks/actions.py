@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+End-to-end latency benchmark of the actions against a fake command layer.
+
+Rotating, docking and the input toggles run in-process against a
+:class:`tps.testsuite.fake.FakeMachine`. No program is started; each command
+is counted and adds a simulated latency. Run it from the top of the source
+tree::
+
+    python3 -m benchmarks.actions [--latency xrandr=0.05] [-v]
+
+For every scenario it reports the number of spawned programs, the simulated
+critical path, which is the sum of their latencies since they run one after
+the other, and the time spent in Python.
+'''
+
+import argparse
+import logging
+import statistics
+import time
+import unittest.mock
+
+import tps
+import tps.config
+import tps.dock
+import tps.input
+import tps.rotate
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+
+def _rotate(config):
+    tps.rotate.rotate_to(tps.LEFT, config)
+
+
+def _dock_on(config):
+    tps.dock.dock(True, config)
+
+
+def _dock_off(config):
+    tps.dock.dock(False, config)
+
+
+def _toggle(config_name):
+    def action(config):
+        with unittest.mock.patch('tps.input._parse_args_to_state',
+                                 return_value=None):
+            tps.input.state_change_ui(config_name)
+    return action
+
+
+def scenarios():
+    '''
+    Lists the scenarios.
+
+    :returns: List of ``(name, externals, wacom, prepare, action)`` tuples
+    :rtype: list
+    '''
+    result = []
+    for wacom in range(5):
+        result.append(('rotate, undocked, {} wacom'.format(wacom),
+                       0, wacom, None, _rotate))
+    # With more external screens the internal one is turned off when docking.
+    result.append(('rotate, docked 1 screen', 1, 3, _dock_on, _rotate))
+    for externals in range(1, 4):
+        for wacom in (0, 4):
+            result.append(('dock on, {} screens, {} wacom'.format(
+                externals, wacom), externals, wacom, None, _dock_on))
+    for externals in range(1, 4):
+        result.append(('dock off, {} screens'.format(externals),
+                       externals, 3, _dock_on, _dock_off))
+    for name in ('touchscreen_device', 'touchpad_device',
+                 'trackpoint_device'):
+        result.append(('toggle ' + name.split('_')[0], 0, 3, None,
+                       _toggle(name)))
+    return result
+
+
+def run_scenario(externals, wacom, prepare, action, latency, iterations):
+    '''
+    Runs one scenario several times, each time on a fresh machine.
+
+    :returns: Command layer of the last run and the median Python overhead
+    :rtype: tuple
+    '''
+    overheads = []
+    for i in range(iterations):
+        machine = FakeMachine(externals=externals, wacom=wacom)
+        with FakeCommandLayer(machine):
+            config = tps.config.get_config()
+            if prepare is not None:
+                prepare(config)
+        with FakeCommandLayer(machine, latency) as layer:
+            start = time.perf_counter()
+            action(config)
+            overheads.append(time.perf_counter() - start - layer.fake_time)
+    return layer, statistics.median(overheads)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the actions against a fake machine.')
+    parser.add_argument('names', nargs='*',
+                        help='Only run scenarios starting with these names.')
+    parser.add_argument('--latency', action='append', default=[],
+                        metavar='PROGRAM=SECONDS',
+                        help='Simulated run time of a program.')
+    parser.add_argument('--iterations', type=int, default=20,
+                        help='Number of runs of each scenario.')
+    parser.add_argument('-v', dest='verbose', action='store_true',
+                        help='List the spawned commands of each scenario.')
+    options = parser.parse_args()
+
+    latency = {}
+    for item in options.latency:
+        program, seconds = item.split('=')
+        latency[program] = float(seconds)
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print('{:<36} {:>7} {:>15} {:>11}'.format(
+        'scenario', 'spawns', 'critical path', 'python'))
+    for name, externals, wacom, prepare, action in scenarios():
+        if options.names and not any(name.startswith(prefix)
+                                     for prefix in options.names):
+            continue
+        layer, overhead = run_scenario(externals, wacom, prepare, action,
+                                       latency, options.iterations)
+        print('{:<36} {:>7} {:>12.1f} ms {:>8.2f} ms'.format(
+            name, len(layer.spawns), layer.critical_path * 1e3,
+            overhead * 1e3))
+        if options.verbose:
+            for command in layer.format_spawns():
+                print('    ' + command)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Scaling benchmark for the parsers of tool output.
+
+Every parser is timed on the captures from ``sample_data/X220`` and on
+synthetic outputs of growing size. Run it from the top of the source tree::
+
+    python3 -m benchmarks.parsers [--check]
+
+With ``--check`` the exit status is non-zero if a parser scales worse than
+expected.
+'''
+
+import argparse
+import math
+import sys
+import timeit
+
+import tps.hooks
+import tps.input
+import tps.network
+import tps.screen
+import tps.sound
+from tps.testsuite import synthetic
+
+SIZES = [2, 4, 8, 16, 32]
+'Scale factors for the synthetic outputs, the number of screens for xrandr'
+
+CONSTANT = 0.25
+'Highest slope that a parser which stops early may have'
+
+LINEAR = 1.3
+'Highest slope that a parser which reads everything may have'
+
+
+def _lines(data):
+    return data.splitlines(True)
+
+
+def _xrandr_verbose(size):
+    half = (size - 1) // 2
+    outputs = synthetic.make_outputs(externals=size - 1 - half, mst=half)
+    return synthetic.render_xrandr(outputs, verbose=True, properties=20)
+
+
+def _xrandr(size):
+    half = (size - 1) // 2
+    return synthetic.render_xrandr(
+        synthetic.make_outputs(externals=size - 1 - half, mst=half))
+
+
+def _xinput(size):
+    return synthetic.render_xinput(
+        synthetic.make_devices(wacom=size, extra=4 * size))
+
+
+BENCHMARKS = [
+    # Name, parser, capture, generator, limit of the slope
+    ('screen.parse_rotation',
+     lambda lines: tps.screen.parse_rotation(lines, 'LVDS1'),
+     None, lambda size: _lines(_xrandr_verbose(size)), CONSTANT),
+    ('screen.parse_resolution_and_shift',
+     lambda lines: tps.screen.parse_resolution_and_shift(lines, 'LVDS1'),
+     ('X220', 'xrandr_on'), lambda size: _lines(_xrandr(size)), CONSTANT),
+    ('screen.parse_externals',
+     lambda lines: tps.screen.parse_externals(lines, 'LVDS1'),
+     ('X220', 'xrandr_on'), lambda size: _lines(_xrandr(size)), LINEAR),
+    ('screen.get_available_screens',
+     lambda lines: tps.screen.get_available_screens(
+         b''.join(lines).decode()),
+     ('X220', 'xrandr_on'), lambda size: _lines(_xrandr(size)), LINEAR),
+    ('input.parse_xinput_id',
+     lambda lines: tps.input.parse_xinput_id(lines, 'TrackPoint'),
+     ('X220', 'xinput'), lambda size: _lines(_xinput(size)), CONSTANT),
+    ('input.parse_wacom_device_ids',
+     lambda lines: tps.input.parse_wacom_device_ids(
+         lines, r'Wacom ISD.*id=(\d+)'),
+     ('X220', 'xinput'), lambda size: _lines(_xinput(size)), LINEAR),
+    ('input.parse_device_property',
+     lambda lines: tps.input.parse_device_property(lines, 'Wacom Rotation'),
+     None, lambda size: _lines(synthetic.render_list_props(
+         'Wacom ISDv4 E6 Pen stylus', 13, properties=10 * size)), LINEAR),
+    ('network.parse_terse_line',
+     lambda lines: [tps.network.parse_terse_line(line.decode())
+                    for line in lines],
+     None, lambda size: _lines(synthetic.render_nmcli_connections(4 * size)),
+     LINEAR),
+    ('hooks.parse_graphical_user',
+     lambda lines: tps.hooks.parse_graphical_user(
+         [line.decode() for line in lines]),
+     None, lambda size: _lines(synthetic.render_who(4 * size)), LINEAR),
+    ('sound.parse_pulseaudio_sinks',
+     tps.sound.parse_pulseaudio_sinks,
+     None, lambda size: _lines(synthetic.render_pactl_sinks(size)), LINEAR),
+]
+
+
+def time_parser(parser, lines, repeat):
+    '''
+    Measures the time for a single call of the parser.
+
+    :returns: Best time in seconds
+    :rtype: float
+    '''
+    timer = timeit.Timer(lambda: parser(lines))
+    number = 1
+    while timer.timeit(number) < 0.01:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def slope(points):
+    '''
+    Computes the exponent of the scaling between the smallest and the largest
+    input, 0 for constant time and 1 for linear time.
+
+    :param list points: List of ``(bytes, seconds)`` tuples
+    :rtype: float
+    '''
+    (size_0, time_0), (size_1, time_1) = points[0], points[-1]
+    return math.log(time_1 / time_0) / math.log(size_1 / size_0)
+
+
+def run(names=None, repeat=3, stream=sys.stdout):
+    '''
+    Runs the benchmarks and prints a table for each parser.
+
+    :returns: List of ``(name, slope, limit)`` tuples
+    :rtype: list
+    '''
+    results = []
+    for name, parser, capture, generator, limit in BENCHMARKS:
+        if names and name not in names:
+            continue
+
+        print(name, file=stream)
+        print('    {:>8} {:>7} {:>9} {:>12} {:>10}'.format(
+            'input', 'lines', 'bytes', 'time/call', 'MB/s'), file=stream)
+
+        inputs = []
+        if capture is not None:
+            inputs.append(('capture', synthetic.read_sample(*capture)))
+        inputs += [(str(size), generator(size)) for size in SIZES]
+
+        points = []
+        for label, lines in inputs:
+            size = sum(map(len, lines))
+            seconds = time_parser(parser, lines, repeat)
+            if label != 'capture':
+                points.append((size, seconds))
+            print('    {:>8} {:>7} {:>9} {:>9.2f} µs {:>10.1f}'.format(
+                label, len(lines), size, seconds * 1e6, size / seconds / 1e6),
+                file=stream)
+
+        exponent = slope(points)
+        results.append((name, exponent, limit))
+        print('    slope {:.2f} (limit {:.2f})'.format(exponent, limit),
+              file=stream)
+        print(file=stream)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the parsers.')
+    parser.add_argument('names', nargs='*',
+                        help='Only run the parsers with these names.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of repetitions of each timing.')
+    parser.add_argument('--check', action='store_true',
+                        help='Fail if a parser scales worse than its limit.')
+    options = parser.parse_args()
+
+    results = run(options.names, options.repeat)
+
+    if options.check:
+        failed = [name for name, exponent, limit in results
+                  if exponent > limit]
+        for name in failed:
+            print('Scaling regression in {}'.format(name), file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Latency benchmark of the screen and input operations against a real X server.
+
+A headless ``Xvfb`` with RandR is started, see :mod:`tps.testsuite.xvfb`.
+Every operation runs several times with the real ``xrandr`` and ``xinput``.
+Run it from the top of the source tree::
+
+    python3 -m benchmarks.xvfb [--iterations 20] [--records FILE]
+
+For every operation it reports the median and the maximum wall-clock latency.
+With ``--records`` each single run is written to a JSON file together with the
+server state afterwards.
+'''
+
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+
+import tps
+import tps.input
+import tps.screen
+from tps.testsuite import xvfb
+
+
+def operations(server):
+    '''
+    Lists the operations that the server supports.
+
+    :returns: List of ``(name, function, args)`` tuples
+    :rtype: list
+    '''
+    outputs = server.outputs()
+    output = outputs[0]
+    device = server.xtest_pointer()
+    result = [
+        ('screen.rotate left', tps.screen.rotate, (output, tps.LEFT)),
+        ('screen.rotate normal', tps.screen.rotate, (output, tps.NORMAL)),
+        ('screen.get_rotation', tps.screen.get_rotation, (output,)),
+        ('screen.get_resolution_and_shift',
+         tps.screen.get_resolution_and_shift, (output,)),
+        ('input.map_rotate_input_device', tps.input.map_rotate_input_device,
+         (device, tps.LEFT.rot_mat)),
+        ('input.get_xinput_id', tps.input.get_xinput_id,
+         (xvfb.XTEST_POINTER,)),
+    ]
+    if len(outputs) > 1:
+        result += [
+            ('screen.disable', tps.screen.disable, (outputs[1],)),
+            ('screen.enable', tps.screen.enable,
+             (outputs[1], False, ('right-of', output))),
+        ]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the operations against Xvfb.')
+    parser.add_argument('--iterations', type=int, default=20,
+                        help='Number of runs of each operation.')
+    parser.add_argument('--records', metavar='FILE',
+                        help='Write every run with the server state to FILE.')
+    options = parser.parse_args()
+
+    missing = xvfb.missing_programs()
+    if missing:
+        print('Not installed: ' + ', '.join(missing), file=sys.stderr)
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    with xvfb.XvfbServer() as server:
+        print('X server {}, outputs: {}'.format(
+            server.display, ', '.join(server.outputs())))
+        print('{:<36} {:>11} {:>11}'.format('operation', 'median', 'max'))
+        for name, function, args in operations(server):
+            start = len(server.records)
+            try:
+                for i in range(options.iterations):
+                    server.timed(name, function, *args)
+            except subprocess.CalledProcessError as e:
+                print('{:<36} not supported ({})'.format(name, e))
+                continue
+            latencies = [record['latency']
+                         for record in server.records[start:]]
+            print('{:<36} {:>8.2f} ms {:>8.2f} ms'.format(
+                name, statistics.median(latencies) * 1e3,
+                max(latencies) * 1e3))
+
+    if options.records:
+        with open(options.records, 'w') as handle:
+            json.dump(server.records, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
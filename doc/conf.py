@@ -214,10 +214,18 @@ latex_documents = [
 man_pages = [
     ('man/thinkpad-dock.1', 'thinkpad-dock', 'set the screens when going to and from the docking station',
      ['Martin Ueding <mu@martin-ueding.de>'], 1),
+    ('man/thinkpad-listen.1', 'thinkpad-listen', 'start the actions on hardware events',
+     ['Martin Ueding <mu@martin-ueding.de>'], 1),
     ('man/thinkpad-mutemic.1', 'thinkpad-mutemic', 'toggle the microphone mute status',
      ['Martin Ueding <mu@martin-ueding.de>'], 1),
+    ('man/thinkpad-remap-input.1', 'thinkpad-remap-input', 'map the input devices like the last time',
+     ['Martin Ueding <mu@martin-ueding.de>'], 1),
+    ('man/thinkpad-resume.1', 'thinkpad-resume', 'restore the state after a resume from suspend',
+     ['Martin Ueding <mu@martin-ueding.de>'], 1),
     ('man/thinkpad-rotate.1', 'thinkpad-rotate', 'ThinkPad X220 Tablet screen rotation script',
      ['Martin Ueding <mu@martin-ueding.de>'], 1),
+    ('man/thinkpad-stats.1', 'thinkpad-stats', 'latency statistics from the log messages',
+     ['Martin Ueding <mu@martin-ueding.de>'], 1),
     ('man/thinkpad-touch.1', 'thinkpad-touch', 'enable/disable the touch screen',
      ['Jim Turner <jturner314@gmail.com>'], 1),
     ('man/thinkpad-touchpad.1', 'thinkpad-touchpad', 'Thinkpad TouchPad toggle script',
@@ -33,10 +33,15 @@ if __name__ == '__main__':
                 'thinkpad-config = tps.config:main',
                 'thinkpad-dock = tps.dock:main',
                 'thinkpad-dock-hook = tps.hooks:main_dock_hook',
+                'thinkpad-listen = tps.listen:main',
                 'thinkpad-mutemic = tps.sound:main_mutemic',
+                'thinkpad-remap-input = tps.main_remap_input:main',
+                'thinkpad-resume = tps.resume:main',
+                'thinkpad-resume-hook = tps.hooks:main_resume_hook',
                 'thinkpad-rotate = tps.rotate:main',
                 'thinkpad-rotate-hook = tps.hooks:main_rotate_hook',
                 'thinkpad-scripts-config-migration = tps.config:migrate_shell_config',
+                'thinkpad-stats = tps.stats:main',
                 'thinkpad-touch = tps.main_touchscreen:main',
                 'thinkpad-touchpad = tps.main_touchpad:main',
                 'thinkpad-trackpoint = tps.main_trackpoint:main',
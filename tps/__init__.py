@@ -16,6 +16,8 @@ import os
 import shlex
 import subprocess
 
+from tps import record, trace
+
 Direction = collections.namedtuple(
     'Direction', ['xrandr', 'xsetwacom', 'subpixel', 'physically_closed',
                   'rot_mat']
@@ -94,6 +96,66 @@ def translate_direction(direction):
     return result
 
 
+_program_cache = {}
+'''
+Resolved programs by name and ``PATH``.
+
+Each entry holds the modification times of the directories that were searched
+and the resulting absolute path, or ``None`` if the program was not found.
+'''
+
+
+def _is_exe(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def which(command):
+    '''
+    Resolves the given program to an absolute path.
+
+    Lookups are cached for the lifetime of the process, separately for each
+    value of ``PATH``. An entry stays valid as long as none of the directories
+    up to the one containing the program has been modified, so installing or
+    removing a program is noticed. A still valid entry costs one ``stat`` per
+    directory instead of probing for the program in each of them.
+
+    :param str command: Name of command or path to it
+    :returns: Absolute path of the program or ``None`` if it is not installed
+    :rtype: str
+    '''
+    # Check if `command` is a path to an executable
+    if os.sep in command:
+        path = os.path.abspath(os.path.expanduser(command))
+        return path if _is_exe(path) else None
+
+    # Check if `command` is an executable on PATH
+    dirs = os.get_exec_path()
+    key = (command, os.pathsep.join(dirs))
+    cached = _program_cache.get(key)
+    if cached is not None:
+        cached_dirs, cached_mtimes, path = cached
+        if cached_mtimes == [_mtime(dir) for dir in cached_dirs]:
+            return path
+
+    searched = []
+    path = None
+    for dir in dirs:
+        searched.append(dir)
+        if _is_exe(os.path.join(dir, command)):
+            path = os.path.abspath(os.path.join(dir, command))
+            break
+
+    _program_cache[key] = (searched, [_mtime(dir) for dir in searched], path)
+    return path
+
+
 def has_program(command):
     '''
     Checks whether given program is installed on this computer.
@@ -102,27 +164,15 @@ def has_program(command):
     :returns: Whether program is installed
     :rtype: bool
     '''
-    def is_exe(path):
-        return os.path.isfile(path) and os.access(path, os.X_OK)
-
-    # Check if `command` is a path to an executable
-    if os.sep in command:
-        if is_exe(os.path.expanduser(command)):
-            logger.debug('Command “{}” found.'.format(command))
-            return True
-
-    # Check if `command` is an executable on PATH
-    else:
-        for dir in os.get_exec_path():
-            if is_exe(os.path.join(dir, command)):
-                logger.debug('Command “{}” found.'.format(command))
-                return True
+    if which(command) is not None:
+        logger.debug('Command “{}” found.'.format(command))
+        return True
 
     logger.debug('Command “{}” not found.'.format(command))
     return False
 
 
-def print_command_decorate(function):
+def print_command_decorate(function, streaming=False):
     '''
     Decorates a func from the subprocess module to log the `command` parameter.
 
@@ -130,17 +180,69 @@ def print_command_decorate(function):
     the `command` parameter that is used for the logging. All other parameters
     are passed to the wrapped function.
 
+    The program is run with the absolute path from :func:`which` such that it
+    does not have to be searched on ``PATH`` again. If tracing is enabled, see
+    :mod:`tps.trace`, every command is recorded as a span. The commands can be
+    recorded and replayed with :mod:`tps.record`.
+
     :param function: Function to wrap
+    :param bool streaming: The function is a generator of output lines, the
+        span has to cover the whole iteration
     :returns: Decorated function
     '''
     @functools.wraps(function)
     def wrapper(command, local_logger, *args, **kwargs):
         shell_command = ' '.join(map(shlex.quote,command))
         local_logger.debug('subprocess “{}”'.format(shell_command))
-        return function(command, *args, **kwargs)
+        run = function
+        if record.mode is not None:
+            run = record.wrap(function, command, streaming)
+        if record.mode != 'replay':
+            path = which(command[0])
+            if path is not None:
+                command = [path] + list(command[1:])
+        if not trace.enabled():
+            return run(command, *args, **kwargs)
+
+        span = trace.command_span(shell_command)
+        if streaming:
+            return trace.trace_lines(span, run(command, *args, **kwargs))
+        with span:
+            result = run(command, *args, **kwargs)
+            trace.record_result(span, result)
+        return result
     return wrapper
 
 
+def _stream_output(command, **kwargs):
+    '''
+    Runs a command and yields the lines of its standard output as bytes.
+
+    The output is not buffered as a whole. When the caller stops iterating
+    before the end, the program is terminated and the remaining output is not
+    read. Use :func:`contextlib.closing` to make sure that this happens right
+    away.
+
+    :param list command: Command to run
+    :raises subprocess.CalledProcessError: The whole output was read and the
+        program exited with a non-zero status
+    '''
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, **kwargs)
+    complete = False
+    try:
+        for line in process.stdout:
+            yield line
+        complete = True
+    finally:
+        if not complete:
+            process.terminate()
+        process.stdout.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
 def assert_python3():
     '''
     Asserts that this is running with Python 3
@@ -170,6 +272,7 @@ def static_vars(**kwargs):
 check_call = print_command_decorate(subprocess.check_call)
 call = print_command_decorate(subprocess.call)
 check_output = print_command_decorate(subprocess.check_output)
+stream_output = print_command_decorate(_stream_output, streaming=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Orientation from the IIO accelerometer.
+
+Tablets and convertibles with an accelerometer list it as a directory like
+``/sys/bus/iio/devices/iio:device0`` with the files ``in_accel_x_raw``,
+``in_accel_y_raw`` and ``in_accel_z_raw``. At rest, the readings point
+upwards, away from the earth. If the sensor is not mounted along the axes of
+the screen, the driver may give the ``in_accel_mount_matrix`` or
+``mount_matrix`` that turns the readings into the frame of the screen.
+
+Each reading of a file makes the driver ask the sensor, which takes some
+hundred microseconds. The files are therefore kept open and read again from
+the start for every sample.
+'''
+
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = '/sys/bus/iio/devices'
+'Directory where the kernel lists the IIO devices'
+
+AXES = 'xyz'
+
+MOUNT_MATRIX_FILES = ['in_accel_mount_matrix', 'mount_matrix']
+'Files that may contain the mount matrix, in the order of preference'
+
+ANGLES = [('normal', 0), ('right', 90), ('inverted', 180), ('left', -90)]
+'''
+Angles of the upwards direction from the top edge of the screen towards the
+right edge, for each rotation of ``xrandr``
+'''
+
+FLAT = 0.4
+'''
+Fraction of the gravity that has to be in the plane of the screen to tell an
+orientation. Below this, the device lies rather flat.
+'''
+
+
+def find_accelerometer():
+    '''
+    Finds the accelerometer.
+
+    :returns: Path of the IIO device, ``None`` if there is none
+    :rtype: str
+    '''
+    try:
+        names = sorted(os.listdir(DIRECTORY))
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(DIRECTORY, name)
+        if all(os.path.exists(os.path.join(path, 'in_accel_{}_raw'.format(
+                axis))) for axis in AXES):
+            logger.debug('IIO device %s is an accelerometer.', name)
+            return path
+    return None
+
+
+def parse_mount_matrix(text):
+    '''
+    Parses a mount matrix like the IIO drivers give it.
+
+    >>> parse_mount_matrix('0, 1, 0; -1, 0, 0; 0, 0, 1\\n')
+    [[0.0, 1.0, 0.0], [-1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]
+
+    :param str text: Contents of the file
+    :returns: Rows of the matrix
+    :rtype: list
+    :raises ValueError: The text is not a 3×3 matrix
+    '''
+    rows = [[float(value) for value in row.split(',')]
+            for row in text.split(';')]
+    if len(rows) != 3 or any(len(row) != 3 for row in rows):
+        raise ValueError('Mount matrix is not 3×3: {}'.format(text.strip()))
+    return rows
+
+
+class Accelerometer(object):
+    '''
+    Open accelerometer.
+
+    :param str path: Path of the IIO device
+    :raises OSError: The files of the device cannot be opened
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.fds = []
+        try:
+            for axis in AXES:
+                self.fds.append(os.open(os.path.join(
+                    path, 'in_accel_{}_raw'.format(axis)), os.O_RDONLY))
+        except OSError:
+            self.close()
+            raise
+        self.matrix = None
+        for name in MOUNT_MATRIX_FILES:
+            try:
+                with open(os.path.join(path, name)) as handle:
+                    self.matrix = parse_mount_matrix(handle.read())
+            except (OSError, ValueError):
+                continue
+            logger.debug('Mount matrix of %s is %s.', path, self.matrix)
+            break
+
+    def read(self):
+        '''
+        Reads a sample.
+
+        :returns: Acceleration along the axes of the screen in the units of
+            the device
+        :rtype: tuple
+        :raises OSError: The device cannot be read
+        :raises ValueError: The device gave no number
+        '''
+        raw = [int(os.pread(fd, 32, 0)) for fd in self.fds]
+        if self.matrix is None:
+            return tuple(raw)
+        return tuple(sum(a * b for a, b in zip(row, raw))
+                     for row in self.matrix)
+
+    def close(self):
+        '''
+        Closes the files of the device.
+        '''
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+
+def orientation(sample, current=None, hysteresis=0):
+    '''
+    Determines how the screen is held.
+
+    The current orientation is kept until the device is turned past the
+    middle between two orientations by ``hysteresis`` degrees, so that the
+    orientation does not flip back and forth around the middle. It is also
+    kept while the device lies flat.
+
+    >>> orientation((0, 980, 0))
+    'normal'
+    >>> orientation((-980, 0, 0))
+    'left'
+    >>> orientation((700, 700, 0), 'normal', 15)
+    'normal'
+    >>> orientation((0, 100, 980), 'right')
+    'right'
+
+    :param tuple sample: Acceleration along the axes of the screen
+    :param str current: Current orientation
+    :param float hysteresis: Angle in degrees beyond the middle
+    :returns: Orientation as the rotation of ``xrandr``, ``None`` if it cannot
+        be told and there is no current one
+    :rtype: str
+    '''
+    x, y, z = sample
+    if math.hypot(x, y) < FLAT * math.sqrt(x * x + y * y + z * z):
+        return current
+    angle = math.degrees(math.atan2(x, y))
+
+    def distance(name):
+        center = dict(ANGLES)[name]
+        return abs((angle - center + 180) % 360 - 180)
+
+    if current is not None and distance(current) < 45 + hysteresis:
+        return current
+    return min((name for name, center in ANGLES), key=distance)
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Small per-user cache for values that only change with the hardware.
+
+Each entry is a JSON file in ``$XDG_CACHE_HOME/thinkpad-scripts``. An entry is
+stored together with a key that describes what it was computed from. It is only
+returned if the key is still the same, so changed hardware or configuration
+invalidates it. A missing or broken cache is never an error, the value is just
+computed again.
+'''
+
+import logging
+import os
+
+import tps.record
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'thinkpad-scripts')
+'Directory of the cache files'
+
+
+def load(name, key, directory=None):
+    '''
+    Loads an entry if it has been stored with the same key.
+
+    :param str name: Name of the entry
+    :param key: Value that can be represented in JSON
+    :param str directory: Directory of the entry if not :data:`DIRECTORY`
+    :returns: Stored value or ``None``, always ``None`` while recording or
+        replaying
+    '''
+    import json
+
+    if tps.record.isolated():
+        return None
+
+    try:
+        with open(os.path.join(directory or DIRECTORY,
+                               name + '.json')) as handle:
+            entry = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    # JSON has no tuples, compare the key in its stored form.
+    if not isinstance(entry, dict) or entry.get('key') != json.loads(
+            json.dumps(key)):
+        logger.debug('Cache entry %s is outdated.', name)
+        return None
+    return entry.get('value')
+
+
+def store(name, key, value, directory=None):
+    '''
+    Stores an entry. The file is replaced atomically, so a concurrent
+    :func:`load` sees either the old or the new entry.
+
+    :param str name: Name of the entry
+    :param key: Value that can be represented in JSON
+    :param value: Value that can be represented in JSON
+    :param str directory: Directory of the entry if not :data:`DIRECTORY`
+    :returns: Whether the entry has been stored. During a replay nothing is
+        stored and ``True`` is returned.
+    :rtype: bool
+    '''
+    import json
+
+    if tps.record.mode == 'replay':
+        logger.debug('Not storing cache entry %s during the replay.', name)
+        return True
+
+    directory = directory or DIRECTORY
+    path = os.path.join(directory, name + '.json')
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temp, 'w') as handle:
+            json.dump({'key': key, 'value': value}, handle)
+        os.replace(temp, path)
+    except OSError as e:
+        logger.debug('Unable to store cache entry %s: %s', name, e)
+        return False
+    return True
@@ -12,14 +12,11 @@ Takes care of the INI style config file for global and user configuration.
 
 import configparser
 import logging
-import logging.handlers
 import os.path
 import re
 import shlex
 import sys
 
-import pkg_resources
-
 import tps
 
 CONFIGFILE = os.path.expanduser('~/.config/thinkpad-scripts/config.ini')
@@ -28,6 +25,7 @@ CONFIGFILE = os.path.expanduser('~/.config/thinkpad-scripts/config.ini')
 logger = logging.getLogger(__name__)
 
 
+@tps.trace.traced('config')
 def get_config():
     '''
     Loads the config from the config files.
@@ -40,7 +38,10 @@ def get_config():
     '''
     config = configparser.ConfigParser(interpolation=None)
 
-    default_filename = pkg_resources.resource_filename(__name__, "default.ini")
+    # ``pkg_resources`` would give the same path but takes longer to import
+    # than the whole rest of the program needs to run.
+    default_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    'default.ini')
     logger.debug('Default configfile is %s.', default_filename)
 
     config.read(default_filename, encoding='utf-8')
@@ -179,7 +180,7 @@ def interpret_shell_line(line, config):
         config[section][subsection] = argument
 
 
-def set_up_logging(verbosity):
+def set_up_logging(verbosity, config=None):
     '''
     Sets up the logging to console and syslog.
 
@@ -187,10 +188,15 @@ def set_up_logging(verbosity):
 
     __ http://docs.python.org/3/howto/logging-cookbook.html#logging-to-multiple-destinations.
 
-    The ``address`` parameter for the syslog is taken from an answer from `dr
-    jimbob`__.
+    The records for syslog are put into a queue and sent by a background
+    thread, so a slow syslog daemon does not hold up the program. The socket
+    is only opened when the first record is sent, see
+    :class:`LazySysLogHandler`. At exit the listener sends the remaining
+    records and stops.
 
-    __ http://stackoverflow.com/a/3969772
+    :param int verbosity: Number of ``-v`` on the command line
+    :param configparser.ConfigParser config: Config that the program has
+        already loaded, it is loaded here if not given
     '''
     if verbosity == 1:
         console_log_level = logging.INFO
@@ -200,25 +206,87 @@ def set_up_logging(verbosity):
         console_log_level = logging.WARN
 
     console_format = '%(name)-13s %(levelname)-8s %(message)s'
-    syslog_format = 'thinkpad-scripts: %(name)s %(levelname)s %(message)s'
 
-    config = get_config()
+    if config is None:
+        config = get_config()
 
     logging.basicConfig(level=console_log_level, format=console_format)
 
     if config['logging'].getboolean('syslog'):
+        import atexit
+        import queue
+        from logging.handlers import QueueHandler, QueueListener
+
+        # The debug messages with the spawned commands go to syslog, the
+        # console keeps its own level. `thinkpad-stats` relies on them.
+        root = logging.getLogger('')
+        for handler in root.handlers:
+            handler.setLevel(console_log_level)
+
+        records = queue.Queue()
+        listener = QueueListener(records, LazySysLogHandler())
+        listener.start()
+        root.addHandler(QueueHandler(records))
+        root.setLevel(logging.DEBUG)
+
+        # Functions registered with `atexit` run in reverse order, the last
+        # message has to be in the queue before the listener stops.
+        atexit.register(listener.stop)
+        atexit.register(logger.debug, 'Program finished')
+
+    logger.debug('----------------------------------')
+    logger.debug('Program was started with arguments: {}'.format(sys.argv))
+
+
+class LazySysLogHandler(logging.Handler):
+    '''
+    Handler that connects to syslog when it handles its first record.
+
+    The ``address`` parameter for the syslog is taken from an answer from `dr
+    jimbob`__. If the connection fails, the records are dropped.
+
+    __ http://stackoverflow.com/a/3969772
+    '''
+
+    syslog_format = 'thinkpad-scripts: %(name)s %(levelname)s %(message)s'
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.target = None
+        self._connected = False
+
+    def connect(self):
+        '''
+        Creates the handler that writes to the syslog socket.
+
+        :returns: Handler or ``None`` if the socket cannot be opened
+        :rtype: logging.handlers.SysLogHandler
+        '''
+        from logging.handlers import SysLogHandler
+
         kwargs = {}
         dev_log = '/dev/log'
         if os.path.exists(dev_log):
             kwargs['address'] = dev_log
-        syslog = logging.handlers.SysLogHandler(**kwargs)
+        try:
+            syslog = SysLogHandler(**kwargs)
+        except OSError:
+            return None
         syslog.setLevel(logging.DEBUG)
-        formatter = logging.Formatter(syslog_format)
-        syslog.setFormatter(formatter)
-        logging.getLogger('').addHandler(syslog)
+        syslog.setFormatter(logging.Formatter(self.syslog_format))
+        return syslog
 
-    logger.debug('----------------------------------')
-    logger.debug('Program was started with arguments: {}'.format(sys.argv))
+    def emit(self, record):
+        if not self._connected:
+            self._connected = True
+            self.target = self.connect()
+        if self.target is not None:
+            self.target.handle(record)
+
+    def close(self):
+        if self.target is not None:
+            self.target.close()
+        super().close()
 
 
 class ShellParseException(Exception):
@@ -238,6 +306,14 @@ def main():
 
     :returns: None
     '''
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Prints the configuration with all defaults.')
+    tps.trace.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+
     print_config(get_config())
 
 
@@ -12,44 +12,75 @@ Logic related to the UltraBase® docks.
 import argparse
 import glob
 import logging
+import os
 import re
 import subprocess
 import sys
 
 import tps
 import tps.config
-import tps.hooks
-import tps.input
-import tps.network
+import tps.drm
+import tps.metrics
 import tps.screen
-import tps.sound
 
 logger = logging.getLogger(__name__)
 
 
+USB_DIRECTORY = '/sys/bus/usb/devices'
+'Directory where the kernel lists the USB devices'
+
+_pattern_usb_ids = re.compile(
+    r'^[0-9a-f]{4}:[0-9a-f]{4}(\|[0-9a-f]{4}:[0-9a-f]{4})*$', re.IGNORECASE)
+
+
 def is_docked(config):
     '''
     Determines whether the laptop is on a docking station.
 
     This checks for ``/sys/devices/platform/dock.*/docked``.
     In issue 129__ it
-    became apparent that this is not a sufficient solution. Therefore a
-    configuration option allows to alternatively check for USB devices that are
-    present.
+    became apparent that this is not a sufficient solution. Therefore
+    configuration options allow to alternatively check for USB devices that
+    are present.
 
     __ https://github.com/martin-ueding/thinkpad-scripts/issues/129
 
     :returns: True if laptop is docked
     :rtype: bool
     '''
+    ids = get_usb_indicator_ids(config)
     regex = config['dock']['lsusb_indicator_regex']
-    if len(regex) > 0:
+    if ids:
+        logger.debug('Using the USB devices in sysfs to determine docking '
+                     'status.')
+        return _is_docked_usb(ids)
+    elif len(regex) > 0:
         logger.debug('Using lsusb to determine docking status.')
         return _is_docked_lsusb(regex)
     else:
         logger.debug('Using sysfs to determine docking status.')
         return _is_docked_sys_platform()
 
+def get_usb_indicator_ids(config):
+    '''
+    Gives the IDs of the USB devices that indicate the docking station.
+
+    These are the ones in ``dock.usb_indicator_ids``, or the ones in
+    ``dock.lsusb_indicator_regex`` if that only lists IDs.
+
+    :param configparser.ConfigParser config: Global config
+    :returns: IDs like ``273f:1007``, empty if the devices are not configured
+        or can only be found with ``lsusb``
+    :rtype: list
+    '''
+    ids = config['dock']['usb_indicator_ids'].split()
+    regex = config['dock']['lsusb_indicator_regex']
+    if not ids and _pattern_usb_ids.match(regex):
+        # A regular expression that only lists IDs does not need lsusb.
+        ids = regex.split('|')
+    return ids
+
+
 def _is_docked_sys_platform():
     '''
     Determines the docking status from ``/sys/devices/platform/dock.*/docked``.
@@ -75,8 +106,53 @@ def _is_docked_lsusb(regex):
     return bool(match)
 
 
+def _is_docked_usb(ids):
+    '''
+    Checks whether one of the USB devices is present.
+    '''
+    found = get_usb_device_ids() & {id.lower() for id in ids}
+    if found:
+        logger.info('Docking USB device %s found.', ', '.join(sorted(found)))
+        return True
+    logger.info('No docking USB device found.')
+    return False
+
 
-def select_docking_screens(internal, primary='', secondary=''):
+def get_usb_device_ids():
+    '''
+    Lists the IDs of the attached USB devices.
+
+    The kernel has the vendor and product ID of every device in the
+    ``idVendor`` and ``idProduct`` files in :data:`USB_DIRECTORY`. Reading
+    them takes far less time than ``lsusb``, which also looks up the names of
+    all devices.
+
+    :returns: IDs like ``273f:1007``
+    :rtype: set
+    '''
+    try:
+        names = os.listdir(USB_DIRECTORY)
+    except OSError:
+        return set()
+
+    ids = set()
+    for name in names:
+        # The interfaces of the devices are listed as well, like ``1-1:1.0``.
+        if ':' in name:
+            continue
+        path = os.path.join(USB_DIRECTORY, name)
+        try:
+            with open(os.path.join(path, 'idVendor')) as handle:
+                vendor = handle.read().strip()
+            with open(os.path.join(path, 'idProduct')) as handle:
+                product = handle.read().strip()
+        except OSError:
+            continue
+        ids.add('{}:{}'.format(vendor, product).lower())
+    return ids
+
+
+def select_docking_screens(internal, primary='', secondary='', config=None):
     '''
     Selects the primary, secondary, and remaining screens when docking.
 
@@ -92,6 +168,8 @@ def select_docking_screens(internal, primary='', secondary=''):
     :param str internal: Name of the internal screen
     :param str primary: Name of primary screen, or an empty string
     :param str secondary: Name of secondary screen, or an empty string
+    :param configparser.ConfigParser config: Global config, passed on to
+        :func:`tps.screen.get_externals`
     :returns: (`primary`, `secondary`, [`other1`, ...])
     :rtype: tuple
 
@@ -125,7 +203,7 @@ def select_docking_screens(internal, primary='', secondary=''):
     logger.debug('select_docking_screens(internal=%s, primary=%s, secondary=%s)', str(internal),
                  str(primary), str(secondary))
 
-    screens = tps.screen.get_externals(internal) + [internal]
+    screens = tps.screen.get_externals(internal, config) + [internal]
     for index, screen in enumerate([primary, secondary]):
         if screen in screens:
             screens.remove(screen)
@@ -136,54 +214,116 @@ def select_docking_screens(internal, primary='', secondary=''):
     return screens[0], screens[1] if len(screens) > 1 else None, screens[2:]
 
 
-def dock(on, config):
+def _arrange_docking_screens(internal, config):
+    '''
+    Arranges the screens as configured in the ``screen`` section.
+
+    :param str internal: Name of the internal screen
+    :param configparser.ConfigParser config: Global config
+    :returns: Names of the primary and the secondary screen, the latter is
+        ``None`` if there is only one screen
+    :rtype: tuple
+    '''
+    primary, secondary, others = select_docking_screens(
+        internal,
+        config['screen']['primary'],
+        config['screen']['secondary'],
+        config)
+
+    logger.debug('primary: %s, secondary: %s, others: %s', str(primary),
+                 str(secondary), str(others))
+    if secondary is None:
+        # This is the only screen.
+        tps.screen.enable(primary, primary=True)
+    else:
+        # Disable all but one screen (xrandr complains otherwise).
+        for screen in others[:-1]:
+            tps.screen.disable(screen)
+        # Enable one screen.
+        tps.screen.enable(secondary)
+        # It's now safe to disable the last other screen.
+        if others:
+            tps.screen.disable(others[-1])
+        # Enable the primary screen.
+        tps.screen.enable(primary)
+        # Need to call this separately to work around bugs in xrandr/X11.
+        tps.screen.enable(
+            primary, primary=True,
+            position=(config['screen']['relative_position'], secondary))
+
+        if not config['screen'].getboolean('internal_docked_on'):
+            logger.info('Internal screen is supposed to be off when '
+                        'docked, turning it off.')
+            tps.screen.disable(internal)
+
+    return primary, secondary
+
+
+@tps.trace.traced('action')
+def dock(on, config, wait=False):
     '''
     Performs the makroscopic docking action.
 
     :param bool on: Desired state
     :param configparser.ConfigParser config: Global config
+    :param bool wait: Wait for the screens behind the docking station to be
+        connected, see :func:`tps.drm.wait_for_outputs`
     :returns: None
     '''
+    # These are only needed when actually docking, so they are not loaded
+    # when the program exits early because of a disabled trigger.
+    import tps.hooks
+    import tps.input
+    import tps.layout
+    import tps.network
+    import tps.resume
+    import tps.sound
+
     logger.info('dock({})'.format(on))
+
+    max_wait = config['dock'].getfloat('wait_for_screens')
+    if on and wait and max_wait > 0 \
+       and config['screen'].getboolean('drm_status'):
+        tps.drm.wait_for_outputs(tps.screen.get_internal(config), max_wait,
+                                 config['dock'].getfloat('settle_time'),
+                                 empty=config['dock'].getfloat('empty_time'))
+
     tps.hooks.predock(on, config)
 
     if on:
+        # New screens are attached to the docking station. Let the X server
+        # find them once, all following queries use the current state. The
+        # names tell whether the cached internal screen is still valid.
+        outputs = tps.screen.probe()
+        tps.screen.check_internal(config, outputs)
+
         if config['sound'].getboolean('unmute'):
             tps.sound.unmute(config['sound']['dock_loudness'])
 
         if config['screen'].getboolean('set_brightness'):
             tps.screen.set_brightness(config['screen']['brightness'])
 
-        primary, secondary, others = select_docking_screens(
-            tps.screen.get_internal(config),
-            config['screen']['primary'],
-            config['screen']['secondary'])
-
-        logger.debug('primary: %s, secondary: %s, others: %s', str(primary),
-                     str(secondary), str(others))
-        if secondary is None:
-            # This is the only screen.
-            tps.screen.enable(primary, primary=True)
-        else:
-            # Disable all but one screen (xrandr complains otherwise).
-            for screen in others[:-1]:
-                tps.screen.disable(screen)
-            # Enable one screen.
-            tps.screen.enable(secondary)
-            # It's now safe to disable the last other screen.
-            if others:
-                tps.screen.disable(others[-1])
-            # Enable the primary screen.
-            tps.screen.enable(primary)
-            # Need to call this separately to work around bugs in xrandr/X11.
-            tps.screen.enable(
-                primary, primary=True,
-                position=(config['screen']['relative_position'], secondary))
-
-            if not config['screen'].getboolean('internal_docked_on'):
-                logger.info('Internal screen is supposed to be off when '
-                            'docked, turning it off.')
-                tps.screen.disable(tps.screen.get_internal(config))
+        internal = tps.screen.get_internal(config)
+        edids = layout = None
+        if config['dock'].getboolean('layout_profiles'):
+            edids = tps.layout.read_edids(internal, config)
+            layout = tps.layout.load(edids, config,
+                                     tps.layout.current_rotation(internal))
+
+        if layout is None or not tps.layout.apply(layout):
+            _arrange_docking_screens(internal, config)
+            layout = tps.layout.capture(internal)
+            if edids is not None:
+                tps.layout.store(edids, config, layout)
+
+        # The layout includes the rotation of the internal screen. It only
+        # applies to the same monitors after a resume.
+        if edids is None:
+            edids = tps.layout.read_edids(internal, config)
+        tps.resume.record('layout', dict(
+            layout, fingerprint=tps.layout.fingerprint(edids)))
+        tps.resume.record('rotation', layout['rotation'] and {
+            'output': internal, 'rotation': layout['rotation']})
 
         if config['network'].getboolean('disable_wifi') \
            and tps.network.has_ethernet():
@@ -201,17 +341,15 @@ def dock(on, config):
             except subprocess.CalledProcessError:
                 logger.warning('unable to restart ethernet connection')
 
-        if primary == tps.screen.get_internal(config) or \
-           secondary == tps.screen.get_internal(config):
-            try:
-                tps.input.map_rotate_all_input_devices(
-                    tps.screen.get_internal(config),
-                    tps.screen.get_rotation(tps.screen.get_internal(config)))
-            except tps.screen.ScreenNotFoundException as e:
-                logger.error('Unable to map input devices to "{}": {}'.format(
-                    tps.screen.get_internal(config), e))
+        # The geometry of the internal screen is known from the layout.
+        if layout['matrix'] is not None:
+            tps.input.map_rotate_all_input_devices(
+                internal, tps.translate_direction(layout['rotation']),
+                layout['matrix'])
 
     else:
+        # The screens that have just been unplugged are still enabled, so the
+        # state of the X server is needed here, not the one from sysfs.
         externals = tps.screen.get_externals(tps.screen.get_internal(config))
         # Disable all but one screen (xrandr complains otherwise).
         for external in externals[:-1]:
@@ -228,6 +366,8 @@ def dock(on, config):
         if config['network'].getboolean('disable_wifi'):
             tps.network.set_wifi(True)
 
+        tps.resume.record('layout', None)
+
         try:
             tps.input.map_rotate_all_input_devices(
                 tps.screen.get_internal(config),
@@ -239,6 +379,28 @@ def dock(on, config):
     tps.hooks.postdock(on, config)
 
 
+def save_layout(config):
+    '''
+    Stores the current arrangement of the screens as the layout for the
+    connected monitors.
+
+    This allows to arrange the screens with any tool and have that layout
+    restored by the following docks.
+
+    :param configparser.ConfigParser config: Global config
+    :returns: None
+    '''
+    import tps.layout
+
+    internal = tps.screen.get_internal(config)
+    edids = tps.layout.read_edids(internal, config)
+    if not tps.layout.store(edids, config, tps.layout.capture(internal)):
+        logger.error('Unable to store the layout in %s.',
+                     tps.layout.DIRECTORY)
+        sys.exit(1)
+    logger.info('Stored the layout for %s.', ', '.join(sorted(edids)))
+
+
 def main():
     '''
     Command line entry point.
@@ -249,7 +411,8 @@ def main():
     config = tps.config.get_config()
 
     # Quickly abort if the call is by the hook and the user disabled the
-    # trigger.
+    # trigger. This happens before the logging is set up, which starts a
+    # thread for syslog. The deprecation warnings still go to the console.
     if options.via_hook is not None:
         if 'enable_dock' in config['trigger']:
             # The user has this key in his configuration. The default does not
@@ -262,29 +425,36 @@ def main():
         elif options.via_hook not in config['trigger']['dock_triggers'].split():
             sys.exit(0)
 
-    if options.state == 'on':
-        desired = True
-    elif options.state == 'off':
-        desired = False
-    elif options.state is None:
-        desired = is_docked(config)
-    else:
-        logging.error('Desired state “%s” cannot be understood.',
-                      options.state)
-        sys.exit(1)
+    tps.config.set_up_logging(options.verbose, config)
+
+    if options.save_layout:
+        save_layout(config)
+        return
+
+    with tps.metrics.Action('dock', config, options.via_hook) as action:
+        if options.state == 'on':
+            desired = True
+        elif options.state == 'off':
+            desired = False
+        elif options.state is None:
+            desired = is_docked(config)
+        else:
+            logging.error('Desired state “%s” cannot be understood.',
+                          options.state)
+            sys.exit(1)
 
-    logger.info('Desired is {}'.format(desired))
+        logger.info('Desired is {}'.format(desired))
+        action.name = 'dock_on' if desired else 'dock_off'
 
-    dock(desired, config)
+        # The hook is triggered by the docking station itself, the screens
+        # behind it may not be connected yet.
+        dock(desired, config, wait=options.via_hook is not None)
 
 
 def _parse_args():
     """
     Parses the command line arguments.
 
-    If the logging module is imported, set the level according to the number of
-    ``-v`` given on the command line.
-
     :return: Namespace with arguments.
     :rtype: Namespace
     """
@@ -296,9 +466,16 @@ def _parse_args():
                              'times for even more verbosity.')
     parser.add_argument('--via-hook', help='Let the program know that it was called using the specified hook. You do not need to care about this.')
 
-    options = parser.parse_args()
+    parser.add_argument('--save-layout', action='store_true',
+                        help='Store the current arrangement of the screens '
+                             'for the connected monitors and use it when '
+                             'docking with them again.')
 
-    tps.config.set_up_logging(options.verbose)
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
 
     return options
 
@@ -0,0 +1,328 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Screen connectors from the kernel's DRM sysfs.
+
+The kernel lists every connector of the graphics cards as a directory like
+``/sys/class/drm/card0-LVDS-1`` with a ``status`` file that says whether a
+screen is connected. Reading it takes some microseconds and does not make the
+graphics driver probe the screens over DDC, which ``xrandr`` without
+``--current`` does and which makes some monitors blink.
+
+The X server names the connectors differently. The generic modesetting driver
+calls ``card0-HDMI-A-1`` ``HDMI-1``, the Intel driver calls it ``HDMI1``.
+Which of the two is in use is inferred from the name of the internal screen.
+The screens behind a DisplayPort MST hub do not follow this scheme, the kernel
+calls them like ``card0-DP-4`` and X like ``DP2-1``. Each name is therefore
+checked against the outputs that the X server had in its last ``xrandr``
+query, see :func:`store_x_outputs`.
+'''
+
+import logging
+import os
+import re
+import time
+
+import tps
+import tps.cache
+import tps.record
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = '/sys/class/drm'
+'Directory where the kernel lists the graphics cards and their connectors'
+
+X_TYPES = {
+    'DVI-A': ('DVI-A', 'DVI'),
+    'DVI-D': ('DVI-D', 'DVI'),
+    'DVI-I': ('DVI-I', 'DVI'),
+    'HDMI-A': ('HDMI', 'HDMI'),
+    'HDMI-B': ('HDMI-B', 'HDMI'),
+}
+'''
+Connector types whose name in X differs from the kernel name, with the names
+of the modesetting and the Intel driver
+'''
+
+POLL_INTERVAL = 0.1
+'Interval to read the connectors if there are no uevents, in seconds'
+
+_pattern_connector = re.compile(
+    r'^card(?P<card>\d+)-(?P<type>.+)-(?P<index>\d+)$')
+
+
+def connectors():
+    '''
+    Lists the connectors of all graphics cards.
+
+    This only lists a directory in sysfs and takes some microseconds.
+
+    :returns: Names like ``card0-LVDS-1``, sorted. Empty if there is no DRM
+        sysfs or while recording or replaying, see :func:`tps.record.isolated`.
+    :rtype: list
+    '''
+    if tps.record.isolated():
+        return []
+    try:
+        names = os.listdir(DIRECTORY)
+    except OSError:
+        return []
+    return sorted(name for name in names
+                  if name.startswith('card') and '-' in name)
+
+
+def x_names(connector):
+    '''
+    Gives the names that the X server may use for a connector.
+
+    >>> x_names('card0-HDMI-A-1')
+    ['HDMI-1', 'HDMI1']
+    >>> x_names('card0-LVDS-1')
+    ['LVDS-1', 'LVDS1']
+
+    :param str connector: Name of the connector in sysfs
+    :returns: Name with the modesetting driver and name with the Intel driver,
+        empty if the connector name cannot be understood
+    :rtype: list
+    '''
+    m_connector = _pattern_connector.match(connector)
+    if not m_connector:
+        return []
+    kind = m_connector.group('type')
+    index = m_connector.group('index')
+    modesetting, intel = X_TYPES.get(kind, (kind, kind))
+    return [modesetting + '-' + index, intel + index]
+
+
+def store_x_outputs(names):
+    '''
+    Stores the names of all outputs of the X server.
+
+    The entry is only valid as long as the kernel has the same connectors, so
+    outputs that come and go with an MST hub are queried again.
+
+    :param list names: Names of the outputs, connected or not
+    '''
+    tps.cache.store('x-outputs', {'connectors': connectors()}, names)
+
+
+def x_outputs():
+    '''
+    Loads the names of the outputs of the X server.
+
+    :returns: Names stored by :func:`store_x_outputs`, ``None`` if there are
+        none for the current connectors
+    :rtype: list
+    '''
+    return tps.cache.load('x-outputs', {'connectors': connectors()})
+
+
+def read_attribute(connector, attribute):
+    '''
+    Reads an attribute file of a connector.
+
+    :param str connector: Name of the connector in sysfs
+    :param str attribute: Name of the file like ``status`` or ``enabled``
+    :returns: Contents without the trailing newline, ``None`` if the file
+        cannot be read or while recording or replaying
+    :rtype: str
+    '''
+    if tps.record.isolated():
+        return None
+    try:
+        with open(os.path.join(DIRECTORY, connector, attribute)) as handle:
+            return handle.read().strip()
+    except OSError:
+        return None
+
+
+def _connector_id(connector):
+    # The X drivers list their outputs in the order of the kernel connector
+    # IDs. Older kernels do not have this file, keep the order of the names.
+    value = read_attribute(connector, 'connector_id')
+    return int(value) if value and value.isdigit() else 0
+
+
+def _connected(internal):
+    names = connectors()
+    scheme = card = None
+    for connector in names:
+        candidates = x_names(connector)
+        if internal in candidates:
+            scheme = candidates.index(internal)
+            card = connector.split('-', 1)[0]
+            break
+    if scheme is None:
+        logger.debug('No DRM connector matches the internal screen %s.',
+                      internal)
+        return None
+
+    outputs = x_outputs()
+    if outputs is None:
+        logger.debug('The outputs of the X server are not known.')
+        return None
+
+    connected = []
+    for connector in names:
+        if read_attribute(connector, 'status') != 'connected':
+            continue
+        if connector.split('-', 1)[0] != card:
+            logger.debug('Screen connected to %s on another card.', connector)
+            return None
+        name = x_names(connector)[scheme]
+        if name not in outputs:
+            logger.debug('The X server has no output %s for %s.', name,
+                         connector)
+            return None
+        connected.append((_connector_id(connector), name, connector))
+
+    return [(name, connector)
+            for connector_id, name, connector in sorted(connected)]
+
+
+@tps.trace.traced('parse')
+def connected_outputs(internal):
+    '''
+    Lists the connected screens with their names in the X server.
+
+    Only the graphics card with the internal screen is considered. If another
+    card has a screen connected, or a connected screen has no output of that
+    name in the X server, like behind an MST hub, ``None`` is returned as
+    well.
+
+    :param str internal: Name of the internal screen in the X server
+    :returns: Names of the connected outputs in the order of ``xrandr``,
+        ``None`` if the connectors cannot be mapped to the X outputs
+    :rtype: list
+    '''
+    connected = _connected(internal)
+    if connected is None:
+        return None
+    return [name for name, connector in connected]
+
+
+def connected_edids(internal):
+    '''
+    Reads the EDIDs of the connected screens.
+
+    The kernel has them in the binary ``edid`` file of each connector. Screens
+    without an EDID, like some projectors, have an empty file.
+
+    :param str internal: Name of the internal screen in the X server
+    :returns: Dictionary from the names of the outputs in the X server to the
+        EDIDs, ``None`` if the connectors cannot be mapped to the X outputs
+    :rtype: dict
+    '''
+    connected = _connected(internal)
+    if connected is None:
+        return None
+    edids = {}
+    for name, connector in connected:
+        try:
+            with open(os.path.join(DIRECTORY, connector, 'edid'),
+                      'rb') as handle:
+                edids[name] = handle.read()
+        except OSError:
+            edids[name] = b''
+    return edids
+
+
+def _states():
+    return [(connector, read_attribute(connector, 'status'))
+            for connector in connectors()]
+
+
+def _internal_connector(internal):
+    for connector in connectors():
+        if internal in x_names(connector):
+            return connector
+    return None
+
+
+def wait_for_outputs(internal, max_wait, settle, sock=None, empty=None):
+    '''
+    Waits until the screens behind a docking station are connected.
+
+    The docking station is announced before the screens on its DisplayPort
+    connectors are. This waits until at least one external screen is
+    connected and nothing changed during the settle time, or the maximum time
+    has passed. A docking station without screens is recognized when no
+    external screen is connected and none of the connectors changed their
+    status during the empty time. The connectors are read again whenever the
+    kernel sends a DRM uevent. If the uevents are not available, they are read
+    every :data:`POLL_INTERVAL`.
+
+    Only the status of the connectors in sysfs is watched, connectors that an
+    MST hub adds while waiting count like any other. They are mapped to the
+    outputs of the X server once the screens have settled.
+
+    :param str internal: Name of the internal screen in the X server
+    :param float max_wait: Maximum time to wait in seconds
+    :param float settle: Time in seconds without changes after which the
+        screens are considered complete
+    :param socket.socket sock: Socket to receive the uevents from, one is
+        opened if not given
+    :param float empty: Time in seconds without changes after which there are
+        considered to be no external screens, ``None`` to wait for the
+        maximum time then
+    :returns: Names of the connected outputs like :func:`connected_outputs`
+        gives them, ``None`` without waiting if the internal screen has no
+        connector
+    :rtype: list
+    '''
+    import tps.uevent
+
+    start = changed = time.monotonic()
+    deadline = start + max_wait
+    own = _internal_connector(internal)
+    if own is None:
+        logger.debug('No DRM connector matches the internal screen %s.',
+                     internal)
+        return None
+    states = _states()
+
+    own_socket = sock is None
+    if own_socket:
+        sock = tps.uevent.open_socket()
+    try:
+        while True:
+            now = time.monotonic()
+            externals = sum(status == 'connected' and connector != own
+                            for connector, status in states)
+            quiet = settle if externals > 0 else empty
+            if quiet is not None and now - changed >= quiet:
+                if externals == 0:
+                    logger.info('No screens connected after %.3f s.',
+                                now - start)
+                break
+            if now >= deadline:
+                logger.info('Screens did not settle within %g s.', max_wait)
+                break
+            if quiet is not None:
+                timeout = min(deadline, changed + quiet) - now
+            else:
+                timeout = deadline - now
+
+            if sock is None:
+                time.sleep(min(timeout, POLL_INTERVAL))
+            else:
+                event = tps.uevent.receive(sock, timeout)
+                if event is None or event.get('SUBSYSTEM') != 'drm':
+                    continue
+
+            current = _states()
+            if current == states:
+                continue
+            states = current
+            changed = time.monotonic()
+            logger.debug('Connected after %.3f s: %s', changed - start,
+                         ', '.join(connector for connector, status in states
+                                   if status == 'connected'))
+    finally:
+        if own_socket and sock is not None:
+            sock.close()
+
+    return connected_outputs(internal)
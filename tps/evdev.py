@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Switches of the kernel's evdev input devices.
+
+Convertibles like the newer ThinkPad Yoga report the position of the hinge as
+the ``SW_TABLET_MODE`` switch of an input device, often called ``Intel HID
+switches`` or ``ThinkPad Extra Buttons``. The devices are listed in
+``/sys/class/input`` with their capabilities. Reading ``/dev/input/event*``
+gives a stream of ``struct input_event``, which consist of a timestamp, the
+type and code of the event and its value.
+'''
+
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = '/sys/class/input'
+'Directory where the kernel lists the input devices'
+
+DEVICE_DIRECTORY = '/dev/input'
+'Directory with the device files of the input devices'
+
+EVENT = struct.Struct('llHHi')
+'Layout of ``struct input_event`` on this machine'
+
+EV_SYN = 0x00
+EV_SW = 0x05
+SYN_DROPPED = 3
+SW_TABLET_MODE = 0x01
+
+
+def find_switch(code=SW_TABLET_MODE):
+    '''
+    Finds the input device that has a switch.
+
+    :param int code: Code of the switch
+    :returns: Path of the device file, ``None`` if there is no such device
+    :rtype: str
+    '''
+    try:
+        names = os.listdir(DIRECTORY)
+    except OSError:
+        return None
+    for name in sorted(names, key=_event_number):
+        if not name.startswith('event'):
+            continue
+        path = os.path.join(DIRECTORY, name, 'device', 'capabilities', 'sw')
+        try:
+            with open(path) as handle:
+                capabilities = parse_bitmask(handle.read())
+        except (OSError, ValueError):
+            continue
+        if capabilities >> code & 1:
+            logger.debug('Input device %s has switch %d.', name, code)
+            return os.path.join(DEVICE_DIRECTORY, name)
+    return None
+
+
+def _event_number(name):
+    digits = name[len('event'):]
+    return int(digits) if digits.isdigit() else -1
+
+
+def parse_bitmask(text):
+    '''
+    Parses a bitmask of capabilities like sysfs shows it.
+
+    The kernel writes the bitmask as hexadecimal words of the size of a
+    ``long``, with the most significant word first.
+
+    >>> parse_bitmask('1 0\\n') == 1 << (8 * struct.calcsize('l'))
+    True
+    >>> parse_bitmask('2\\n')
+    2
+
+    :param str text: Contents of the file
+    :rtype: int
+    :raises ValueError: The text is not a bitmask
+    '''
+    bits = 8 * struct.calcsize('l')
+    result = 0
+    for word in text.split():
+        result = result << bits | int(word, 16)
+    return result
+
+
+def read_switch(fd, code=SW_TABLET_MODE):
+    '''
+    Reads the current state of a switch with the ``EVIOCGSW`` ioctl.
+
+    :param int fd: Open device file
+    :param int code: Code of the switch
+    :returns: State of the switch, ``None`` if the file is no input device
+    :rtype: bool
+    '''
+    import fcntl
+
+    length = (code // 8) + 1
+    # _IOC(_IOC_READ, 'E', 0x1b, length)
+    request = 2 << 30 | length << 16 | ord('E') << 8 | 0x1b
+    try:
+        states = fcntl.ioctl(fd, request, bytes(length))
+    except OSError as e:
+        logger.debug('Unable to read the switch state: %s', e)
+        return None
+    return bool(states[code // 8] >> (code % 8) & 1)
+
+
+def parse(data):
+    '''
+    Splits the data read from a device file into events.
+
+    >>> parse(EVENT.pack(0, 0, EV_SW, SW_TABLET_MODE, 1) + b'\\0')
+    ([(5, 1, 1)], b'\\x00')
+
+    :param bytes data: Data read from the device file
+    :returns: List of events as tuples of type, code and value, and the
+        incomplete rest of the data
+    :rtype: tuple
+    '''
+    end = len(data) - len(data) % EVENT.size
+    events = [(type_, code, value) for seconds, microseconds, type_, code, value
+              in EVENT.iter_unpack(data[:end])]
+    return events, data[end:]
@@ -21,6 +21,7 @@ import tps.config
 logger = logging.getLogger(__name__)
 
 
+@tps.trace.traced('hook')
 def prerotate(direction, config):
     '''
     Executes prerotate hook if it exists.
@@ -34,6 +35,7 @@ def prerotate(direction, config):
         tps.call([hook, direction.xrandr], logger)
 
 
+@tps.trace.traced('hook')
 def postrotate(direction, config):
     '''
     Executes postrotate hook if it exists.
@@ -47,6 +49,7 @@ def postrotate(direction, config):
         tps.call([hook, direction.xrandr], logger)
 
 
+@tps.trace.traced('hook')
 def predock(state, config):
     '''
     Executes predock hook if it exists.
@@ -60,6 +63,7 @@ def predock(state, config):
         tps.call([hook, 'on' if state else 'off'], logger)
 
 
+@tps.trace.traced('hook')
 def postdock(state, config):
     '''
     Executes postdock hook if it exists.
@@ -79,6 +83,7 @@ def get_graphicsl_user():
     return parse_graphical_user(lines)
 
 
+@tps.trace.traced('parse')
 def parse_graphical_user(lines):
     '''Determine the graphical user from the output of ``who -u``.'''
     # If there is a single user, choose them.
@@ -110,7 +115,11 @@ def main_rotate_hook():
     parser.add_argument("-v", dest='verbose', action="count",
                         help='Enable verbose output. Can be supplied multiple '
                              'times for even more verbosity.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
     options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
     tps.config.set_up_logging(options.verbose)
 
     if options.direction is not None:
@@ -147,7 +156,11 @@ def main_dock_hook():
     parser.add_argument("-v", dest='verbose', action="count",
                         help='Enable verbose output. Can be supplied multiple '
                              'times for even more verbosity.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
     options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
     tps.config.set_up_logging(options.verbose)
 
     if options.action is not None:
@@ -167,3 +180,36 @@ def main_dock_hook():
         action +
         ['--via-hook', options.via_hook],
         logger)
+
+
+def main_resume_hook():
+    '''
+    Entry point for ``thinkpad-resume-hook``.
+
+    It is called by systemd after a resume and starts ``thinkpad-resume`` for
+    the graphical user.
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--via-hook', required=True,
+                        help='ID of hook that called this program')
+    parser.add_argument("-v", dest='verbose', action="count",
+                        help='Enable verbose output. Can be supplied multiple '
+                             'times for even more verbosity.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
+    tps.config.set_up_logging(options.verbose)
+
+    user = get_graphicsl_user()
+    if user is None:
+        logger.warning('Unable to get graphical user. Ignoring trigger.')
+        sys.exit(0)
+
+    tps.check_call(
+        ['sudo', '-u', user, '-i',
+         'env', 'DISPLAY=:0.0',
+         '/usr/local/bin/thinkpad-resume',
+         '--via-hook', options.via_hook],
+        logger)
@@ -9,11 +9,15 @@ Logic related to input devices.
 '''
 
 import argparse
+import contextlib
 import logging
 import re
 
 import tps
+import tps.cache
 import tps.config
+import tps.drm
+import tps.metrics
 import tps.screen
 
 logger = logging.getLogger(__name__)
@@ -41,9 +45,22 @@ def get_wacom_device_ids():
 
     regex = config['touch']['regex']
     logger.debug('Using “%s” as regex to find Wacom devices.', regex)
+    with contextlib.closing(tps.stream_output(['xinput'], logger)) as lines:
+        ids = parse_wacom_device_ids(lines, regex)
+    tps.metrics.annotate(devices=len(ids))
+    return ids
+
+
+@tps.trace.traced('parse')
+def parse_wacom_device_ids(lines, regex):
+    '''
+    Finds the IDs of the devices matching the regex in the ``xinput`` listing.
+
+    :param lines: Lines of the output as bytes
+    :param str regex: Regular expression with the ID as first group
+    :rtype: list
+    '''
     pattern = re.compile(regex.encode())
-    output = tps.check_output(['xinput'], logger)
-    lines = output.split(b'\n')
     ids = []
     for line in lines:
         matcher = pattern.search(line)
@@ -66,14 +83,22 @@ def map_rotate_input_device(device, matrix):
     )
 
 
-def map_rotate_all_input_devices(output, orientation):
+def map_rotate_all_input_devices(output, orientation, matrix=None):
     '''
     Maps all Wacom® devices.
+
+    :param str output: Name of the output to map to
+    :param tps.Direction orientation: Rotation of the output
+    :param list matrix: Coordinate transformation matrix that is already
+        known, it is computed from the output of ``xrandr`` otherwise
+    :returns: IDs of the devices
+    :rtype: list
     '''
     config = tps.config.get_config()
 
-    matrix = generate_xinput_coordinate_transformation_matrix(output,
-                                                              orientation)
+    if matrix is None:
+        matrix = generate_xinput_coordinate_transformation_matrix(
+            output, orientation)
     wacom_device_ids = get_wacom_device_ids()
 
     logger.info('Mapping and rotating all input devices.')
@@ -87,6 +112,150 @@ def map_rotate_all_input_devices(output, orientation):
             map_rotate_input_device(device, matrix)
             #wacom_rotate_reset(device)
 
+    store_mapping(output, orientation, matrix)
+    return wacom_device_ids
+
+
+def _mapping_key():
+    return {'connectors': tps.drm.connectors()}
+
+
+def store_mapping(output, orientation, matrix):
+    '''
+    Remembers the mapping that was applied last, see :func:`remap`.
+
+    The mapping is stored in the ``input-mapping`` entry of :mod:`tps.cache`.
+
+    :param str output: Name of the output that the devices are mapped to
+    :param tps.Direction orientation: Rotation of the output
+    :param list matrix: Coordinate transformation matrix
+    '''
+    tps.cache.store('input-mapping', _mapping_key(), {
+        'output': output,
+        'rotation': orientation.xrandr,
+        'matrix': matrix,
+    })
+
+
+def load_mapping():
+    '''
+    Loads the mapping that was applied last.
+
+    :returns: Dictionary with ``output``, ``rotation`` and ``matrix``, ``None``
+        if no mapping has been applied on this hardware
+    :rtype: dict
+    '''
+    return tps.cache.load('input-mapping', _mapping_key())
+
+
+def remap(lost_only=False):
+    '''
+    Applies the mapping that was applied last to the input devices that are
+    present now.
+
+    This does not query ``xrandr``, it is meant for devices that lost their
+    mapping while the screens stayed the same, like after a resume or when
+    the X server adds a Wacom device again.
+
+    :param bool lost_only: Read the properties of each device first and only
+        map those whose rotation or matrix differ from the mapping
+    :returns: IDs of the devices that were mapped, ``None`` if no mapping
+        has been stored
+    :rtype: list
+    '''
+    mapping = load_mapping()
+    if mapping is None:
+        logger.debug('There is no stored mapping of the input devices.')
+        return None
+    logger.debug('Stored mapping is %s.', mapping)
+    output = mapping['output']
+    orientation = tps.translate_direction(mapping['rotation'])
+    matrix = mapping['matrix']
+    if not lost_only:
+        return map_rotate_all_input_devices(output, orientation, matrix)
+
+    config = tps.config.get_config()
+    mapped = []
+    for device in get_wacom_device_ids():
+        properties = get_device_properties(device)
+        if 'Wacom Rotation' in properties \
+           and config['input'].getboolean('use_xsetwacom_if_available'):
+            if properties['Wacom Rotation'] \
+               != [WACOM_ROTATIONS[orientation.xsetwacom]] \
+               or not _same_matrix(
+                   properties.get('Coordinate Transformation Matrix'),
+                   _output_area(matrix, orientation)):
+                logger.info('Device %d lost its rotation or output.', device)
+                map_rotate_wacom_device(device, output, orientation)
+                mapped.append(device)
+        elif not _same_matrix(
+                properties.get('Coordinate Transformation Matrix'), matrix):
+            logger.info('Device %d lost its matrix.', device)
+            map_rotate_input_device(device, matrix)
+            mapped.append(device)
+    return mapped
+
+
+WACOM_ROTATIONS = {'none': '0', 'cw': '1', 'ccw': '2', 'half': '3'}
+'Values of the ``Wacom Rotation`` property for the names of ``xsetwacom``'
+
+
+def get_device_properties(device):
+    '''
+    Reads the properties of an input device.
+
+    :param int device: ``xinput`` ID of the device
+    :returns: Dictionary from the names of the properties to their values as
+        strings
+    :rtype: dict
+    '''
+    with contextlib.closing(tps.stream_output(
+            ['xinput', 'list-props', str(device)], logger)) as lines:
+        return parse_device_properties(lines)
+
+
+@tps.trace.traced('parse')
+def parse_device_properties(lines):
+    '''
+    Parses the output of ``xinput list-props``.
+
+    :param lines: Lines of the output as bytes
+    :returns: Dictionary like :func:`get_device_properties` gives it
+    :rtype: dict
+    '''
+    pattern = re.compile(rb'^\s+(?P<name>.+?)\s+\(\d+\):\s*(?P<values>.*)$')
+    properties = {}
+    for line in lines:
+        m_property = pattern.match(line)
+        if m_property:
+            values = m_property.group('values').decode(errors='replace')
+            properties[m_property.group('name').decode(errors='replace')] = [
+                value.strip() for value in values.split(',')]
+    return properties
+
+
+def _output_area(matrix, orientation):
+    # ``xsetwacom set … MapToOutput`` sets the matrix to the area of the
+    # output only, the rotation is in the “Wacom Rotation”. Multiplying with
+    # the inverse of the rotation leaves that area.
+    r = orientation.rot_mat
+    inverse = [
+        r[0], r[3], -(r[0] * r[2] + r[3] * r[5]),
+        r[1], r[4], -(r[1] * r[2] + r[4] * r[5]),
+        0, 0, 1,
+    ]
+    return _matrix_mul(matrix, inverse)
+
+
+def _same_matrix(values, matrix):
+    if values is None or len(values) != len(matrix):
+        return False
+    try:
+        return all(abs(float(value) - expected) < 1e-4
+                   for value, expected in zip(values, matrix))
+    except ValueError:
+        return False
+
 
 def map_rotate_wacom_device(device, output, direction):
     tps.check_call(['xsetwacom', 'set', str(device), 'rotate',
@@ -124,14 +293,32 @@ def has_device_property(device, property_):
     Checks whether a given device supports a property.
     '''
     command = ['xinput', '--list-props', str(device)]
-    output = tps.check_output(command, logger).decode()
-    regex = r'^\s+({})\s+\(\d+\):'.format(re.escape(property_))
-    has_property = re.search(regex, output, re.MULTILINE) is not None
+    with contextlib.closing(tps.stream_output(command, logger)) as lines:
+        has_property = parse_device_property(lines, property_)
     logger.debug('Device %i %s property “%s”', device,
                  'has' if has_property else 'does not have', property_)
     return has_property
 
 
+@tps.trace.traced('parse')
+def parse_device_property(lines, property_):
+    '''
+    Checks whether the ``xinput --list-props`` output contains the property.
+
+    Parsing stops at the first line with the property.
+
+    :param lines: Lines of the output as bytes
+    :param str property_: Name of the property
+    :rtype: bool
+    '''
+    pattern = re.compile(rb'^\s+(' + re.escape(property_.encode())
+                         + rb')\s+\(\d+\):')
+    for line in lines:
+        if pattern.match(line):
+            return True
+    return False
+
+
 def get_xinput_id(name):
     '''
     Gets the ``xinput`` ID for given device.
@@ -142,13 +329,36 @@ def get_xinput_id(name):
     :raises InputDeviceNotFoundException: Device not found in ``xinput`` output
     :rtype: int
     '''
-    output = tps.check_output(['xinput', 'list'], logger).decode()
-    matcher = re.search(name + r'\s*id=(\d+)', output)
-    if matcher:
-        return int(matcher.group(1))
+    with contextlib.closing(tps.stream_output(['xinput', 'list'],
+                                              logger)) as lines:
+        device = parse_xinput_id(lines, name)
+
+    if device is None:
+        raise InputDeviceNotFoundException(
+            'Input device “{}” could not be found'.format(name))
+
+    return device
+
+
+@tps.trace.traced('parse')
+def parse_xinput_id(lines, name):
+    '''
+    Finds the ID of the first device matching the name in the ``xinput
+    list`` output.
 
-    raise InputDeviceNotFoundException(
-        'Input device “{}” could not be found'.format(name))
+    Parsing stops at the first matching line.
+
+    :param lines: Lines of the output as bytes
+    :param str name: Regular expression matching the end of the device name
+    :returns: Device ID, ``None`` if there is no such device
+    :rtype: int
+    '''
+    pattern = re.compile(name.encode() + rb'\s*id=(\d+)')
+    for line in lines:
+        matcher = pattern.search(line)
+        if matcher:
+            return int(matcher.group(1))
+    return None
 
 
 def set_xinput_state(device, state):
@@ -193,17 +403,37 @@ def state_change_ui(config_name):
     It parses the command line options. If no state is given there, it will be
     the opposite of the current state.
 
-    :param bool set_touch: Whether to also toggle the ``Touch`` property on
-        this device.
+    :param str config_name: Name of the option in the ``input`` section that
+        holds the device name
     :returns: None
     '''
+    # The command line may enable tracing, so it is parsed before the action.
     config = tps.config.get_config()
+    state = _parse_args_to_state(config)
+    with tps.metrics.Action('toggle_' + config_name.split('_')[0], config):
+        tps.metrics.annotate(devices=1)
+        change_state(config_name, state, config)
+
+
+@tps.trace.traced('action')
+def change_state(config_name, state, config):
+    '''
+    Enables or disables a device, toggles it if the state is ``None``.
+
+    :param str config_name: Name of the option in the ``input`` section that
+        holds the device name
+    :param bool state: New state
+    :param configparser.ConfigParser config: Global config
+    :returns: None
+    '''
+    import tps.resume
+
     device_name = config['input'][config_name]
-    state = _parse_args_to_state()
     device = get_xinput_id(device_name)
     if state is None:
         state = not get_xinput_state(device)
     set_xinput_state(device, state)
+    tps.resume.record_device(device_name, state)
 
     if has_xinput_prop(device, b'Wacom Enable Touch'):
         set_wacom_touch(device, state)
@@ -217,13 +447,14 @@ def has_xinput_prop(device, prop):
     return prop in output
 
 
-def _parse_args_to_state():
+def _parse_args_to_state(config):
     """
     Parses the command line arguments.
 
     If the logging module is imported, set the level according to the number of
     ``-v`` given on the command line.
 
+    :param configparser.ConfigParser config: Global config
     :return: State
     :rtype: bool or None
     """
@@ -233,9 +464,13 @@ def _parse_args_to_state():
                         help='Enable verbose output. Can be supplied multiple '
                              'times for even more verbosity.')
 
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
     options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
 
-    tps.config.set_up_logging(options.verbose)
+    tps.config.set_up_logging(options.verbose, config)
 
     if options.state == 'on':
         return True
@@ -255,7 +490,20 @@ def generate_xinput_coordinate_transformation_matrix(output, orientation):
     0.000000, 0.000000, 1.000000
     '''
     rs = tps.screen.get_resolution_and_shift(output)
+    return coordinate_transformation_matrix(rs, orientation)
 
+
+def coordinate_transformation_matrix(rs, orientation):
+    '''
+    Computes the coordinate transformation matrix from the geometry of the
+    output.
+
+    :param dict rs: Size of the virtual screen and geometry of the output as
+        :func:`tps.screen.get_resolution_and_shift` gives it
+    :param tps.Direction orientation: Rotation of the output
+    :returns: Matrix as a flat list of nine numbers
+    :rtype: list
+    '''
     x_scale = rs['output_width'] / rs['screen_width']
     y_scale = rs['output_height'] / rs['screen_height']
 
@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Screen layouts for each set of connected monitors.
+
+When docking, the screens are arranged from the ``screen`` section of the
+config with several calls of ``xrandr``, and the input devices are mapped
+after another query of the screen geometry. The resulting layout is stored
+under a fingerprint of the connected monitors, which is made from their
+EDIDs. Docking at the same desk again applies the stored layout with a single
+``xrandr`` call and uses the stored transformation matrix for the input
+devices.
+
+Docking does not rotate the internal screen, so a layout is stored for the
+rotation of the internal screen and only applied in that rotation. The
+positions of the screens depend on it as well.
+
+The layouts are stored like the entries of :mod:`tps.cache`, but in
+:data:`DIRECTORY`, since the ones saved with ``thinkpad-dock --save-layout``
+cannot be computed again. They are only used as long as the options that
+affect the layout are unchanged.
+'''
+
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import subprocess
+
+import tps
+import tps.cache
+import tps.drm
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY = os.path.join(
+    os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config'),
+    'thinkpad-scripts', 'layouts')
+'Directory of the stored layouts'
+
+OPTIONS = ['primary', 'secondary', 'relative_position', 'internal_docked_on']
+'Options in the ``screen`` section that the layout depends on'
+
+
+def read_edids(internal, config):
+    '''
+    Reads the EDIDs of the connected screens.
+
+    They are read from the DRM sysfs if ``screen.drm_status`` is set and that
+    works, from ``xrandr --verbose`` otherwise.
+
+    :param str internal: Name of the internal screen
+    :param configparser.ConfigParser config: Global config
+    :returns: Dictionary from the names of the outputs to the EDIDs, which are
+        empty for screens without one
+    :rtype: dict
+    '''
+    if config['screen'].getboolean('drm_status'):
+        edids = tps.drm.connected_edids(internal)
+        if edids is not None:
+            return edids
+
+    command = ['xrandr', '--current', '--verbose']
+    with contextlib.closing(tps.stream_output(command, logger)) as lines:
+        return parse_edids(lines)
+
+
+@tps.trace.traced('parse')
+def parse_edids(lines):
+    '''
+    Finds the EDIDs of the connected outputs in the output of ``xrandr
+    --verbose``.
+
+    :param lines: Lines of the output as bytes
+    :returns: Dictionary like :func:`read_edids` gives it
+    :rtype: dict
+    '''
+    pattern_output = re.compile(rb'^(?P<name>\S+) connected')
+    edids = {}
+    output = rows = None
+    for line in lines:
+        if rows is not None:
+            if line.startswith(b'\t\t'):
+                rows.append(line.strip())
+                continue
+            edids[output] = bytes.fromhex(b''.join(rows).decode())
+            rows = None
+
+        if not line.startswith((b' ', b'\t')):
+            m_output = pattern_output.match(line)
+            output = m_output.group('name').decode() if m_output else None
+            if output is not None:
+                edids[output] = b''
+        elif output is not None and line.strip() == b'EDID:':
+            rows = []
+
+    if rows is not None:
+        edids[output] = bytes.fromhex(b''.join(rows).decode())
+    return edids
+
+
+def fingerprint(edids):
+    '''
+    Computes a fingerprint of the connected monitors.
+
+    The same monitors on the same connectors give the same fingerprint, no
+    matter where their EDIDs were read from.
+
+    :param dict edids: EDIDs as :func:`read_edids` gives them
+    :rtype: str
+    '''
+    digest = hashlib.sha1()
+    for name in sorted(edids):
+        digest.update(name.encode() + b'\0')
+        digest.update(hashlib.sha1(edids[name]).digest())
+    return digest.hexdigest()[:16]
+
+
+def _key(config):
+    return {option: config['screen'][option] for option in OPTIONS}
+
+
+def _name(edids, rotation):
+    return '{}-{}'.format(fingerprint(edids), rotation or 'normal')
+
+
+def load(edids, config, rotation):
+    '''
+    Loads the layout stored for the connected monitors.
+
+    :param dict edids: EDIDs as :func:`read_edids` gives them
+    :param configparser.ConfigParser config: Global config
+    :param str rotation: Current rotation of the internal screen like
+        :func:`current_rotation` gives it
+    :returns: Layout like :func:`capture` gives it, ``None`` if there is none
+    :rtype: dict
+    '''
+    layout = tps.cache.load(_name(edids, rotation), _key(config), DIRECTORY)
+    logger.debug('Layout for the connected monitors is %s.',
+                 'known' if layout else 'unknown')
+    return layout
+
+
+def store(edids, config, layout):
+    '''
+    Stores the layout for the connected monitors and the rotation of the
+    internal screen in it.
+
+    :param dict edids: EDIDs as :func:`read_edids` gives them
+    :param configparser.ConfigParser config: Global config
+    :param dict layout: Layout like :func:`capture` gives it
+    :returns: Whether the layout has been stored
+    :rtype: bool
+    '''
+    return tps.cache.store(_name(edids, layout['rotation']), _key(config),
+                           layout, DIRECTORY)
+
+
+def current_rotation(internal):
+    '''
+    Reads the rotation of the internal screen.
+
+    :param str internal: Name of the internal screen
+    :returns: Rotation like ``xrandr`` names it, ``normal`` if the screen is
+        off
+    :rtype: str
+    '''
+    with contextlib.closing(tps.stream_output(['xrandr', '--current'],
+                                              logger)) as lines:
+        outputs, screen = parse_layout(lines)
+    for output in outputs:
+        if output['name'] == internal and output['mode'] is not None:
+            return output['rotation']
+    return 'normal'
+
+
+def capture(internal):
+    '''
+    Reads the current layout of the screens.
+
+    :param str internal: Name of the internal screen
+    :returns: Dictionary with the ``outputs`` like :func:`parse_layout` gives
+        them, the coordinate transformation ``matrix`` for the input devices
+        and the ``rotation`` of the internal screen, both are ``None`` if the
+        internal screen is off
+    :rtype: dict
+    '''
+    import tps.input
+    import tps.screen
+
+    with contextlib.closing(tps.stream_output(['xrandr', '--current'],
+                                              logger)) as stream:
+        lines = list(stream)
+    outputs = parse_layout(lines)[0]
+
+    matrix = rotation = None
+    for output in outputs:
+        if output['name'] == internal and output['mode'] is not None:
+            # The mode name need not be the size, like ``1600x900_60.00``.
+            # The geometry on the output line is, and it is already rotated.
+            rs = tps.screen.parse_resolution_and_shift(lines, internal)
+            if rs is not None:
+                rotation = output['rotation']
+                matrix = tps.input.coordinate_transformation_matrix(
+                    rs, tps.translate_direction(rotation))
+
+    return {'outputs': outputs, 'matrix': matrix, 'rotation': rotation}
+
+
+@tps.trace.traced('parse')
+def parse_layout(lines):
+    '''
+    Finds the connected outputs and their settings in the output of ``xrandr
+    --current``.
+
+    :param lines: Lines of the output as bytes
+    :returns: List of outputs with ``name``, ``mode``, ``x``, ``y``,
+        ``rotation`` and ``primary``, where ``mode`` is ``None`` if the output
+        is off, and the size of the virtual screen as a tuple
+    :rtype: tuple
+    '''
+    pattern_output = re.compile(rb'''
+                                ^(?P<name>\S+)\ connected
+                                (?P<primary>\ primary)?
+                                (?:\ \d+x\d+\+(?P<x>\d+)\+(?P<y>\d+))?
+                                (?:\ (?P<rotation>normal|left|inverted|right))?
+                                ''', re.VERBOSE)
+    pattern_mode = re.compile(rb'^\s+(?P<mode>\S+)\s.*\*')
+    pattern_screen = re.compile(rb'current (?P<width>\d+) x (?P<height>\d+)')
+
+    outputs = []
+    screen = None
+    output = None
+    for line in lines:
+        if line.startswith(b'Screen '):
+            m_screen = pattern_screen.search(line)
+            if m_screen:
+                screen = (int(m_screen.group('width')),
+                          int(m_screen.group('height')))
+        elif not line.startswith((b' ', b'\t')):
+            m_output = pattern_output.match(line)
+            output = None
+            if m_output:
+                output = {
+                    'name': m_output.group('name').decode(),
+                    'mode': None,
+                    'x': int(m_output.group('x') or 0),
+                    'y': int(m_output.group('y') or 0),
+                    'rotation': (m_output.group('rotation')
+                                 or b'normal').decode(),
+                    'primary': m_output.group('primary') is not None,
+                }
+                outputs.append(output)
+        elif output is not None and output['mode'] is None:
+            m_mode = pattern_mode.match(line)
+            if m_mode:
+                output['mode'] = m_mode.group('mode').decode()
+
+    return outputs, screen
+
+
+def apply(layout):
+    '''
+    Applies a stored layout with a single ``xrandr`` call.
+
+    :param dict layout: Layout like :func:`capture` gives it
+    :returns: Whether ``xrandr`` accepted the layout
+    :rtype: bool
+    '''
+    command = ['xrandr']
+    for output in layout['outputs']:
+        command += ['--output', output['name']]
+        if output['mode'] is None:
+            command.append('--off')
+            continue
+        command += ['--mode', output['mode'],
+                    '--pos', '{}x{}'.format(output['x'], output['y']),
+                    '--rotate', output['rotation']]
+        if output['primary']:
+            command.append('--primary')
+
+    try:
+        tps.check_call(command, logger)
+    except subprocess.CalledProcessError as e:
+        logger.warning('Stored layout cannot be applied: %s', e)
+        return False
+    return True
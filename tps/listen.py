@@ -0,0 +1,818 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Long-running listener that starts the actions on hardware events.
+
+The udev rules and acpid event files start ``logger``, the hook, ``who``,
+``sudo`` and another interpreter for every event. ``thinkpad-listen`` runs in
+the graphical session instead and waits for the events itself, so an action
+starts right after the event. Related events that arrive in a burst, like the
+docking station and its USB devices and screens, are coalesced into a single
+action.
+
+Each source of events is an object with a ``fileno()`` method and a
+``read(listener)`` method, which is called when the file descriptor is
+readable. The sources call :meth:`Listener.schedule` for the actions that the
+events ask for.
+'''
+
+import argparse
+import logging
+import os
+import select
+import time
+
+import tps
+import tps.config
+
+logger = logging.getLogger(__name__)
+
+COALESCE = 0.2
+'Time in seconds without further events after which an action is started'
+
+
+class Listener(object):
+    '''
+    Event loop over the sources.
+
+    :param configparser.ConfigParser config: Global config
+    :param float coalesce: Time in seconds to wait for further events before
+        an action is started
+    '''
+
+    def __init__(self, config, coalesce=COALESCE):
+        self.config = config
+        self.coalesce = coalesce
+        self.sources = []
+        self.pending = {}
+
+    def add(self, source):
+        '''
+        Adds a source of events.
+        '''
+        self.sources.append(source)
+
+    def remove(self, source):
+        '''
+        Removes a source of events, for instance when its connection is lost.
+        '''
+        self.sources.remove(source)
+
+    def schedule(self, name, callback, delay=None):
+        '''
+        Schedules an action after the coalescing time.
+
+        An action with the same name that is still pending is replaced, and its
+        time starts again.
+
+        :param str name: Name of the action
+        :param callback: Function without arguments that performs the action
+        :param float delay: Time to wait instead of the coalescing time
+        '''
+        if delay is None:
+            delay = self.coalesce
+        self.pending[name] = (time.monotonic() + delay, callback)
+
+    def run(self, duration=None):
+        '''
+        Waits for events and starts the actions.
+
+        An exception in an action is logged, the listener keeps running.
+
+        :param float duration: Time in seconds after which to return, runs
+            until there are neither sources nor pending actions if ``None``
+        '''
+        end = None if duration is None else time.monotonic() + duration
+        while True:
+            now = time.monotonic()
+            for name, (deadline, callback) in sorted(self.pending.items()):
+                if deadline <= now:
+                    del self.pending[name]
+                    self._start(name, callback)
+            if not self.sources and not self.pending:
+                break
+
+            now = time.monotonic()
+            deadlines = [deadline for deadline, callback
+                         in self.pending.values()]
+            if end is not None:
+                if now >= end:
+                    break
+                deadlines.append(end)
+            timeout = max(min(deadlines) - now, 0) if deadlines else None
+
+            if self.sources:
+                readable, writable, exceptional = select.select(
+                    self.sources, [], [], timeout)
+            else:
+                time.sleep(timeout)
+                readable = []
+            for source in readable:
+                try:
+                    source.read(self)
+                except Exception:
+                    logger.exception('Unable to read the events of %s.',
+                                     source)
+
+    def _start(self, name, callback):
+        logger.debug('Starting %s.', name)
+        keep_spans = tps.trace.enabled()
+        try:
+            callback()
+        except Exception:
+            logger.exception('Action %s failed.', name)
+        except SystemExit as e:
+            logger.debug('Action %s exited with %s.', name, e.code)
+        finally:
+            # The metrics enable the tracing for each action, drop the spans
+            # so that they do not pile up in this long-running process.
+            if not keep_spans:
+                tps.trace.disable()
+
+
+class UeventSource(object):
+    '''
+    Kernel uevents of the docking station, its USB devices and the screens.
+
+    The docking status is determined with :func:`tps.dock.is_docked` after a
+    burst of events, the action is only started if it changed. If the
+    connected screens change while docked, the docking action is started
+    again to arrange them.
+
+    :param configparser.ConfigParser config: Global config
+    :param socket.socket sock: Socket to receive the uevents from, a netlink
+        socket is opened if not given
+    '''
+
+    TRIGGERS = ['uevent_on', 'uevent_off', 'uevent_screens']
+    'Triggers in ``trigger.dock_triggers`` that this source starts'
+
+    def __init__(self, config, sock=None):
+        import tps.dock
+        import tps.uevent
+
+        if not set(self.TRIGGERS) & set(
+                config['trigger']['dock_triggers'].split()):
+            logger.warning('None of the triggers %s is enabled in '
+                           'trigger.dock_triggers, docking events are '
+                           'ignored.', ', '.join(self.TRIGGERS))
+
+        self.config = config
+        self.sock = sock if sock is not None else tps.uevent.open_socket()
+        if self.sock is None:
+            raise OSError('Unable to listen to kernel uevents')
+        ids = tps.dock.get_usb_indicator_ids(config)
+        if ids:
+            self.usb_ids = {_usb_product(id) for id in ids}
+        elif config['dock']['lsusb_indicator_regex']:
+            # Any device might match the regular expression.
+            self.usb_ids = None
+        else:
+            self.usb_ids = set()
+        self.docked = tps.dock.is_docked(config)
+        self.outputs = self._connected_outputs()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self, listener):
+        import tps.uevent
+
+        event = tps.uevent.parse(self.sock.recv(tps.uevent.BUFFER_SIZE))
+        if event is None:
+            return
+        kind = classify(event, self.usb_ids)
+        if kind == 'dock':
+            listener.schedule('dock', self.check_dock)
+        elif kind == 'screens':
+            listener.schedule('screens', self.check_screens)
+
+    def check_dock(self):
+        '''
+        Docks or undocks if the docking status changed.
+        '''
+        import tps.dock
+
+        docked = tps.dock.is_docked(self.config)
+        if docked == self.docked:
+            logger.debug('Docking status is unchanged.')
+            return
+        self.docked = docked
+        _dock(self.config, docked, 'uevent_on' if docked else 'uevent_off')
+        # The screens have been arranged for the current ones.
+        self.outputs = self._connected_outputs()
+
+    def check_screens(self):
+        '''
+        Arranges the screens if they changed while docked.
+        '''
+        outputs = self._connected_outputs()
+        changed = outputs != self.outputs
+        self.outputs = outputs
+        if self.docked and changed and outputs is not None:
+            _dock(self.config, True, 'uevent_screens')
+
+    def _connected_outputs(self):
+        import tps.drm
+        import tps.screen
+
+        return tps.drm.connected_outputs(tps.screen.get_internal(self.config))
+
+
+ACPID_SOCKET = '/var/run/acpid.socket'
+'Socket where acpid sends every event to'
+
+ACPI_EVENTS = [
+    ('ibm/hotkey LEN0068:00 00000080 00004010', 'acpi1_on'),
+    ('ibm/hotkey LEN0068:00 00000080 00004011', 'acpi1_off'),
+    ('ibm/hotkey LEN0068:00 00000080 00006030', 'acpi2'),
+    ('ibm/hotkey HKEY 00000080 0000101b', 'acpi_mutemic'),
+    ('ibm/hotkey HKEY 00000080 0000500a', 'acpi1_normal'),
+    ('ibm/hotkey HKEY 00000080 00005009', 'acpi1_rotated'),
+    ('video/tabletmode TBLT 0000008A 00000000.*', 'acpi2_normal'),
+    ('video/tabletmode TBLT 0000008A 00000001.*', 'acpi2_rotated'),
+]
+'''
+Regular expressions of the ACPI events and the triggers of the acpid event
+files for them
+'''
+
+
+class AcpidSource(object):
+    '''
+    Events of the hotkeys, the hinge and the docking station from acpid.
+
+    The same events as in the acpid event files are matched, see
+    :data:`ACPI_EVENTS`. The actions run in this process with the triggers
+    ``acpid_on``, ``acpid_off`` and ``acpid_dock`` for docking,
+    ``acpid_normal`` and ``acpid_rotated`` for rotating and ``acpid_mutemic``
+    for the microphone. If acpid is restarted, the connection is made again.
+
+    :param configparser.ConfigParser config: Global config
+    :param str path: Path of the acpid socket
+    :raises OSError: The socket cannot be connected to
+    '''
+
+    RECONNECT = 5
+    'Time in seconds after which a lost connection is tried again'
+
+    def __init__(self, config, path=ACPID_SOCKET):
+        import re
+
+        self.config = config
+        self.path = path
+        self.patterns = [(re.compile(regex), hook)
+                         for regex, hook in ACPI_EVENTS]
+        self.buffer = b''
+        self.sock = None
+        self.connect()
+
+    def connect(self):
+        import socket
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.buffer = b''
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self, listener):
+        try:
+            data = self.sock.recv(4096)
+        except OSError as e:
+            logger.warning('Reading from acpid failed: %s', e)
+            data = b''
+        if not data:
+            logger.warning('Connection to acpid lost.')
+            self.sock.close()
+            listener.remove(self)
+            listener.schedule('acpid_reconnect',
+                              lambda: self._reconnect(listener),
+                              self.RECONNECT)
+            return
+
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            hook = self.match(line.decode(errors='replace').strip())
+            if hook is not None:
+                self.dispatch(listener, hook)
+
+    def match(self, line):
+        '''
+        Finds the trigger of the acpid event files for an event.
+
+        :param str line: Event as acpid sends it
+        :returns: Trigger from :data:`ACPI_EVENTS`, ``None`` if the event is
+            not handled
+        :rtype: str
+        '''
+        for pattern, hook in self.patterns:
+            if pattern.match(line):
+                return hook
+        return None
+
+    def dispatch(self, listener, hook):
+        '''
+        Schedules the action for a trigger of the acpid event files.
+
+        The rotation hooks are coalesced, since some models send both kinds of
+        hinge events.
+        '''
+        config = self.config
+        if hook == 'acpi_mutemic':
+            listener.schedule('acpid_mutemic', lambda: _mutemic(config), 0)
+        elif hook.endswith('_normal'):
+            listener.schedule('acpid_rotate', lambda: _rotate(
+                config, 'normal', 'acpid_normal'))
+        elif hook.endswith('_rotated'):
+            listener.schedule('acpid_rotate', lambda: _rotate(
+                config, None, 'acpid_rotated'))
+        elif hook == 'acpi1_on':
+            listener.schedule('acpid_dock',
+                              lambda: _dock(config, True, 'acpid_on'))
+        elif hook == 'acpi1_off':
+            listener.schedule('acpid_dock',
+                              lambda: _dock(config, False, 'acpid_off'))
+        elif hook == 'acpi2':
+            listener.schedule('acpid_dock', lambda: _dock_toggle(config))
+
+    def _reconnect(self, listener):
+        try:
+            self.connect()
+        except OSError as e:
+            logger.debug('Unable to connect to acpid: %s', e)
+            listener.schedule('acpid_reconnect',
+                              lambda: self._reconnect(listener),
+                              self.RECONNECT)
+            return
+        logger.info('Connected to acpid again.')
+        listener.add(self)
+
+
+class TabletModeSource(object):
+    '''
+    Tablet mode switch of the input device that reports the hinge.
+
+    The switch is read from ``/dev/input/event*``, see :mod:`tps.evdev`. The
+    hinge may chatter while it is turned, so the screen is only rotated once
+    the switch kept its state for ``rotate.tablet_mode_debounce`` seconds. The
+    triggers ``evdev_normal`` and ``evdev_rotated`` rotate to normal and to
+    ``rotate.default_rotation``.
+
+    :param configparser.ConfigParser config: Global config
+    :param str path: Path of the device file, or of a file with recorded
+        events. The device with the switch is searched if not given.
+    :param bool tablet: Current state of the switch, read from the device if
+        not given
+    :raises OSError: There is no such device or it cannot be opened
+    '''
+
+    def __init__(self, config, path=None, tablet=None):
+        import tps.evdev
+
+        if path is None:
+            path = tps.evdev.find_switch()
+            if path is None:
+                raise OSError('There is no input device with a tablet mode '
+                              'switch')
+        self.config = config
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        if tablet is None:
+            tablet = tps.evdev.read_switch(self.fd)
+        self.tablet = tablet
+        self.pending = tablet
+        self.buffer = b''
+        logger.debug('Tablet mode switch %s is %s.', path, tablet)
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, listener):
+        import tps.evdev
+
+        try:
+            data = os.read(self.fd, 64 * tps.evdev.EVENT.size)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b''
+            logger.debug('Unable to read %s: %s', self.path, e)
+        if not data:
+            logger.warning('Tablet mode switch %s is gone.', self.path)
+            os.close(self.fd)
+            listener.remove(self)
+            return
+
+        events, self.buffer = tps.evdev.parse(self.buffer + data)
+        for type_, code, value in events:
+            if type_ == tps.evdev.EV_SW and code == tps.evdev.SW_TABLET_MODE:
+                self.pending = bool(value)
+            elif type_ == tps.evdev.EV_SYN \
+                    and code == tps.evdev.SYN_DROPPED:
+                # The kernel dropped events, ask for the current state.
+                state = tps.evdev.read_switch(self.fd)
+                if state is not None:
+                    self.pending = state
+            else:
+                continue
+            listener.schedule('tablet_mode', self.settle, self.config[
+                'rotate'].getfloat('tablet_mode_debounce'))
+
+    def settle(self):
+        '''
+        Rotates if the switch settled in another state.
+        '''
+        if self.pending == self.tablet:
+            logger.debug('Tablet mode is unchanged.')
+            return
+        self.tablet = self.pending
+        _rotate_tablet(self.config, self.tablet)
+
+
+class AccelerometerSource(object):
+    '''
+    Orientation of the device from the IIO accelerometer.
+
+    The accelerometer has no events, it is sampled every
+    ``rotate.accelerometer_interval`` seconds. While the device is held still,
+    the interval doubles up to ``rotate.accelerometer_idle_interval``. A new
+    orientation has to stay for ``rotate.accelerometer_dwell`` seconds, then
+    the screen is rotated with the trigger ``accelerometer``. See
+    :func:`tps.accel.orientation` for the hysteresis.
+
+    :param configparser.ConfigParser config: Global config
+    :param str path: Path of the IIO device, searched if not given
+    :param str current: Current rotation of the internal screen, queried if
+        not given
+    :raises OSError: There is no accelerometer or it cannot be opened
+    '''
+
+    STILL = 0.05
+    '''
+    Change between two samples as a fraction of the gravity below which the
+    device is held still
+    '''
+
+    def __init__(self, config, path=None, current=None):
+        import tps.accel
+
+        if path is None:
+            path = tps.accel.find_accelerometer()
+            if path is None:
+                raise OSError('There is no accelerometer')
+        self.config = config
+        self.device = tps.accel.Accelerometer(path)
+        if current is None:
+            current = _current_rotation(config)
+        self.current = current
+        self.candidate = current
+        self.since = time.monotonic()
+        self.last = None
+        section = config['rotate']
+        self.interval = section.getfloat('accelerometer_interval')
+        self.idle_interval = section.getfloat('accelerometer_idle_interval')
+        self.dwell = section.getfloat('accelerometer_dwell')
+        self.hysteresis = section.getfloat('accelerometer_hysteresis')
+        self.delay = self.interval
+
+    def start(self, listener):
+        '''
+        Schedules the first sample.
+
+        :param Listener listener: Listener that runs the sampling
+        '''
+        listener.schedule('accelerometer', lambda: self.sample(listener), 0)
+
+    def sample(self, listener):
+        '''
+        Takes a sample, rotates if a new orientation stayed long enough and
+        schedules the next sample.
+
+        :param Listener listener: Listener that runs the sampling
+        '''
+        import tps.accel
+
+        try:
+            sample = self.device.read()
+        except (OSError, ValueError) as e:
+            logger.warning('Unable to read the accelerometer, stopping the '
+                           'automatic rotation: %s', e)
+            self.device.close()
+            return
+        now = time.monotonic()
+
+        gravity = sum(value * value for value in sample) ** 0.5
+        if self.last is not None and all(
+                abs(a - b) <= self.STILL * gravity
+                for a, b in zip(sample, self.last)):
+            self.delay = min(2 * self.delay, self.idle_interval)
+        else:
+            self.delay = self.interval
+        self.last = sample
+
+        candidate = tps.accel.orientation(sample, self.current,
+                                          self.hysteresis)
+        if candidate != self.candidate:
+            logger.debug('Orientation might be %s.', candidate)
+            self.candidate = candidate
+            self.since = now
+        if self.candidate is not None and self.candidate != self.current:
+            if now - self.since >= self.dwell:
+                self.current = self.candidate
+                _rotate_accelerometer(self.config, self.candidate)
+            else:
+                # Sample at the full rate until the orientation is stable.
+                self.delay = min(self.interval,
+                                 self.since + self.dwell - now)
+
+        listener.schedule('accelerometer', lambda: self.sample(listener),
+                          self.delay)
+
+
+class RandrSource(object):
+    '''
+    Screen changes of the X server.
+
+    ``xev`` prints the RandR events of the root window, the screen change and
+    output change events. After a burst of them, the geometry of the internal
+    screen is read once. If the coordinate transformation of the input
+    devices changed, for instance after another program changed the layout,
+    they are mapped again.
+
+    :param configparser.ConfigParser config: Global config
+    :param stream: Binary file with the output of ``xev``, ``xev`` is started
+        if not given
+    :raises OSError: ``xev`` is not installed
+    '''
+
+    COMMAND = ['xev', '-root', '-event', 'randr']
+
+    EVENTS = (b'RRScreenChangeNotify event', b'RRNotify event')
+    'Start of the events that may change the geometry'
+
+    def __init__(self, config, stream=None):
+        import subprocess
+        import tps.screen
+
+        self.process = None
+        if stream is None:
+            path = tps.which(self.COMMAND[0])
+            if path is None:
+                raise OSError('xev is not installed')
+            logger.debug('subprocess “%s”', ' '.join(self.COMMAND))
+            self.process = subprocess.Popen(
+                [path] + self.COMMAND[1:], stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+            stream = self.process.stdout
+        self.config = config
+        self.stream = stream
+        self.buffer = b''
+        self.internal = tps.screen.get_internal(config)
+        self.geometry = self._geometry()
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def read(self, listener):
+        data = os.read(self.fileno(), 4096)
+        if not data:
+            logger.warning('xev exited, input devices are not mapped on '
+                           'screen changes any more.')
+            self.close()
+            listener.remove(self)
+            return
+
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        if any(line.startswith(self.EVENTS) for line in lines):
+            listener.schedule('randr', self.check)
+
+    def check(self):
+        '''
+        Maps the input devices if the geometry of the internal screen changed.
+        '''
+        import tps.input
+        import tps.metrics
+
+        geometry = self._geometry()
+        if geometry == self.geometry:
+            logger.debug('Geometry of %s is unchanged.', self.internal)
+            return
+        self.geometry = geometry
+        matrix, rotation = geometry
+        if matrix is None:
+            logger.debug('Screen %s is off.', self.internal)
+            return
+        with tps.metrics.Action('remap_input', self.config, 'randr'):
+            tps.input.map_rotate_all_input_devices(
+                self.internal, tps.translate_direction(rotation), matrix)
+
+    def close(self):
+        '''
+        Stops ``xev``.
+        '''
+        self.stream.close()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+    def _geometry(self):
+        import tps.layout
+
+        layout = tps.layout.capture(self.internal)
+        return layout['matrix'], layout['rotation']
+
+
+def _usb_product(id):
+    # The uevents have the IDs without leading zeros, like ``46d/c05a``.
+    vendor, product = id.lower().split(':')
+    return '{:x}/{:x}'.format(int(vendor, 16), int(product, 16))
+
+
+def classify(event, usb_ids):
+    '''
+    Tells which action an uevent is relevant for.
+
+    :param dict event: Fields of the uevent
+    :param set usb_ids: Products of the USB devices of the docking station
+        like ``273f/1007``, ``None`` if any USB device may be one
+    :returns: ``dock`` for events of the docking station, ``screens`` for
+        hotplug events of the graphics card, ``None`` otherwise
+    :rtype: str
+    '''
+    subsystem = event.get('SUBSYSTEM')
+    if subsystem == 'platform' \
+       and '/dock.' in event.get('DEVPATH', ''):
+        return 'dock'
+    if subsystem == 'usb' and event.get('DEVTYPE') == 'usb_device' \
+       and event.get('ACTION') in ('add', 'remove'):
+        product = event.get('PRODUCT', '').rsplit('/', 1)[0]
+        if usb_ids is None or product in usb_ids:
+            return 'dock'
+    if subsystem == 'drm' and event.get('HOTPLUG') == '1':
+        return 'screens'
+    return None
+
+
+def _dock(config, on, trigger):
+    import tps.dock
+    import tps.metrics
+
+    if trigger not in config['trigger']['dock_triggers'].split():
+        logger.debug('Trigger %s is disabled.', trigger)
+        return
+    action = 'dock_on' if on else 'dock_off'
+    with tps.metrics.Action(action, config, trigger):
+        tps.dock.dock(on, config, wait=on and trigger != 'uevent_screens')
+
+
+def _dock_toggle(config):
+    import tps.dock
+
+    _dock(config, tps.dock.is_docked(config), 'acpid_dock')
+
+
+def _rotate(config, direction, trigger):
+    import tps.rotate
+
+    if trigger not in config['trigger']['rotate_triggers'].split():
+        logger.debug('Trigger %s is disabled.', trigger)
+        return
+    tps.rotate.rotate(config, direction, direction is not None, trigger)
+
+
+def _rotate_tablet(config, tablet):
+    import tps.metrics
+    import tps.rotate
+
+    trigger = 'evdev_rotated' if tablet else 'evdev_normal'
+    if trigger not in config['trigger']['rotate_triggers'].split():
+        logger.debug('Trigger %s is disabled.', trigger)
+        return
+    # The switch tells the direction, the current one need not be queried.
+    direction = tps.translate_direction(
+        config['rotate']['default_rotation'] if tablet else 'normal')
+    with tps.metrics.Action('rotate', config, trigger):
+        tps.rotate.xrandr_bug_fail_early(config)
+        tps.rotate.rotate_to(direction, config)
+
+
+def _current_rotation(config):
+    import tps.screen
+
+    try:
+        return tps.screen.get_rotation(
+            tps.screen.get_internal(config)).xrandr
+    except tps.screen.ScreenNotFoundException as e:
+        logger.debug('Unable to read the rotation: %s', e)
+        return None
+
+
+def _rotate_accelerometer(config, rotation):
+    import tps.metrics
+    import tps.rotate
+
+    if 'accelerometer' not in config['trigger']['rotate_triggers'].split():
+        logger.debug('Trigger accelerometer is disabled.')
+        return
+    if _current_rotation(config) == rotation:
+        logger.debug('Screen already is in %s.', rotation)
+        return
+    with tps.metrics.Action('rotate', config, 'accelerometer'):
+        tps.rotate.xrandr_bug_fail_early(config)
+        tps.rotate.rotate_to(tps.translate_direction(rotation), config)
+
+
+def _mutemic(config):
+    import tps.sound
+
+    if 'acpid_mutemic' not in config['trigger']['mutemic_triggers'].split():
+        logger.debug('Trigger acpid_mutemic is disabled.')
+        return
+    tps.sound.toggle_mic()
+
+
+def main():
+    '''
+    Command line entry point.
+
+    :returns: None
+    '''
+    options = _parse_args()
+    config = tps.config.get_config()
+    tps.config.set_up_logging(options.verbose, config)
+
+    listener = Listener(config, options.coalesce)
+    try:
+        listener.add(UeventSource(config))
+    except OSError as e:
+        logger.warning('Not listening to uevents: %s', e)
+    try:
+        listener.add(AcpidSource(config))
+    except OSError as e:
+        logger.warning('Not listening to acpid: %s', e)
+    try:
+        listener.add(TabletModeSource(config))
+    except OSError as e:
+        logger.info('Not listening to a tablet mode switch: %s', e)
+    if config['input'].getboolean('remap_on_screen_change'):
+        try:
+            listener.add(RandrSource(config))
+        except OSError as e:
+            logger.warning('Not listening to screen changes: %s', e)
+    # Sampling costs power, so it is only done when it is enabled.
+    if 'accelerometer' in config['trigger']['rotate_triggers'].split():
+        try:
+            AccelerometerSource(config).start(listener)
+        except OSError as e:
+            logger.warning('Not rotating automatically: %s', e)
+
+    if not listener.sources and not listener.pending:
+        logger.error('There are no events to listen to.')
+        return 1
+
+    logger.info('Listening to hardware events.')
+    try:
+        listener.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def _parse_args():
+    '''
+    Parses the command line arguments.
+
+    :return: Namespace with arguments.
+    :rtype: Namespace
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--coalesce', type=float, default=COALESCE,
+                        help='Time in seconds without further events after '
+                             'which an action is started. Default: '
+                             '%(default)s')
+    parser.add_argument("-v", dest='verbose', action="count",
+                        help='Enable verbose output. Can be supplied multiple '
+                             'times for even more verbosity.')
+
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
+
+    return options
+
+
+if __name__ == '__main__':
+    main()
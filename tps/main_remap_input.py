@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import argparse
+import logging
+import sys
+
+import tps.config
+import tps.input
+import tps.metrics
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    '''
+    Command line entry point for mapping the input devices again.
+
+    :returns: None
+    '''
+    options = _parse_args()
+    config = tps.config.get_config()
+
+    if options.via_hook is not None \
+       and options.via_hook not in \
+       config['trigger']['remap_input_triggers'].split():
+        sys.exit(0)
+
+    tps.config.set_up_logging(options.verbose, config)
+
+    with tps.metrics.Action('remap_input', config, options.via_hook):
+        if tps.input.remap() is None:
+            logger.error('There is no stored mapping of the input devices. '
+                         'Rotate or dock once to store it.')
+            sys.exit(1)
+
+
+def _parse_args():
+    '''
+    Parses the command line arguments.
+
+    :return: Namespace with arguments.
+    :rtype: Namespace
+    '''
+    parser = argparse.ArgumentParser(
+        description='Maps the input devices like the last rotation or '
+                    'docking did, without querying the screens.')
+    parser.add_argument("-v", dest='verbose', action="count",
+                        help='Enable verbose output. Can be supplied multiple '
+                             'times for even more verbosity.')
+    parser.add_argument('--via-hook', help='Let the program know that it was called using the specified hook. You do not need to care about this.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
+
+    return options
+
+
+if __name__ == '__main__':
+    main()
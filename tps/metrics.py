@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Structured metrics of the actions.
+
+Every rotation, docking and input toggle that runs inside an :class:`Action`
+emits one record with the action, the trigger, the outcome, the total time,
+the time per step, the number of spawned programs and the number of screens
+and input devices. The records are appended to a JSON lines file and can be
+added to a textfile for the Prometheus node exporter. Both are configured in
+the ``metrics`` section and off by default.
+
+The steps are taken from :mod:`tps.trace`, which is enabled for the action.
+'''
+
+import logging
+import os
+import time
+
+import tps
+import tps.trace
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+'Upper bounds of the histogram buckets in seconds'
+
+PREFIX = 'thinkpad_scripts_action'
+'Prefix of the Prometheus metric names'
+
+_current = None
+'The :class:`Action` that is running, if any'
+
+
+def annotate(**attributes):
+    '''
+    Adds attributes like the number of screens to the running action. Nothing
+    happens if no action is running or metrics are disabled.
+    '''
+    if _current is not None:
+        _current.attributes.update(attributes)
+
+
+class Action(object):
+    '''
+    Context manager around an action that emits its record on exit.
+
+    The outcome is ``success`` unless the block raises an exception or exits
+    with a non-zero status. Exceptions are not suppressed. If neither
+    ``metrics.jsonl`` nor ``metrics.prometheus_textfile`` is set, this does
+    nothing.
+
+    :param str name: Name of the action like ``rotate`` or ``dock_on``, can be
+        changed with :attr:`name` while the action is running
+    :param configparser.ConfigParser config: Global config
+    :param str trigger: Value of ``--via-hook``, ``None`` if started by hand
+    '''
+
+    def __init__(self, name, config, trigger=None):
+        self.name = name
+        self.trigger = trigger
+        self.attributes = {}
+        self.jsonl = os.path.expanduser(config['metrics']['jsonl'])
+        self.textfile = os.path.expanduser(
+            config['metrics']['prometheus_textfile'])
+        self.active = bool(self.jsonl or self.textfile)
+        self._start = None
+        self._first_span = 0
+
+    def __enter__(self):
+        global _current
+        if self.active:
+            tps.trace.enable()
+            self._first_span = len(tps.trace.spans())
+            self._start = time.perf_counter()
+            _current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _current
+        if not self.active:
+            return
+        duration = time.perf_counter() - self._start
+        _current = None
+
+        if exc_type is None \
+           or (exc_type is SystemExit and exc_value.code in (None, 0)):
+            outcome = 'success'
+        elif exc_type is SystemExit:
+            outcome = 'failure'
+        else:
+            outcome = 'error'
+
+        record = make_record(self.name, self.trigger, outcome, duration,
+                             tps.trace.spans()[self._first_span:],
+                             self.attributes)
+        if exc_type is not None and outcome == 'error':
+            record['error'] = exc_type.__name__
+
+        try:
+            if self.jsonl:
+                append_jsonl(self.jsonl, record)
+            if self.textfile:
+                update_textfile(self.textfile, record)
+        except OSError as e:
+            logger.warning('Unable to write metrics: %s', e)
+
+
+def make_record(name, trigger, outcome, duration, spans, attributes):
+    '''
+    Assembles the record of an action.
+
+    :param list spans: Spans from :func:`tps.trace.spans` that belong to the
+        action
+    :param dict attributes: Attributes from :func:`annotate`
+    :rtype: dict
+    '''
+    steps = {}
+    spawns = 0
+    for span in spans:
+        if span.category == 'command':
+            spawns += 1
+            step = os.path.basename(span.name.split()[0])
+        elif span.category == 'hook':
+            step = 'hook ' + span.name.rsplit('.', 1)[-1]
+        else:
+            continue
+        steps[step] = steps.get(step, 0.0) + span.duration
+
+    record = {
+        'timestamp': time.time(),
+        'action': name,
+        'trigger': trigger,
+        'outcome': outcome,
+        'duration': duration,
+        'steps': steps,
+        'spawns': spawns,
+        'screens': None,
+        'devices': None,
+    }
+    record.update(attributes)
+    return record
+
+
+def append_jsonl(path, record):
+    '''
+    Appends a record as a single line of JSON.
+
+    :param str path: File to append to, its directory is created
+    :param dict record: Record from :func:`make_record`
+    '''
+    import json
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(record, sort_keys=True) + '\n'
+    # A single write of a short line to a file opened for appending does not
+    # interleave with other processes.
+    with open(path, 'a') as handle:
+        handle.write(line)
+
+
+def parse_textfile(lines):
+    '''
+    Reads the samples of a Prometheus textfile that :func:`update_textfile`
+    wrote.
+
+    :param lines: Lines of the file
+    :returns: Dictionary from ``(name, labels)`` to the value, the labels being
+        a tuple of ``(key, value)`` pairs
+    :rtype: dict
+    '''
+    samples = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        metric, value = line.rsplit(' ', 1)
+        name, _, labels = metric.partition('{')
+        pairs = []
+        for pair in labels.rstrip('}').split(','):
+            if pair:
+                key, _, label = pair.partition('=')
+                pairs.append((key, label.strip('"')))
+        samples[(name, tuple(pairs))] = float(value)
+    return samples
+
+
+def _format_labels(labels):
+    return ','.join('{}="{}"'.format(key, value) for key, value in labels)
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _sort_key(sample):
+    (name, labels), value = sample
+    # The buckets of a histogram are sorted by their numeric bound.
+    return name, [(key, float(label) if key == 'le' else 0, label)
+                  for key, label in labels]
+
+
+def update_textfile(path, record):
+    '''
+    Adds a record to a textfile for the node exporter.
+
+    The file holds a duration histogram and a counter per action, trigger and
+    outcome, so that quantiles can be computed over many machines, and gauges
+    with the last duration, spawn count and number of screens and devices per
+    action. It is replaced atomically.
+
+    :param str path: Textfile, should end in ``.prom``
+    :param dict record: Record from :func:`make_record`
+    '''
+    import fcntl
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Two actions may finish at the same time, neither must lose the counts
+    # of the other.
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as handle:
+                samples = parse_textfile(handle)
+        except FileNotFoundError:
+            samples = {}
+        _add_record(samples, record)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'w') as handle:
+            handle.write(format_textfile(samples))
+        os.replace(temp, path)
+
+
+def _add_record(samples, record):
+    action = (('action', record['action']),)
+    labels = action + (('trigger', record['trigger'] or 'manual'),
+                       ('outcome', record['outcome']))
+
+    def increment(name, labels, amount=1):
+        samples[(name, labels)] = samples.get((name, labels), 0) + amount
+
+    increment(PREFIX + '_total', labels)
+    for bound in BUCKETS + ['+Inf']:
+        if bound == '+Inf' or record['duration'] <= bound:
+            increment(PREFIX + '_duration_seconds_bucket',
+                      action + (('le', str(bound)),))
+    increment(PREFIX + '_duration_seconds_count', action)
+    increment(PREFIX + '_duration_seconds_sum', action, record['duration'])
+    samples[(PREFIX + '_last_duration_seconds', action)] = record['duration']
+    samples[(PREFIX + '_last_spawns', action)] = record['spawns']
+    samples[(PREFIX + '_last_timestamp_seconds', action)] = \
+        record['timestamp']
+    for key in ('screens', 'devices'):
+        if record[key] is not None:
+            samples[(PREFIX + '_last_' + key, action)] = record[key]
+
+
+def format_textfile(samples):
+    '''
+    Formats samples in the Prometheus text format.
+
+    :param dict samples: Samples like :func:`parse_textfile` returns them
+    :rtype: str
+    '''
+    descriptions = [
+        ('_total', 'counter', 'Number of actions.'),
+        ('_duration_seconds', 'histogram', 'Duration of the actions.'),
+        ('_last_duration_seconds', 'gauge', 'Duration of the last action.'),
+        ('_last_spawns', 'gauge', 'Programs spawned by the last action.'),
+        ('_last_timestamp_seconds', 'gauge', 'Time of the last action.'),
+        ('_last_screens', 'gauge', 'Screens during the last action.'),
+        ('_last_devices', 'gauge', 'Input devices during the last action.'),
+    ]
+    lines = []
+    for suffix, kind, description in descriptions:
+        name = PREFIX + suffix
+        metrics = sorted(
+            ((key, value) for key, value in samples.items()
+             if key[0] == name or (kind == 'histogram'
+                                   and key[0].startswith(name + '_'))),
+            key=_sort_key)
+        if not metrics:
+            continue
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for (metric, labels), value in metrics:
+            lines.append('{}{{{}}} {}'.format(metric, _format_labels(labels),
+                                              _format_value(value)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,297 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Recording and replay of the external programs.
+
+With ``--record DIR`` every command that runs through :func:`tps.check_call`,
+:func:`tps.call`, :func:`tps.check_output` and :func:`tps.stream_output` is
+saved with its arguments, exit status, duration and standard output. With
+``--replay DIR`` the commands are not run, the recordings are served instead.
+A bug report with a recording can so be reproduced and benchmarked on any
+machine.
+
+A recording is a directory with ``commands.jsonl``. It has one line per
+invocation of a program and one per command, in the order they ran. The
+standard output is stored in ``stdout/`` under its hash, so that identical
+outputs are only stored once. Recordings of several programs can be put into
+the same directory. They can be collected next to the captures in
+``sample_data``, for instance ``sample_data/X220/rotate-left``.
+
+During the replay a command gets the recordings with the same arguments one
+after the other. Once they are used up, the last one is served again.
+
+While recording or replaying, :mod:`tps.cache` and :mod:`tps.drm` do not read
+the state of the machine, so that the recording contains every query and the
+replay does not depend on the machine it runs on. A replay does not store
+anything in the cache either, see :func:`isolated`.
+'''
+
+import errno
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX = 'commands.jsonl'
+'File with the commands in a recording'
+
+mode = None
+'``record``, ``replay`` or ``None`` if neither is active'
+
+_directory = None
+_recordings = None
+_timing = False
+
+
+class NotRecordedException(Exception):
+    '''
+    The command that should be replayed is not in the recording.
+    '''
+
+
+def add_arguments(parser):
+    '''
+    Adds the ``--record``, ``--replay`` and ``--replay-timing`` options to a
+    command line parser.
+
+    :param argparse.ArgumentParser parser: Parser of an entry point
+    '''
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='DIR',
+                       help='Save every external program with its output to '
+                            'DIR.')
+    group.add_argument('--replay', metavar='DIR',
+                       help='Do not run external programs, serve the '
+                            'recordings from DIR instead.')
+    parser.add_argument('--replay-timing', action='store_true',
+                        help='Wait as long for replayed programs as they took '
+                             'when recorded.')
+
+
+def set_up(options):
+    '''
+    Starts recording or replaying if the options from :func:`add_arguments`
+    ask for it.
+
+    :param argparse.Namespace options: Parsed command line
+    '''
+    if options.record:
+        start_recording(options.record)
+    elif options.replay:
+        start_replay(options.replay, options.replay_timing)
+
+
+def start_recording(directory):
+    '''
+    Records all following commands into a directory.
+
+    :param str directory: Directory of the recording, created if needed
+    '''
+    global mode, _directory
+
+    os.makedirs(os.path.join(directory, 'stdout'), exist_ok=True)
+    mode = 'record'
+    _directory = directory
+    _append({'invocation': sys.argv, 'model': _model(),
+             'timestamp': time.time()})
+
+
+def start_replay(directory, timing=False):
+    '''
+    Serves all following commands from a recording.
+
+    :param str directory: Directory of the recording
+    :param bool timing: Wait as long as the recorded commands took
+    :raises FileNotFoundError: There is no recording in the directory
+    '''
+    import json
+
+    global mode, _directory, _recordings, _timing
+
+    recordings = {}
+    with open(os.path.join(directory, INDEX)) as handle:
+        for line in handle:
+            entry = json.loads(line)
+            if 'argv' in entry:
+                recordings.setdefault(tuple(entry['argv']), []).append(entry)
+
+    mode = 'replay'
+    _directory = directory
+    _recordings = recordings
+    _timing = timing
+
+
+def stop():
+    '''
+    Runs the commands normally again.
+    '''
+    global mode, _directory, _recordings
+    mode = None
+    _directory = None
+    _recordings = None
+
+
+def isolated():
+    '''
+    Tells whether the persistent state of this machine must not be used.
+
+    :returns: Whether a recording or replay is active
+    :rtype: bool
+    '''
+    return mode is not None
+
+
+def _model():
+    # The product version holds the model name on ThinkPads, the product name
+    # is only a type number like 4299CTO.
+    for name in ('product_version', 'product_name'):
+        try:
+            with open(os.path.join('/sys/class/dmi/id', name)) as handle:
+                value = handle.read().strip()
+        except OSError:
+            continue
+        if value:
+            return value
+    return None
+
+
+def _append(entry):
+    import json
+
+    with open(os.path.join(_directory, INDEX), 'a') as handle:
+        handle.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _store_output(output):
+    import hashlib
+
+    digest = hashlib.sha1(output).hexdigest()[:16]
+    path = os.path.join(_directory, 'stdout', digest)
+    if not os.path.exists(path):
+        with open(path, 'wb') as handle:
+            handle.write(output)
+    return digest
+
+
+def _load_output(digest):
+    if digest is None:
+        return b''
+    with open(os.path.join(_directory, 'stdout', digest), 'rb') as handle:
+        return handle.read()
+
+
+def _save(command, start, returncode, output=None, error=None, complete=True):
+    entry = {'argv': list(command), 'returncode': returncode,
+             'duration': round(time.perf_counter() - start, 6)}
+    if output:
+        entry['stdout'] = _store_output(output)
+    if error is not None:
+        entry['error'] = error
+    if not complete:
+        entry['complete'] = False
+    _append(entry)
+
+
+def wrap(function, command, streaming=False):
+    '''
+    Wraps one of the functions behind the command wrappers in :mod:`tps` such
+    that it records or replays the given command.
+
+    :param function: ``subprocess.check_call``, ``subprocess.call``,
+        ``subprocess.check_output`` or ``tps._stream_output``
+    :param list command: Command as given by the caller, before the program is
+        resolved on ``PATH``
+    :param bool streaming: The function is a generator of output lines
+    :returns: Function with the same signature and behavior
+    '''
+    if mode == 'replay':
+        return _replayer(function.__name__, command, streaming)
+    if streaming:
+        return lambda *args, **kwargs: _record_lines(
+            command, function(*args, **kwargs))
+    return lambda *args, **kwargs: _record_call(function, command, *args,
+                                                **kwargs)
+
+
+def _record_call(function, command, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    except subprocess.CalledProcessError as e:
+        _save(command, start, e.returncode, e.output)
+        raise
+    except OSError as e:
+        _save(command, start, None, error=type(e).__name__)
+        raise
+    if isinstance(result, bytes):
+        _save(command, start, 0, result)
+    else:
+        _save(command, start, result)
+    return result
+
+
+def _record_lines(command, lines):
+    start = time.perf_counter()
+    output = []
+    try:
+        for line in lines:
+            output.append(line)
+            yield line
+    except subprocess.CalledProcessError as e:
+        _save(command, start, e.returncode, b''.join(output))
+        raise
+    except GeneratorExit:
+        # The program is terminated, only the lines read so far are known.
+        lines.close()
+        _save(command, start, None, b''.join(output), complete=False)
+        raise
+    except OSError as e:
+        _save(command, start, None, error=type(e).__name__)
+        raise
+    _save(command, start, 0, b''.join(output))
+
+
+def _next_recording(command):
+    recordings = _recordings.get(tuple(command))
+    if not recordings:
+        raise NotRecordedException(
+            'No recording of “{}” in {}'.format(' '.join(command),
+                                                 _directory))
+    entry = recordings[0]
+    if len(recordings) > 1:
+        recordings.pop(0)
+    if _timing:
+        time.sleep(entry['duration'])
+    if entry.get('error') is not None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT),
+                                command[0])
+    return entry
+
+
+def _replayer(name, command, streaming):
+    if streaming:
+        return lambda *args, **kwargs: _replay_lines(command)
+
+    def replay(*args, **kwargs):
+        entry = _next_recording(command)
+        returncode = entry['returncode']
+        output = _load_output(entry.get('stdout'))
+        if name == 'call':
+            return returncode
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, output)
+        return output if name == 'check_output' else returncode
+    return replay
+
+
+def _replay_lines(command):
+    entry = _next_recording(command)
+    yield from _load_output(entry.get('stdout')).splitlines(True)
+    if entry.get('complete', True) and entry['returncode'] != 0:
+        raise subprocess.CalledProcessError(entry['returncode'], command)
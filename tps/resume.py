@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Restoring the applied state after a resume from suspend.
+
+Some models lose the rotation of the screen, the arrangement of the screens
+at the docking station or the disabled TrackPoint and TouchPad while they
+sleep. Rotating and docking therefore record what they applied with
+:func:`record`, in entries of :mod:`tps.cache` that are named ``state-`` and
+the part. The mapping of the input devices is recorded by
+:func:`tps.input.store_mapping`.
+
+``thinkpad-resume`` compares the recorded state with the current one and
+only applies the parts that were lost. If nothing was lost, this takes one
+query of ``xrandr`` and a few of ``xinput``.
+'''
+
+import argparse
+import contextlib
+import logging
+import sys
+
+import tps
+import tps.cache
+import tps.config
+import tps.drm
+import tps.metrics
+import tps.screen
+
+logger = logging.getLogger(__name__)
+
+
+def _key():
+    return {'connectors': tps.drm.connectors()}
+
+
+def record(part, value):
+    '''
+    Records a part of the applied state.
+
+    :param str part: ``rotation``, ``layout`` or ``devices``
+    :param value: Value that can be represented in JSON, ``None`` if there is
+        nothing to restore
+    '''
+    tps.cache.store('state-' + part, _key(), value)
+
+
+def recorded(part):
+    '''
+    Loads a part of the applied state.
+
+    :param str part: Part like in :func:`record`
+    :returns: Recorded value, ``None`` if there is none
+    '''
+    return tps.cache.load('state-' + part, _key())
+
+
+def record_device(name, enabled):
+    '''
+    Records whether an input device is enabled.
+
+    :param str name: Name of the device as :func:`tps.input.get_xinput_id`
+        takes it
+    :param bool enabled: State of the device
+    '''
+    devices = recorded('devices') or {}
+    devices[name] = enabled
+    record('devices', devices)
+
+
+def desired_outputs(layout, rotation, internal):
+    '''
+    Combines the recorded layout and rotation into the outputs that should be
+    set.
+
+    The rotation is recorded after the layout if the screen was rotated at
+    the docking station, so it takes precedence for the internal screen.
+
+    :param dict layout: Recorded layout like :func:`tps.layout.capture` gives
+        it, ``None`` if undocked or other monitors are connected
+    :param dict rotation: Recorded rotation with ``output`` and ``rotation``
+    :param str internal: Name of the internal screen
+    :returns: Outputs like :func:`tps.layout.parse_layout` gives them, only
+        with the internal screen if there is no layout
+    :rtype: list
+    '''
+    if layout is not None:
+        outputs = [dict(output) for output in layout['outputs']]
+    else:
+        outputs = [{'name': internal}]
+    if rotation is not None:
+        for output in outputs:
+            if output['name'] == rotation['output'] \
+               and output.get('mode', '') is not None:
+                output['rotation'] = rotation['rotation']
+    return outputs
+
+
+def lost_outputs(desired, current):
+    '''
+    Finds the outputs whose settings differ from the desired ones.
+
+    Only the settings that are given in the desired outputs are compared.
+
+    :param list desired: Outputs from :func:`desired_outputs`
+    :param list current: Outputs from :func:`tps.layout.parse_layout`
+    :returns: Names of the outputs that lost their settings
+    :rtype: list
+    '''
+    current = {output['name']: output for output in current}
+    lost = []
+    for output in desired:
+        now = current.get(output['name'])
+        if now is None or any(now.get(key) != value
+                              for key, value in output.items()):
+            lost.append(output['name'])
+    return lost
+
+
+def resume(config):
+    '''
+    Applies the parts of the recorded state that were lost.
+
+    :param configparser.ConfigParser config: Global config
+    :returns: Names of the parts that were applied
+    :rtype: list
+    '''
+    import tps.input
+    import tps.layout
+
+    applied = []
+    internal = tps.screen.get_internal(config)
+    layout = recorded('layout')
+    rotation = recorded('rotation')
+
+    # Resumed at another desk or without the docking station, the screens are
+    # left to `thinkpad-dock`. The mapping of the input devices is stale then.
+    same_monitors = True
+    if layout is not None:
+        edids = tps.layout.read_edids(internal, config)
+        if tps.layout.fingerprint(edids) != layout.get('fingerprint'):
+            logger.info('Other monitors are connected than before.')
+            same_monitors = False
+            layout = None
+
+    if layout is not None or rotation is not None:
+        with contextlib.closing(tps.stream_output(['xrandr', '--current'],
+                                                  logger)) as lines:
+            current, screen = tps.layout.parse_layout(lines)
+        desired = desired_outputs(layout, rotation, internal)
+        lost = lost_outputs(desired, current)
+        if lost:
+            logger.info('Screens %s lost their settings.', ', '.join(lost))
+            if layout is not None:
+                if tps.layout.apply({'outputs': desired}):
+                    applied.append('layout')
+            else:
+                tps.screen.rotate(internal, tps.translate_direction(
+                    rotation['rotation']))
+                applied.append('rotation')
+
+    # New screen settings need a new mapping, otherwise only the devices that
+    # lost it are mapped.
+    if same_monitors and tps.input.remap(lost_only=not applied):
+        applied.append('mapping')
+
+    for name, enabled in sorted((recorded('devices') or {}).items()):
+        try:
+            device = tps.input.get_xinput_id(name)
+        except tps.input.InputDeviceNotFoundException:
+            logger.debug('Input device %s is not there.', name)
+            continue
+        if tps.input.get_xinput_state(device) != enabled:
+            logger.info('Input device %s lost its state.', name)
+            tps.input.set_xinput_state(device, enabled)
+            applied.append(name)
+
+    return applied
+
+
+def main():
+    '''
+    Command line entry point.
+
+    :returns: None
+    '''
+    options = _parse_args()
+    config = tps.config.get_config()
+
+    if options.via_hook is not None \
+       and options.via_hook not in config['trigger']['resume_triggers'].split():
+        sys.exit(0)
+
+    tps.config.set_up_logging(options.verbose, config)
+
+    with tps.metrics.Action('resume', config, options.via_hook):
+        applied = resume(config)
+    logger.info('Restored %s.', ', '.join(applied) or 'nothing')
+
+
+def _parse_args():
+    '''
+    Parses the command line arguments.
+
+    :return: Namespace with arguments.
+    :rtype: Namespace
+    '''
+    parser = argparse.ArgumentParser(
+        description='Restores the rotation, the screens and the input '
+                    'devices after a resume from suspend.')
+    parser.add_argument("-v", dest='verbose', action="count",
+                        help='Enable verbose output. Can be supplied multiple '
+                             'times for even more verbosity.')
+    parser.add_argument('--via-hook', help='Let the program know that it was called using the specified hook. You do not need to care about this.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
+    options = parser.parse_args()
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
+
+    return options
+
+
+if __name__ == '__main__':
+    main()
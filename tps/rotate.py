@@ -10,11 +10,8 @@ import sys
 
 import tps
 import tps.config
-import tps.hooks
-import tps.input
+import tps.metrics
 import tps.screen
-import tps.unity
-import tps.vkeyboard
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +21,11 @@ def main():
     Entry point for ``thinkpad-rotate``.
     '''
     options = _parse_args()
-
     config = tps.config.get_config()
 
     # Quickly abort if the call is by the hook and the user disabled the
-    # trigger.
+    # trigger. This happens before the logging is set up, which starts a
+    # thread for syslog. The deprecation warnings still go to the console.
     if options.via_hook is not None:
         if 'enable_rotate' in config['trigger']:
             # The user has this key in his configuration. The default does not
@@ -41,37 +38,76 @@ def main():
         elif options.via_hook not in config['trigger']['rotate_triggers'].split():
             sys.exit(0)
 
-    if options.via_hook is not None:
-        xrandr_bug_fail_early(config)
-
-    try:
-        new_direction = new_rotation(
-            tps.screen.get_rotation(tps.screen.get_internal(config)),
-            options.direction, config, options.force_direction)
-    except tps.UnknownDirectionException:
-        logger.error('Direction cannot be understood.')
-        sys.exit(1)
-    except tps.screen.ScreenNotFoundException as e:
-        logger.error('Unable to determine rotation of "{}": {}'.format(
-            tps.screen.get_internal(config), e))
-        sys.exit(1)
+    tps.config.set_up_logging(options.verbose, config)
 
-    rotate_to(new_direction, config)
+    rotate(config, options.direction, options.force_direction,
+           options.via_hook)
 
 
+def rotate(config, direction=None, force_direction=False, via_hook=None):
+    '''
+    Rotates the internal screen like ``thinkpad-rotate`` does.
+
+    :param configparser.ConfigParser config: Global config
+    :param str direction: Desired direction, the default rotation or normal if
+        ``None``, see :func:`new_rotation`
+    :param bool force_direction: Rotate even if the screen already is in the
+        desired direction
+    :param str via_hook: Trigger that started the rotation, ``None`` if
+        started by hand
+    :raises SystemExit: The direction or the current rotation cannot be
+        understood
+    '''
+    with tps.metrics.Action('rotate', config, via_hook):
+        if via_hook is not None:
+            xrandr_bug_fail_early(config)
+
+        try:
+            try:
+                rotation = tps.screen.get_rotation(
+                    tps.screen.get_internal(config))
+            except tps.screen.ScreenNotFoundException:
+                # The cached name may be outdated after a driver switch.
+                rotation = tps.screen.get_rotation(
+                    tps.screen.check_internal(config))
+            new_direction = new_rotation(rotation, direction, config,
+                                         force_direction)
+        except tps.UnknownDirectionException:
+            logger.error('Direction cannot be understood.')
+            sys.exit(1)
+        except tps.screen.ScreenNotFoundException as e:
+            logger.error('Unable to determine rotation of "{}": {}'.format(
+                tps.screen.get_internal(config), e))
+            sys.exit(1)
+
+        rotate_to(new_direction, config)
+
+
+@tps.trace.traced('action')
 def rotate_to(direction, config):
     '''
     Performs all steps needed for a screen rotation.
     '''
+    # These are only needed when actually rotating, so they are not loaded
+    # when the program exits early because of a disabled trigger.
+    import tps.hooks
+    import tps.input
+    import tps.resume
+    import tps.unity
+    import tps.vkeyboard
+
     tps.hooks.prerotate(direction, config)
 
     tps.screen.rotate(tps.screen.get_internal(config), direction)
+    tps.resume.record('rotation', {'output': tps.screen.get_internal(config),
+                                   'rotation': direction.xrandr})
     tps.input.map_rotate_all_input_devices(tps.screen.get_internal(config),
                                            direction)
 
     if config['rotate'].getboolean('subpixels'):
         if config['rotate'].getboolean('subpixels_with_external') \
-           or not tps.screen.get_externals(tps.screen.get_internal(config)):
+           or not tps.screen.get_externals(tps.screen.get_internal(config),
+                                           config):
             tps.screen.set_subpixel_order(direction)
 
     if config['unity'].getboolean('toggle_launcher'):
@@ -86,6 +122,7 @@ def rotate_to(direction, config):
             trackpoint_xinput_id,
             not direction.physically_closed,
         )
+        tps.resume.record_device('TrackPoint', not direction.physically_closed)
     except tps.input.InputDeviceNotFoundException as e:
         logger.info('TrackPoint was not found, could not be (de)activated.')
         logger.debug('Exception was: “%s”', str(e))
@@ -96,6 +133,7 @@ def rotate_to(direction, config):
             touchpad_xinput_id,
             not direction.physically_closed,
         )
+        tps.resume.record_device('TouchPad', not direction.physically_closed)
     except tps.input.InputDeviceNotFoundException as e:
         logger.info('TouchPad was not found, could not be (de)activated.')
         logger.debug('Exception was: “%s”', str(e))
@@ -174,7 +212,8 @@ def has_external_screens(config):
     '''
     Checks whether any external screens are attached.
     '''
-    externals = tps.screen.get_externals(tps.screen.get_internal(config))
+    externals = tps.screen.get_externals(tps.screen.get_internal(config),
+                                         config)
     return len(externals) > 0
 
 
@@ -218,9 +257,6 @@ def _parse_args():
     """
     Parses the command line arguments.
 
-    If the logging module is imported, set the level according to the number of
-    ``-v`` given on the command line.
-
     :return: Namespace with arguments.
     :rtype: Namespace
     """
@@ -232,9 +268,11 @@ def _parse_args():
     parser.add_argument('--via-hook', help='Let the program know that it was called using the specified hook. You do not need to care about this.')
     parser.add_argument('--force-direction', action='store_true', help='Do not try to be smart. Actually rotate in the direction given even it already is the case.')
 
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
     options = parser.parse_args()
-
-    tps.config.set_up_logging(options.verbose)
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
 
     return options
 
@@ -9,11 +9,15 @@
 Screen related logic.
 '''
 
+import contextlib
 import logging
 import re
 import subprocess
 
 import tps
+import tps.cache
+import tps.drm
+import tps.metrics
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +29,25 @@ class ScreenNotFoundException(Exception):
     pass
 
 
+def probe():
+    '''
+    Lets the X server probe all outputs for connected screens.
+
+    The queries in this module use ``xrandr --current``, which only reports the
+    configuration that the X server already knows about. A full probe reads
+    the EDID of every connected screen over DDC. That is slow and makes some
+    screens blink, therefore it is only done when the set of connected screens
+    is expected to have changed, for instance right after docking.
+
+    :returns: Names of all outputs
+    :rtype: list
+    '''
+    lines = tps.check_output(['xrandr', '--query'], logger).split(b'\n')
+    names = parse_output_names(lines)
+    tps.drm.store_x_outputs(names)
+    return names
+
+
 def get_rotation(screen):
     '''
     Gets the current rotation of the given screen.
@@ -33,40 +56,117 @@ def get_rotation(screen):
     :returns: Current direction
     :rtype: tps.Direction
     '''
-    output = tps.check_output(['xrandr', '-q', '--verbose'], logger).decode()
-    lines = output.split('\n')
-    for line in lines:
-        if screen in line:
-            matcher = re.search(r'\) (normal|left|inverted|right) \(', line)
-            if matcher:
-                rotation = tps.translate_direction(matcher.group(1))
-                logger.info('Current rotation is “{}”.'.format(rotation))
-                return rotation
-    else:
+    with contextlib.closing(tps.stream_output(
+            ['xrandr', '--current', '--verbose'], logger)) as lines:
+        rotation = parse_rotation(lines, screen)
+
+    if rotation is None:
         raise ScreenNotFoundException(
             'Screen "{}" is not enabled. Do you have a screen like that in '
             'the output of "xrandr", and is it enabled? Maybe you have to '
             'adjust the option of screen.internal in the '
             'configuration.'.format(screen))
 
+    rotation = tps.translate_direction(rotation)
+    logger.info('Current rotation is “{}”.'.format(rotation))
+    return rotation
+
 
-def get_externals(internal):
+@tps.trace.traced('parse')
+def parse_rotation(lines, screen):
+    '''
+    Finds the rotation of the given screen in the output of ``xrandr
+    --verbose``.
+
+    Parsing stops at the line describing the screen. The rest of the output,
+    which contains long EDID dumps, is not looked at.
+
+    :param lines: Lines of the output as bytes
+    :param str screen: Name of the output
+    :returns: Rotation as ``xrandr`` calls it, ``None`` if the screen is not
+        enabled
+    :rtype: str
+    '''
+    prefix = screen.encode() + b' '
+    for line in lines:
+        if line.startswith(prefix):
+            matcher = re.search(rb'\) (normal|left|inverted|right) \(', line)
+            if matcher:
+                return matcher.group(1).decode()
+            return None
+    return None
+
+
+def get_externals(internal, config=None):
     '''
     Gets the external screens.
 
     You have to specify the internal screen to exclude that from the listing.
 
+    If a config is given and ``screen.drm_status`` is enabled, the connected
+    screens are read from sysfs with :func:`tps.drm.connected_outputs`. This
+    is the state of the hardware right now. Without a config, or if the
+    connectors cannot be mapped to the X outputs, the state that the X server
+    knows from its last probe is taken from ``xrandr``. That includes
+    screens which are still enabled but have been unplugged since.
+
     ;param str internal: Name of the internal screen
+    :param configparser.ConfigParser config: Global config
     :returns: List of external screen names
     :rtype: str
     '''
+    if config is not None and config['screen'].getboolean('drm_status'):
+        connected = tps.drm.connected_outputs(internal)
+        if connected is not None:
+            externals = [output for output in connected if output != internal]
+            tps.metrics.annotate(screens=len(externals) + 1)
+            return externals
+
+    lines = tps.check_output(['xrandr', '--current'], logger).split(b'\n')
+    tps.drm.store_x_outputs(parse_output_names(lines))
+    externals = parse_externals(lines, internal)
+    tps.metrics.annotate(screens=len(externals) + 1)
+    return externals
+
+
+@tps.trace.traced('parse')
+def parse_output_names(lines):
+    '''
+    Finds the names of all outputs in the output of ``xrandr``, connected or
+    not.
+
+    :param lines: Lines of the output as bytes
+    :returns: List of output names
+    :rtype: list
+    '''
+    pattern = re.compile(rb'^(\S+) (?:dis)?connected')
+    names = []
+    for line in lines:
+        matcher = pattern.match(line)
+        if matcher:
+            names.append(matcher.group(1).decode())
+    return names
+
+
+@tps.trace.traced('parse')
+def parse_externals(lines, internal):
+    '''
+    Finds the connected screens other than the internal one in the output of
+    ``xrandr``.
+
+    :param lines: Lines of the output as bytes
+    :param str internal: Name of the internal screen
+    :returns: List of external screen names
+    :rtype: list
+    '''
+    internal = internal.encode()
+    pattern = re.compile(rb'^(\S+) connected')
     externals = []
-    lines = tps.check_output(['xrandr'], logger).decode().split('\n')
     for line in lines:
         if not line.startswith(internal):
-            matcher = re.search(r'^(\S+) connected', line)
+            matcher = pattern.match(line)
             if matcher:
-                externals.append(matcher.group(1))
+                externals.append(matcher.group(1).decode())
     return externals
 
 
@@ -181,11 +281,35 @@ def get_resolution_and_shift(output):
     3286×1080 and the position of the internal screen is 1366×768+1920+0. This
     allows to compute the transformation matrix for this.
     '''
-    xrandr_output = tps.check_output(['xrandr', '-q'], logger).strip().decode()
-    lines = xrandr_output.split('\n')
+    with contextlib.closing(tps.stream_output(['xrandr', '--current'],
+                                              logger)) as lines:
+        result = parse_resolution_and_shift(lines, output)
+
+    if result is None:
+        raise ScreenNotFoundException(
+            'The screen and output dimensions could not be gathered from '
+            'xrandr. Maybe the "{}" output is not attached or enabled? Please '
+            'report a bug otherwise.'.format(output))
+
+    return result
+
+
+@tps.trace.traced('parse')
+def parse_resolution_and_shift(lines, output):
+    '''
+    Finds the size of the virtual screen and the geometry of the given output
+    in the output of ``xrandr``.
 
-    pattern_output = re.compile(r'''
-                                {}
+    Parsing stops as soon as both have been found.
+
+    :param lines: Lines of the output as bytes
+    :param str output: Name of the output
+    :returns: Dictionary like :func:`get_resolution_and_shift` returns it,
+        ``None`` if the output is not enabled
+    :rtype: dict
+    '''
+    prefix = output.encode() + b' '
+    pattern_output = re.compile(rb'''
                                 \D+
                                 (?P<width>\d+)
                                 x
@@ -194,31 +318,30 @@ def get_resolution_and_shift(output):
                                 (?P<x>\d+)
                                 \+
                                 (?P<y>\d+)
-                                '''.format(output), re.VERBOSE)
-    pattern_screen = re.compile('current (?P<width>\d+) x (?P<height>\d+)')
+                                ''', re.VERBOSE)
+    pattern_screen = re.compile(rb'current (?P<width>\d+) x (?P<height>\d+)')
 
     result = {}
 
     for line in lines:
-        m_output = pattern_output.search(line)
-        if m_output:
-            result['output_width'] = int(m_output.group('width'))
-            result['output_height'] = int(m_output.group('height'))
-            result['output_x'] = int(m_output.group('x'))
-            result['output_y'] = int(m_output.group('y'))
-
-        m_screen = pattern_screen.search(line)
-        if m_screen:
-            result['screen_width'] = int(m_screen.group('width'))
-            result['screen_height'] = int(m_screen.group('height'))
-
-    if len(result) != 6:
-        raise ScreenNotFoundException(
-            'The screen and output dimensions could not be gathered from '
-            'xrandr. Maybe the "{}" output is not attached or enabled? Please '
-            'report a bug otherwise.'.format(output))
+        if line.startswith(prefix):
+            m_output = pattern_output.match(line, len(prefix) - 1)
+            if m_output:
+                result['output_width'] = int(m_output.group('width'))
+                result['output_height'] = int(m_output.group('height'))
+                result['output_x'] = int(m_output.group('x'))
+                result['output_y'] = int(m_output.group('y'))
 
-    return result
+        elif line.startswith(b'Screen '):
+            m_screen = pattern_screen.search(line)
+            if m_screen:
+                result['screen_width'] = int(m_screen.group('width'))
+                result['screen_height'] = int(m_screen.group('height'))
+
+        if len(result) == 6:
+            return result
+
+    return None
 
 
 @tps.static_vars(cached_internal=None)
@@ -234,6 +357,12 @@ def get_internal(config, cache=True):
     the configuration file. This also gives out-of-the-box support for Yoga
     users where the internal screen is called ``eDP1`` or ``eDP-1``.
 
+    The internal screen of a laptop does not change, so the name is stored in
+    the ``internal`` entry of :mod:`tps.cache`. The entry is keyed on the DRM
+    connectors and the regular expression, later programs only have to list a
+    directory in sysfs instead of running ``xrandr``. Use
+    :func:`check_internal` where the name may have become outdated.
+
     :param config: Configuration parser instance
     :param bool cache: Compute the value again even if it is cached
     '''
@@ -249,18 +378,58 @@ def get_internal(config, cache=True):
         internal = config['screen']['internal']
     else:
         # There is no such option, therefore we need to match the regular
-        # expression against the output of XRandR now.
-        output = tps.check_output(['xrandr'], logger).decode().strip()
-        screens = get_available_screens(output)
-        logger.debug('Screens available on this system are %s.', ', '.join(screens))
-        internal = filter_outputs(screens, config['screen']['internal_regex'])
-        logger.debug('Internal screen is determined to be %s.', internal)
+        # expression against the output of XRandR now, unless that has been
+        # done before on this hardware.
+        regex = config['screen']['internal_regex']
+        key = {'connectors': tps.drm.connectors(), 'regex': regex}
+        cached = tps.cache.load('internal', key) if cache else None
+        if cached is not None:
+            internal = cached['name']
+            logger.debug('Internal screen is cached as %s.', internal)
+        else:
+            raw = tps.check_output(['xrandr', '--current'], logger)
+            tps.drm.store_x_outputs(parse_output_names(raw.split(b'\n')))
+            output = raw.decode().strip()
+            screens = get_available_screens(output)
+            tps.metrics.annotate(screens=len(screens))
+            logger.debug('Screens available on this system are %s.', ', '.join(screens))
+            internal = filter_outputs(screens, regex)
+            logger.debug('Internal screen is determined to be %s.', internal)
+            tps.cache.store('internal', key, {'name': internal})
 
     get_internal.cached_internal = internal
 
     return internal
 
 
+def check_internal(config, outputs=None):
+    '''
+    Makes sure that the X server still has the internal screen.
+
+    Switching between the Intel and the modesetting driver renames the outputs,
+    for instance ``LVDS1`` to ``LVDS-1``, but keeps the DRM connectors. The
+    name in the cache is outdated then and is detected again, which also
+    renews the ``x-outputs`` entry of :mod:`tps.drm`.
+
+    :param config: Configuration parser instance
+    :param list outputs: Names of all outputs, they are queried if not given
+    :returns: Name of the internal screen
+    :rtype: str
+    '''
+    internal = get_internal(config)
+    if 'internal' in config['screen']:
+        return internal
+    if outputs is None:
+        outputs = parse_output_names(
+            tps.check_output(['xrandr', '--current'], logger).split(b'\n'))
+    if internal in outputs:
+        return internal
+    logger.info('The X server has no output %s, detecting the internal '
+                'screen again.', internal)
+    return get_internal(config, cache=False)
+
+
+@tps.trace.traced('parse')
 def get_available_screens(output):
     lines = output.split('\n')
     pattern = re.compile(r'^(?P<name>[\w\d-]+) connected')
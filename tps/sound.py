@@ -9,8 +9,8 @@ Logic for sound.
 '''
 
 import argparse
+import contextlib
 import logging
-import re
 
 import tps
 import tps.config
@@ -31,8 +31,28 @@ def get_pulseaudio_sinks():
         logger.warning('pactl is not installed')
         return []
 
-    output = tps.check_output(['pactl', 'list', 'sinks'], logger).decode()
-    sinks = re.findall('^Sink #(\d+)$', output, flags=re.MULTILINE)
+    command = ['pactl', 'list', 'short', 'sinks']
+    with contextlib.closing(tps.stream_output(command, logger)) as lines:
+        return parse_pulseaudio_sinks(lines)
+
+
+@tps.trace.traced('parse')
+def parse_pulseaudio_sinks(lines):
+    '''
+    Extracts the sink numbers from the output of ``pactl list short sinks``.
+
+    The short listing has one tab separated line per sink with the number in
+    the first column. The long listing would contain every property of every
+    sink.
+
+    :param lines: Lines of the output as bytes
+    :rtype: list of str
+    '''
+    sinks = []
+    for line in lines:
+        sink = line.split(b'\t', 1)[0].strip()
+        if sink.isdigit():
+            sinks.append(sink.decode())
     return sinks
 
 
@@ -68,9 +88,27 @@ def main_mutemic():
     parser.add_argument("-v", dest='verbose', action="count",
                         help='Enable verbose output. Can be supplied multiple '
                              'times for even more verbosity.')
+    parser.add_argument('--via-hook', help='Let the program know that it was called using the specified hook. You do not need to care about this.')
+    tps.trace.add_arguments(parser)
+    tps.record.add_arguments(parser)
     options = parser.parse_args()
-    tps.config.set_up_logging(options.verbose)
+    tps.trace.set_up(options)
+    tps.record.set_up(options)
+    config = tps.config.get_config()
 
+    if options.via_hook is not None \
+       and options.via_hook not in config['trigger']['mutemic_triggers'].split():
+        return
+
+    tps.config.set_up_logging(options.verbose, config)
+
+    toggle_mic()
+
+
+def toggle_mic():
+    '''
+    Toggles the mute status of the microphone with ``amixer``.
+    '''
     tps.check_call(['amixer', 'sset', "'Capture',0", 'toggle'], logger)
 
 
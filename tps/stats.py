@@ -0,0 +1,509 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Latency statistics from the syslog messages of the programs.
+
+:func:`tps.config.set_up_logging` sends every program start, every spawned
+command and the end of the program to syslog with the ``thinkpad-scripts``
+tag. This module reads syslog files and journal exports line by line, rebuilds
+each invocation from these messages and reports latency percentiles per
+action, the slowest commands and how often the triggers fire.
+
+Only a bounded amount of state is kept: the invocations that are still open,
+histograms with logarithmic buckets instead of all durations, and a heap with
+the slowest commands. Files of any size can therefore be analyzed.
+'''
+
+import argparse
+import ast
+import datetime
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+SYSLOG_IDENTIFIER = 'thinkpad-scripts'
+'Tag of the syslog messages, see :func:`tps.config.set_up_logging`'
+
+MAX_OPEN = 256
+'Maximum number of invocations that are tracked at the same time'
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec']
+
+_pattern_syslog = re.compile(r'''
+    ^(?:(?P<iso>\d{4}-\d\d-\d\dT\S+)
+      |(?P<month>[A-Z][a-z]{2})\ +(?P<day>\d+)
+       \ (?P<clock>\d\d:\d\d:\d\d(?:\.\d+)?))
+    \ \S+
+    \ ''' + SYSLOG_IDENTIFIER + r'''(?:\[(?P<pid>\d+)\])?:
+    \ (?P<message>.*)$
+    ''', re.VERBOSE)
+_pattern_message = re.compile(r'^\S+ [A-Z]+ (.*)$')
+_pattern_start = re.compile(r'^Program was started with arguments: (\[.*\])$')
+_pattern_subprocess = re.compile(r'^subprocess “(.*)”$')
+_pattern_finished = re.compile(r'^Program finished')
+_pattern_export_field = re.compile(rb'^[A-Z0-9_]+=')
+
+_export_fields = {b'MESSAGE', b'SYSLOG_IDENTIFIER', b'_PID',
+                  b'__REALTIME_TIMESTAMP'}
+
+
+class LogHistogram(object):
+    '''
+    Histogram with logarithmically spaced buckets.
+
+    The memory does not grow with the number of values, only with the range
+    that they span. A percentile is off by at most half a bucket width, which
+    is about 4 % with the default factor.
+
+    :param float minimum: Upper bound of the first bucket
+    :param float factor: Ratio of the bounds of two neighboring buckets
+    '''
+
+    def __init__(self, minimum=1e-4, factor=10 ** (1 / 32)):
+        self.minimum = minimum
+        self.factor = factor
+        self._log_factor = math.log(factor)
+        self.counts = {}
+        self.count = 0
+        self.maximum = 0.0
+
+    def add(self, value):
+        if value <= self.minimum:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(value / self.minimum)
+                                  / self._log_factor))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, percent):
+        '''
+        Estimates a percentile.
+
+        :param float percent: Percentile between 0 and 100
+        :returns: Geometric center of the bucket with the percentile, at most
+            the largest value
+        :rtype: float
+        '''
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                break
+        value = self.minimum * self.factor ** (index - 0.5)
+        return min(value, self.maximum)
+
+
+class Invocation(object):
+    '''
+    One run of a program as rebuilt from its log messages.
+    '''
+
+    __slots__ = ['argv', 'action', 'trigger', 'is_hook', 'start', 'last',
+                 'commands', 'pending']
+
+    def __init__(self, argv, timestamp):
+        self.argv = argv
+        self.action, self.trigger = describe(argv)
+        self.is_hook = os.path.basename(argv[0]).endswith('-hook')
+        self.start = timestamp
+        self.last = timestamp
+        self.commands = 0
+        self.pending = None
+
+
+def describe(argv):
+    '''
+    Names the action and the trigger of an invocation.
+
+    :param list argv: Arguments of the program
+    :returns: Action like ``dock on`` and the value of ``--via-hook``
+    :rtype: tuple
+    '''
+    name = os.path.basename(argv[0])
+    if name.startswith('thinkpad-'):
+        name = name[len('thinkpad-'):]
+    words = [name]
+    trigger = None
+    arguments = iter(argv[1:])
+    for argument in arguments:
+        if argument == '--via-hook':
+            trigger = next(arguments, None)
+        elif argument.startswith('--via-hook='):
+            trigger = argument.split('=', 1)[1]
+        elif argument in ('--trace', '--record', '--replay'):
+            next(arguments, None)
+        elif not argument.startswith('-'):
+            words.append(argument)
+    return ' '.join(words), trigger
+
+
+class Analyzer(object):
+    '''
+    Collects the statistics from a stream of log messages.
+
+    :param int top: Number of slowest commands to keep
+    '''
+
+    def __init__(self, top=10):
+        self.top = top
+        self.actions = {}
+        self.programs = {}
+        self.slowest = []
+        self.triggers = {}
+        self.invocations = 0
+        self.messages = 0
+        self._open = {}
+        self._sequence = 0
+
+    def feed(self, timestamp, pid, text):
+        '''
+        Processes one message.
+
+        :param float timestamp: Unix time of the message
+        :param pid: Process ID, ``None`` if the log does not have it. Then the
+            invocations are assumed to not overlap.
+        :param str text: Message as logged, without logger name and level
+        '''
+        self.messages += 1
+
+        m_start = _pattern_start.match(text)
+        if m_start:
+            try:
+                argv = ast.literal_eval(m_start.group(1))
+            except (ValueError, SyntaxError):
+                return
+            self._close(pid)
+            invocation = Invocation(argv, timestamp)
+            self._open[pid] = invocation
+            self.invocations += 1
+            if invocation.trigger is not None and invocation.is_hook:
+                self._trigger(invocation.trigger)[0] += 1
+            if len(self._open) > MAX_OPEN:
+                oldest = min(self._open, key=lambda key: self._open[key].last)
+                self._close(oldest)
+            return
+
+        invocation = self._open.get(pid)
+        if invocation is None:
+            return
+
+        if invocation.pending is not None:
+            command, started = invocation.pending
+            self._command(command, timestamp - started, started)
+            invocation.pending = None
+        invocation.last = timestamp
+
+        m_subprocess = _pattern_subprocess.match(text)
+        if m_subprocess:
+            invocation.pending = (m_subprocess.group(1), timestamp)
+            invocation.commands += 1
+        elif _pattern_finished.match(text):
+            self._close(pid)
+
+    def finish(self):
+        '''
+        Closes all invocations that are still open.
+        '''
+        for pid in list(self._open):
+            self._close(pid)
+
+    def _trigger(self, trigger):
+        return self.triggers.setdefault(trigger, [0, 0])
+
+    def _close(self, pid):
+        invocation = self._open.pop(pid, None)
+        if invocation is None:
+            return
+        # Without a message after it, the duration of the last command is not
+        # known, it is left out.
+        self.actions.setdefault(invocation.action, LogHistogram()).add(
+            invocation.last - invocation.start)
+        if invocation.trigger is not None and not invocation.is_hook \
+           and invocation.commands > 0:
+            self._trigger(invocation.trigger)[1] += 1
+
+    def _command(self, command, duration, started):
+        program = os.path.basename(command.split(' ', 1)[0])
+        self.programs.setdefault(program, LogHistogram()).add(duration)
+        self._sequence += 1
+        item = (duration, self._sequence, started, command)
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+
+def _parse_iso(text):
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    elif re.search(r'[+-]\d{4}$', text):
+        text = text[:-2] + ':' + text[-2:]
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def parse_syslog(lines, year=None):
+    '''
+    Extracts the messages from a syslog file or the short output formats of
+    ``journalctl``.
+
+    Both the traditional timestamps like ``Mar 14 12:02:03`` and ISO 8601
+    timestamps are understood. The traditional ones have no year, it is
+    counted up when the month goes back.
+
+    :param lines: Lines of the file as strings
+    :param int year: Year of the first line, default is the current year
+    :returns: Generator of ``(timestamp, pid, text)`` tuples
+    '''
+    if year is None:
+        year = datetime.date.today().year
+    last_month = None
+    for line in lines:
+        if SYSLOG_IDENTIFIER not in line:
+            continue
+        m_line = _pattern_syslog.match(line.rstrip('\n'))
+        if not m_line:
+            continue
+        try:
+            if m_line.group('iso'):
+                timestamp = _parse_iso(m_line.group('iso'))
+            else:
+                month = MONTHS.index(m_line.group('month')) + 1
+                if last_month is not None and month < last_month:
+                    year += 1
+                last_month = month
+                clock = datetime.datetime.strptime(
+                    m_line.group('clock').split('.')[0], '%H:%M:%S')
+                fraction = m_line.group('clock').partition('.')[2]
+                timestamp = datetime.datetime(
+                    year, month, int(m_line.group('day')), clock.hour,
+                    clock.minute, clock.second).timestamp() \
+                    + (float('0.' + fraction) if fraction else 0)
+        except ValueError:
+            continue
+        m_message = _pattern_message.match(m_line.group('message'))
+        if m_message:
+            pid = m_line.group('pid')
+            yield timestamp, int(pid) if pid else None, m_message.group(1)
+
+
+def _journal_message(timestamp, pid, identifier, message):
+    if identifier != SYSLOG_IDENTIFIER or message is None:
+        return None
+    m_message = _pattern_message.match(message.rstrip('\x00\n'))
+    if not m_message or timestamp is None:
+        return None
+    return (int(timestamp) / 1e6, int(pid) if pid is not None else None,
+            m_message.group(1))
+
+
+def parse_journal_json(lines):
+    '''
+    Extracts the messages from ``journalctl -o json``.
+
+    :param lines: Lines of the file as strings
+    :returns: Generator of ``(timestamp, pid, text)`` tuples
+    '''
+    for line in lines:
+        if SYSLOG_IDENTIFIER not in line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        message = entry.get('MESSAGE')
+        if isinstance(message, list):
+            message = bytes(message).decode('utf-8', 'replace')
+        result = _journal_message(entry.get('__REALTIME_TIMESTAMP'),
+                                  entry.get('_PID'),
+                                  entry.get('SYSLOG_IDENTIFIER'), message)
+        if result is not None:
+            yield result
+
+
+def _skip(handle, size):
+    while size > 0:
+        chunk = handle.read(min(size, 65536))
+        if not chunk:
+            break
+        size -= len(chunk)
+
+
+def parse_journal_export(handle):
+    '''
+    Extracts the messages from the journal export format of ``journalctl -o
+    export``.
+
+    Only the needed fields are kept, binary fields of other names are skipped
+    without reading them into memory.
+
+    :param handle: File opened in binary mode
+    :returns: Generator of ``(timestamp, pid, text)`` tuples
+    '''
+    entry = {}
+    while True:
+        line = handle.readline()
+        if line in (b'', b'\n'):
+            if entry:
+                result = _journal_message(
+                    entry.get(b'__REALTIME_TIMESTAMP'), entry.get(b'_PID'),
+                    entry.get(b'SYSLOG_IDENTIFIER'), entry.get(b'MESSAGE'))
+                if result is not None:
+                    yield result
+                entry = {}
+            if line == b'':
+                return
+            continue
+
+        line = line.rstrip(b'\n')
+        if b'=' in line:
+            key, _, value = line.partition(b'=')
+            if key in _export_fields:
+                entry[key] = value.decode('utf-8', 'replace')
+        else:
+            # Binary field: name, 64 bit little endian size, data, newline.
+            size, = struct.unpack('<Q', handle.read(8))
+            if line in _export_fields:
+                entry[line] = handle.read(size).decode('utf-8', 'replace')
+            else:
+                _skip(handle, size)
+            handle.read(1)
+
+
+def read_messages(filename, year=None):
+    '''
+    Detects the format of a file and extracts the messages.
+
+    :param str filename: Syslog file, journal export or JSON file, optionally
+        compressed with gzip, ``-`` for standard input
+    :returns: Generator of ``(timestamp, pid, text)`` tuples
+    '''
+    if filename == '-':
+        handle = sys.stdin.buffer
+    elif filename.endswith('.gz'):
+        handle = gzip.open(filename, 'rb')
+    else:
+        handle = open(filename, 'rb')
+
+    with handle:
+        first = handle.peek(256) if hasattr(handle, 'peek') else b''
+        first = first.lstrip()
+        if first.startswith(b'{'):
+            lines = (line.decode('utf-8', 'replace') for line in handle)
+            yield from parse_journal_json(lines)
+        elif _pattern_export_field.match(first):
+            yield from parse_journal_export(handle)
+        else:
+            lines = (line.decode('utf-8', 'replace') for line in handle)
+            yield from parse_syslog(lines, year)
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1:
+        return '{:.0f} ms'.format(seconds * 1e3)
+    return '{:.2f} s'.format(seconds)
+
+
+def _print_histograms(title, histograms, stream):
+    print('{:<28} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        title, 'count', 'p50', 'p90', 'p99', 'max'), file=stream)
+    for name, histogram in sorted(histograms.items(),
+                                  key=lambda item: -item[1].count):
+        print('{:<28} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+            name, histogram.count,
+            *[_format_seconds(histogram.percentile(percent))
+              for percent in (50, 90, 99)],
+            _format_seconds(histogram.maximum)), file=stream)
+
+
+def print_report(analyzer, stream=sys.stdout):
+    '''
+    Prints the statistics as tables.
+
+    :param Analyzer analyzer: Analyzer that has seen all messages
+    '''
+    print('{} invocations in {} messages'.format(
+        analyzer.invocations, analyzer.messages), file=stream)
+    print(file=stream)
+    _print_histograms('action', analyzer.actions, stream)
+    print(file=stream)
+    _print_histograms('command', analyzer.programs, stream)
+
+    if analyzer.slowest:
+        print(file=stream)
+        print('slowest commands', file=stream)
+        for duration, sequence, started, command in sorted(analyzer.slowest,
+                                                           reverse=True):
+            print('{:>9}  {}  {}'.format(
+                _format_seconds(duration),
+                datetime.datetime.fromtimestamp(started).isoformat(
+                    ' ', 'seconds'),
+                command), file=stream)
+
+    if analyzer.triggers:
+        print(file=stream)
+        print('{:<28} {:>7} {:>7}'.format('trigger', 'fired', 'ran'),
+              file=stream)
+        for trigger, (fired, ran) in sorted(analyzer.triggers.items()):
+            print('{:<28} {:>7} {:>7}'.format(trigger, fired, ran),
+                  file=stream)
+
+
+def main():
+    '''
+    Entry point for ``thinkpad-stats``.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Latency statistics from syslog files and journal '
+                    'exports.')
+    parser.add_argument('files', nargs='+',
+                        help='Syslog files, output of `journalctl -o export` '
+                             'or `journalctl -o json`, may be compressed '
+                             'with gzip. Use `-` for standard input.')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of slowest commands to show.')
+    parser.add_argument('--year', type=int,
+                        help='Year of the first line of syslog files with '
+                             'traditional timestamps.')
+    parser.add_argument("-v", dest='verbose', action="count",
+                        help='Enable verbose output. Can be supplied multiple '
+                             'times for even more verbosity.')
+    options = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if options.verbose else logging.WARNING)
+
+    analyzer = Analyzer(options.top)
+    for filename in options.files:
+        logger.info('Reading %s', filename)
+        try:
+            for timestamp, pid, text in read_messages(filename, options.year):
+                analyzer.feed(timestamp, pid, text)
+        except OSError as e:
+            logger.error('Unable to read %s: %s', filename, e)
+            sys.exit(1)
+    analyzer.finish()
+
+    print_report(analyzer)
+
+
+if __name__ == '__main__':
+    main()
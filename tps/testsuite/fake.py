@@ -0,0 +1,403 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Fake ThinkPad that answers the commands tps runs.
+
+:class:`FakeMachine` keeps the state of the screens, input devices, sound and
+network in a plain dictionary and changes it like the real tools would.
+:class:`FakeCommandLayer` replaces the command wrappers in :mod:`tps` such
+that the actions run in-process against a :class:`FakeMachine`, counting the
+spawned programs and adding a simulated latency for each of them.
+'''
+
+import contextlib
+import os
+import shlex
+import subprocess
+import time
+
+import tps
+import tps.config
+import tps.screen
+from tps.testsuite import synthetic
+
+DEFAULT_LATENCY = {
+    'xrandr': 0.030,
+    'xinput': 0.008,
+    'xsetwacom': 0.010,
+    'nmcli': 0.040,
+    'pactl': 0.010,
+    'sudo': 0.020,
+    'lsusb': 0.080,
+}
+'Simulated run time of the programs in seconds'
+
+OTHER_LATENCY = 0.005
+'Simulated run time of programs not in :data:`DEFAULT_LATENCY`'
+
+PROBE_LATENCY = 0.400
+'Additional time of ``xrandr`` when it probes the outputs'
+
+INSTALLED = ['xrandr', 'xinput', 'xsetwacom', 'nmcli', 'pactl', 'sudo', 'who',
+             'lsusb', 'pgrep', 'killall', 'xbacklight', 'amixer']
+'Programs that are installed on the fake machine by default'
+
+
+class FakeMachine(object):
+    '''
+    State of a fake ThinkPad X220 Tablet.
+
+    :param int externals: Number of connected external screens, they are
+        disabled initially
+    :param int wacom: Number of Wacom devices
+    :param dict state: State to continue from, as returned by :attr:`state`
+    '''
+
+    def __init__(self, externals=0, wacom=3, state=None):
+        if state is not None:
+            self.state = state
+            return
+
+        outputs = synthetic.make_outputs(externals=externals, disconnected=3)
+        for output in outputs[1:]:
+            output['enabled'] = False
+            output['mode'] = None
+            output['x'] = 0
+
+        devices = []
+        for name, id, kind in synthetic.make_devices(wacom=wacom):
+            devices.append({
+                'name': name, 'id': id, 'kind': kind, 'enabled': True,
+                'matrix': [1, 0, 0, 0, 1, 0, 0, 0, 1], 'rotate': 'none',
+                'output': None, 'touch': True,
+            })
+
+        self.state = {
+            'outputs': outputs,
+            'crtcs': 3,
+            'devices': devices,
+            'sinks': [{'mute': True, 'volume': '50%'}],
+            'wifi': True,
+            'connections': [['Wired connection 1', '802-3-ethernet'],
+                            ['Home', '802-11-wireless']],
+            'users': ['foo'],
+            'usb': ['1d6b:0002', '8087:0024'],
+            'running': [],
+            'brightness': None,
+            'mic_muted': False,
+            'programs': list(INSTALLED),
+        }
+
+    def output(self, name):
+        for output in self.state['outputs']:
+            if output['name'] == name:
+                return output
+
+    def device(self, id):
+        for device in self.state['devices']:
+            if str(device['id']) == str(id):
+                return device
+
+    def run(self, command):
+        '''
+        Runs a command against the fake state.
+
+        :param list command: Command as passed to :mod:`subprocess`
+        :returns: Exit status and standard output
+        :rtype: tuple
+        '''
+        program = os.path.basename(command[0])
+        handler = getattr(self, '_run_' + program.replace('-', '_'), None)
+        if handler is None or program not in self.state['programs']:
+            return 127, b''
+        result = handler(list(command[1:]))
+        if result is None:
+            return 0, b''
+        if isinstance(result, int):
+            return result, b''
+        return result
+
+    def _run_xrandr(self, args):
+        if '--output' not in args:
+            return 0, synthetic.render_xrandr(self.state['outputs'],
+                                              verbose='--verbose' in args)
+
+        output = None
+        args = iter(args)
+        for arg in args:
+            if arg == '--output':
+                output = self.output(next(args))
+                if output is None:
+                    return 1
+            elif arg == '--auto':
+                if output['connected']:
+                    output['enabled'] = True
+                    output['mode'] = output['mode'] or output['modes'][0]
+            elif arg == '--off':
+                output['enabled'] = False
+                output['mode'] = None
+                output['primary'] = False
+            elif arg == '--mode':
+                output['mode'] = next(args)
+                output['enabled'] = True
+            elif arg == '--pos':
+                output['x'], output['y'] = map(int, next(args).split('x'))
+            elif arg == '--rotate':
+                output['rotation'] = next(args)
+            elif arg == '--primary':
+                for other in self.state['outputs']:
+                    other['primary'] = other is output
+            elif arg in ('--left-of', '--right-of', '--above', '--below'):
+                other = self.output(next(args))
+                if other is None:
+                    return 1
+                width, height = synthetic.output_size(output)
+                other_width, other_height = synthetic.output_size(other)
+                output['x'], output['y'] = {
+                    '--left-of': (other['x'] - width, other['y']),
+                    '--right-of': (other['x'] + other_width, other['y']),
+                    '--above': (other['x'], other['y'] - height),
+                    '--below': (other['x'], other['y'] + other_height),
+                }[arg]
+
+        enabled = [output for output in self.state['outputs']
+                   if output['enabled']]
+        if len(enabled) > self.state['crtcs']:
+            return 1
+        if enabled:
+            min_x = min(output['x'] for output in enabled)
+            min_y = min(output['y'] for output in enabled)
+            for output in enabled:
+                output['x'] -= min_x
+                output['y'] -= min_y
+
+    def _run_xinput(self, args):
+        devices = [(device['name'], device['id'], device['kind'])
+                   for device in self.state['devices']]
+        if not args or args == ['list']:
+            return 0, synthetic.render_xinput(devices)
+
+        device = self.device(args[1])
+        if device is None:
+            return 1
+
+        if args[0] in ('--list', 'list'):
+            listing = synthetic.render_xinput(
+                [(device['name'], device['id'], device['kind'])])
+            line = [line for line in listing.split(b'\n')
+                    if device['name'].encode() in line][0]
+            if not device['enabled']:
+                line += b'\n\tThis device is disabled'
+            return 0, line + b'\n'
+
+        if args[0] in ('--list-props', 'list-props'):
+            return 0, synthetic.render_list_props(
+                device['name'], device['id'],
+                wacom=device['name'].startswith('Wacom'),
+                enabled=device['enabled'], matrix=device['matrix'],
+                rotation=['none', 'cw', 'ccw', 'half'].index(
+                    device['rotate']))
+
+        if args[0] == 'set-prop':
+            prop, values = args[2], args[3:]
+            if prop == 'Device Enabled':
+                device['enabled'] = values[0] == '1'
+            elif prop == 'Coordinate Transformation Matrix':
+                device['matrix'] = [float(value) for value in values]
+            elif prop == 'Wacom Enable Touch':
+                device['touch'] = values[0] == '1'
+            return
+
+        return 1
+
+    def _run_xsetwacom(self, args):
+        if args[:2] == ['--list', 'devices']:
+            return 0, synthetic.render_xsetwacom(
+                [(device['name'], device['id'], device['kind'])
+                 for device in self.state['devices']])
+
+        device = self.device(args[1])
+        if args[0] != 'set' or device is None:
+            return 1
+        if args[2] == 'rotate':
+            device['rotate'] = args[3]
+        elif args[2] == 'MapToOutput':
+            output = self.output(args[3])
+            if output is None or not output['enabled']:
+                return 1
+            device['output'] = args[3]
+            # The driver sets the matrix to the area of the output, the
+            # rotation is a property of its own.
+            screen_width, screen_height = synthetic.screen_size(
+                self.state['outputs'])
+            width, height = synthetic.output_size(output)
+            device['matrix'] = [
+                width / screen_width, 0, output['x'] / screen_width,
+                0, height / screen_height, output['y'] / screen_height,
+                0, 0, 1,
+            ]
+
+    def _run_pactl(self, args):
+        if args == ['list', 'short', 'sinks']:
+            return 0, synthetic.render_pactl_sinks(len(self.state['sinks']))
+        sink = self.state['sinks'][int(args[1])]
+        if args[0] == 'set-sink-mute':
+            sink['mute'] = args[2] == '1'
+        elif args[0] == 'set-sink-volume':
+            sink['volume'] = args[2]
+
+    def _run_nmcli(self, args):
+        if args == ['--version']:
+            return 0, b'nmcli tool, version 1.22.10\n'
+        if args[:2] == ['radio', 'wifi']:
+            self.state['wifi'] = args[2] == 'on'
+            return
+        if args[:1] == ['--terse']:
+            lines = [':'.join(name.replace(':', '\\:') for name in connection)
+                     for connection in self.state['connections']]
+            return 0, ''.join(line + '\n' for line in lines).encode()
+        if args[:3] == ['con', 'up', 'id']:
+            names = [name for name, kind in self.state['connections']]
+            return 0 if args[3] in names else 10
+        return 1
+
+    def _run_who(self, args):
+        lines = ['{:<8} tty7         2017-03-14 12:02 23:25        683 (:{})'
+                 .format(user, number)
+                 for number, user in enumerate(self.state['users'])]
+        return 0, ''.join(line + '\n' for line in lines).encode()
+
+    def _run_sudo(self, args):
+        if args == ['-l']:
+            return 0, (b'User foo may run the following commands:\n'
+                       b'    (ALL) ALL\n')
+        if args[:2] == ['-n', 'chvt']:
+            return
+        return 1
+
+    def _run_lsusb(self, args):
+        lines = ['Bus 001 Device {:03d}: ID {}'.format(number + 1, id)
+                 for number, id in enumerate(self.state['usb'])]
+        return 0, ''.join(line + '\n' for line in lines).encode()
+
+    def _run_pgrep(self, args):
+        return 0 if args[0] in self.state['running'] else 1
+
+    def _run_killall(self, args):
+        if args[0] not in self.state['running']:
+            return 1
+        self.state['running'].remove(args[0])
+
+    def _run_xbacklight(self, args):
+        self.state['brightness'] = args[1]
+
+    def _run_amixer(self, args):
+        self.state['mic_muted'] = not self.state['mic_muted']
+
+
+class FakeCommandLayer(object):
+    '''
+    Replaces the command wrappers of :mod:`tps` with a :class:`FakeMachine`.
+
+    Use it as a context manager. Every command is answered by the machine
+    instead of being run. The user configuration file, :mod:`tps.cache` and
+    the DRM sysfs are ignored and the cache of the internal screen is
+    cleared.
+
+    :param FakeMachine machine: Machine that answers the commands
+    :param dict latency: Simulated run time per program in seconds
+    '''
+
+    def __init__(self, machine, latency=None):
+        self.machine = machine
+        self.latency = dict(DEFAULT_LATENCY)
+        self.latency.update(latency or {})
+        self.spawns = []
+        self.fake_time = 0.0
+        self._stack = contextlib.ExitStack()
+
+    @property
+    def critical_path(self):
+        '''
+        Simulated time of all spawned programs. The actions run them one after
+        the other, so this is the sum of their latencies.
+        '''
+        return sum(latency for command, latency in self.spawns)
+
+    def _spawn(self, command):
+        start = time.perf_counter()
+        program = os.path.basename(command[0])
+        latency = self.latency.get(program, OTHER_LATENCY)
+        if program == 'xrandr' and '--current' not in command \
+           and '--output' not in command:
+            latency += PROBE_LATENCY
+        self.spawns.append((list(command), latency))
+        returncode, output = self.machine.run(command)
+        self.fake_time += time.perf_counter() - start
+        if returncode == 127:
+            raise FileNotFoundError(2, 'No such file or directory',
+                                    command[0])
+        return returncode, output
+
+    def _check_call(self, command, local_logger, *args, **kwargs):
+        returncode, output = self._spawn(command)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command)
+        return 0
+
+    def _call(self, command, local_logger, *args, **kwargs):
+        return self._spawn(command)[0]
+
+    def _check_output(self, command, local_logger, *args, **kwargs):
+        returncode, output = self._spawn(command)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, output)
+        return output
+
+    def _stream_output(self, command, local_logger, *args, **kwargs):
+        returncode, output = self._spawn(command)
+        yield from output.splitlines(True)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command)
+
+    def _which(self, command):
+        if os.sep not in command \
+           and command in self.machine.state['programs']:
+            return '/usr/bin/' + command
+
+    def __enter__(self):
+        # The stubs of :mod:`tps.testsuite.shim` import this module for every
+        # command, only import the slow mock module when it is used.
+        import unittest.mock
+
+        patches = [
+            unittest.mock.patch('tps.check_call', self._check_call),
+            unittest.mock.patch('tps.call', self._call),
+            unittest.mock.patch('tps.check_output', self._check_output),
+            unittest.mock.patch('tps.stream_output', self._stream_output),
+            unittest.mock.patch('tps.which', self._which),
+            unittest.mock.patch('tps.config.CONFIGFILE', os.devnull),
+            unittest.mock.patch('tps.cache.DIRECTORY', os.devnull),
+            unittest.mock.patch('tps.drm.DIRECTORY', os.devnull),
+            unittest.mock.patch('tps.layout.DIRECTORY', os.devnull),
+            unittest.mock.patch.object(tps.screen.get_internal,
+                                       'cached_internal', None),
+        ]
+        for patch in patches:
+            self._stack.enter_context(patch)
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def format_spawns(self):
+        '''
+        Lists the spawned commands like a shell would show them.
+
+        :rtype: list
+        '''
+        return [' '.join(map(shlex.quote, command))
+                for command, latency in self.spawns]
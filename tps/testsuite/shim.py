@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Hermetic harness that runs the real programs against stub executables.
+
+:class:`ShimEnvironment` creates a temporary directory with stub executables
+for ``xrandr``, ``xinput``, ``xsetwacom``, ``nmcli``, ``pactl``, ``sudo``,
+``who``, ``lsusb`` and the other tools, a home directory with a configuration
+file and a state file. It then runs the console entry points as separate
+processes with only the stubs on ``PATH``.
+
+Every stub executes :func:`main` of this module. It loads the state of a
+:class:`tps.testsuite.fake.FakeMachine` from the file named in
+``TPS_SHIM_STATE``, runs the command against it and writes the changed state
+back. Each environment has its own directory, therefore tests using it can run
+in parallel processes.
+'''
+
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+ENTRY_POINTS = {
+    'thinkpad-config': 'tps.config:main',
+    'thinkpad-dock': 'tps.dock:main',
+    'thinkpad-dock-hook': 'tps.hooks:main_dock_hook',
+    'thinkpad-listen': 'tps.listen:main',
+    'thinkpad-mutemic': 'tps.sound:main_mutemic',
+    'thinkpad-remap-input': 'tps.main_remap_input:main',
+    'thinkpad-resume': 'tps.resume:main',
+    'thinkpad-resume-hook': 'tps.hooks:main_resume_hook',
+    'thinkpad-rotate': 'tps.rotate:main',
+    'thinkpad-rotate-hook': 'tps.hooks:main_rotate_hook',
+    'thinkpad-scripts-config-migration': 'tps.config:migrate_shell_config',
+    'thinkpad-stats': 'tps.stats:main',
+    'thinkpad-touch': 'tps.main_touchscreen:main',
+    'thinkpad-touchpad': 'tps.main_touchpad:main',
+    'thinkpad-trackpoint': 'tps.main_trackpoint:main',
+}
+'Console entry points as listed in ``setup.py``'
+
+ENTRY_POINT_TEMPLATE = '''#!{python}
+import os
+import sys
+import tps.drm
+import {module}
+# The screens of the fake machine are not in the sysfs of this one.
+tps.drm.DIRECTORY = os.devnull
+sys.exit({module}.{function}())
+'''
+
+STUB_TEMPLATE = '''#!{python}
+from tps.testsuite import shim
+shim.main()
+'''
+
+
+class ShimEnvironment(object):
+    '''
+    Temporary environment with stub executables and a fake machine.
+
+    Use it as a context manager, the directory is removed afterwards.
+
+    :param tps.testsuite.fake.FakeMachine machine: Initial state
+    :param str config: Contents of the user configuration file. Logging to
+        syslog is always disabled.
+    '''
+
+    def __init__(self, machine, config=''):
+        self._tempdir = tempfile.TemporaryDirectory(prefix='tps-shim-')
+        self.root = self._tempdir.name
+        self.bin = os.path.join(self.root, 'bin')
+        self.home = os.path.join(self.root, 'home')
+        self.state_file = os.path.join(self.root, 'state.json')
+
+        os.mkdir(self.bin)
+        config_dir = os.path.join(self.home, '.config', 'thinkpad-scripts')
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, 'config.ini'), 'w') as handle:
+            handle.write('[logging]\nsyslog = false\n\n' + config)
+
+        for program in machine.state['programs']:
+            self._install(program, STUB_TEMPLATE.format(python=sys.executable))
+        for program, entry_point in ENTRY_POINTS.items():
+            module, function = entry_point.split(':')
+            self._install(program, ENTRY_POINT_TEMPLATE.format(
+                python=sys.executable, module=module, function=function))
+
+        machine.state['log'] = []
+        _save(self.state_file, machine.state)
+
+    def _install(self, program, contents):
+        path = os.path.join(self.bin, program)
+        with open(path, 'w') as handle:
+            handle.write(contents)
+        os.chmod(path, 0o755)
+
+    @property
+    def env(self):
+        '''
+        Environment variables for the programs.
+
+        :rtype: dict
+        '''
+        return {
+            'PATH': self.bin,
+            'HOME': self.home,
+            'PYTHONPATH': PACKAGE_ROOT,
+            'TPS_SHIM_STATE': self.state_file,
+            'TPS_SHIM_BIN': self.bin,
+            'DISPLAY': ':0',
+            'LANG': 'C.UTF-8',
+        }
+
+    @property
+    def state(self):
+        '''
+        Current state of the fake machine.
+
+        :rtype: dict
+        '''
+        with open(self.state_file) as handle:
+            return json.load(handle)
+
+    @property
+    def log(self):
+        '''
+        Commands that were run against the stubs, in order.
+
+        :rtype: list
+        '''
+        return self.state['log']
+
+    def run(self, program, *args):
+        '''
+        Runs one of the programs.
+
+        :param str program: Name of an entry point or a stub
+        :returns: Completed process with captured output
+        :rtype: subprocess.CompletedProcess
+        '''
+        return subprocess.run(
+            [os.path.join(self.bin, program)] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=self.env, cwd=self.home, timeout=60)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tempdir.cleanup()
+
+
+def _save(path, state):
+    with open(path, 'w') as handle:
+        json.dump(state, handle)
+
+
+def _exec_as_user(args):
+    '''
+    Does what ``sudo -u user -i env VAR=value … program …`` would do.
+    '''
+    while args and args[0].startswith('-'):
+        args = args[2:] if args[0] == '-u' else args[1:]
+    if args and args[0] == 'env':
+        args = args[1:]
+    env = dict(os.environ)
+    while args and '=' in args[0]:
+        key, value = args.pop(0).split('=', 1)
+        env[key] = value
+    # The hooks call the programs with their installed path.
+    program = os.path.join(os.environ['TPS_SHIM_BIN'],
+                           os.path.basename(args[0]))
+    os.execve(program, [program] + args[1:], env)
+
+
+def main():
+    '''
+    Entry point of the stub executables.
+    '''
+    from tps.testsuite.fake import FakeMachine
+
+    command = [os.path.basename(sys.argv[0])] + sys.argv[1:]
+
+    with open(os.environ['TPS_SHIM_STATE'], 'r+') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        machine = FakeMachine(state=json.load(handle))
+        machine.state['log'].append(command)
+
+        if command[0] == 'sudo' and command[1] == '-u':
+            returncode, output = None, b''
+        else:
+            returncode, output = machine.run(command)
+
+        handle.seek(0)
+        handle.truncate()
+        json.dump(machine.state, handle)
+
+    if returncode is None:
+        _exec_as_user(command[1:])
+
+    sys.stdout.buffer.write(output)
+    sys.exit(returncode)
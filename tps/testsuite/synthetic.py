@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Synthetic output of the tools that tps calls.
+
+The captures in ``sample_data`` come from a single ThinkPad X220 with at most
+one external screen. The functions here render outputs in the same format for
+arbitrary setups, for instance many screens behind a daisy chain or many
+input devices. They are used by the tests and the benchmarks.
+'''
+
+import os
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, os.pardir, 'sample_data')
+'Directory with the captured outputs'
+
+INTERNAL_MODES = [('1366x768', '60.0'), ('1360x768', '59.8     60.0'),
+                  ('1024x768', '60.0'), ('800x600', '60.3     56.2'),
+                  ('640x480', '59.9')]
+'Modes of the X220 panel as in ``sample_data/X220/xrandr_on``'
+
+EXTERNAL_MODES = [('1920x1200', '60.0'), ('1600x1200', '60.0'),
+                  ('1280x1024', '60.0'), ('1280x960', '60.0'),
+                  ('1024x768', '60.0'), ('800x600', '60.3     56.2'),
+                  ('640x480', '60.0')]
+'Modes of the external screen as in ``sample_data/X220/xrandr_on``'
+
+ROTATIONS = '(normal left inverted right x axis y axis)'
+
+
+def read_sample(*path):
+    '''
+    Reads a capture from ``sample_data``.
+
+    :returns: Lines of the capture as bytes
+    :rtype: list
+    '''
+    with open(os.path.join(SAMPLE_DATA, *path), 'rb') as handle:
+        return handle.read().splitlines(True)
+
+
+def make_output(name, connected=True, enabled=True, modes=EXTERNAL_MODES,
+                x=0, y=0, rotation='normal', primary=False):
+    '''
+    Creates the description of an output that :func:`render_xrandr` takes.
+
+    :rtype: dict
+    '''
+    return {
+        'name': name,
+        'connected': connected,
+        'enabled': connected and enabled,
+        'modes': [mode for mode, rates in modes] if connected else [],
+        'rates': [rates for mode, rates in modes] if connected else [],
+        'mode': modes[0][0] if connected and enabled else None,
+        'x': x,
+        'y': y,
+        'rotation': rotation,
+        'primary': primary,
+    }
+
+
+def make_outputs(externals=0, mst=0, disconnected=6, internal='LVDS1'):
+    '''
+    Creates a list of outputs like a docked X220 would have.
+
+    The external screens are placed right of the internal screen.
+
+    :param int externals: Number of screens on separate connectors
+    :param int mst: Number of screens daisy chained behind ``DP2``
+    :param int disconnected: Number of unused connectors
+    :rtype: list
+    '''
+    outputs = [make_output(internal, modes=INTERNAL_MODES, primary=True)]
+    names = ['HDMI{}'.format(i + 1) for i in range(externals)]
+    names += ['DP2-{}'.format(i + 1) for i in range(mst)]
+    for name in names:
+        x = sum(output_size(output)[0] for output in outputs)
+        outputs.append(make_output(name, x=x))
+    for i in range(disconnected):
+        outputs.append(make_output('DP{}'.format(i + 3), connected=False))
+    return outputs
+
+
+def output_size(output):
+    '''
+    Gives the size of an output on the virtual screen, taking the rotation
+    into account.
+
+    :rtype: tuple
+    '''
+    if not output['enabled']:
+        return 0, 0
+    # Modes added with ``cvt`` have names like ``1600x900_60.00``.
+    width, height = map(int, output['mode'].split('_')[0].split('x'))
+    if output['rotation'] in ('left', 'right'):
+        width, height = height, width
+    return width, height
+
+
+def screen_size(outputs):
+    '''
+    Gives the size of the virtual screen that holds all enabled outputs.
+
+    :rtype: tuple
+    '''
+    width, height = 320, 200
+    for output in outputs:
+        output_width, output_height = output_size(output)
+        if output['enabled']:
+            width = max(width, output['x'] + output_width)
+            height = max(height, output['y'] + output_height)
+    return width, height
+
+
+def _edid(name):
+    '''
+    Generates a fake 256 byte EDID as ``xrandr --verbose`` prints it.
+    '''
+    seed = sum(name.encode())
+    data = bytes([0, 255, 255, 255, 255, 255, 255, 0]) \
+        + bytes((seed + i * 7) % 256 for i in range(248))
+    return [data[i:i+16].hex() for i in range(0, len(data), 16)]
+
+
+def render_xrandr(outputs, verbose=False, properties=0):
+    '''
+    Renders the output of ``xrandr --current`` or ``xrandr --current
+    --verbose``.
+
+    :param list outputs: Outputs from :func:`make_output`
+    :param bool verbose: Render the verbose format with EDID dumps
+    :param int properties: Number of additional properties per connected
+        output in the verbose format
+    :rtype: bytes
+    '''
+    width, height = screen_size(outputs)
+    lines = ['Screen 0: minimum 320 x 200, current {} x {}, maximum 8192 x '
+             '8192'.format(width, height)]
+    for number, output in enumerate(outputs):
+        mode_id = 0x48 + 8 * number
+        if not output['connected']:
+            lines.append('{} disconnected {}'.format(output['name'], ROTATIONS))
+        elif not output['enabled']:
+            lines.append('{} connected {}'.format(output['name'], ROTATIONS))
+        else:
+            output_width, output_height = output_size(output)
+            geometry = '{}x{}+{}+{}'.format(output_width, output_height,
+                                            output['x'], output['y'])
+            if verbose:
+                rotation = '(0x{:x}) {} '.format(mode_id, output['rotation'])
+            elif output['rotation'] != 'normal':
+                rotation = output['rotation'] + ' '
+            else:
+                rotation = ''
+            lines.append('{} connected {}{} {}{} 277mm x 156mm'.format(
+                output['name'], 'primary ' if output['primary'] else '',
+                geometry, rotation, ROTATIONS))
+
+        if verbose:
+            lines.append('\tIdentifier: 0x{:x}'.format(0x43 + number))
+            lines.append('\tTimestamp:  13092')
+            lines.append('\tSubpixel:   unknown')
+            if output['connected']:
+                lines.append('\tEDID: ')
+                lines += ['\t\t' + row for row in _edid(output['name'])]
+            for i in range(properties if output['connected'] else 0):
+                lines.append('\tProperty {}: {}'.format(i, i % 3))
+                lines.append('\t\trange: (0, 2)')
+            lines.append('\tBroadcast RGB: Automatic ')
+            lines.append('\t\tsupported: Automatic    Full         Limited 16:235')
+
+        for mode, rates in zip(output['modes'], output['rates']):
+            if verbose:
+                lines.append('  {} (0x{:x}) 69.300MHz -HSync -VSync'.format(
+                    mode, mode_id))
+                lines.append('        h: width  1366 start 1401 end 1415 '
+                             'total 1458 skew    0 clock  47.53KHz')
+                lines.append('        v: height  768 start  771 end  777 '
+                             'total  792           clock  60.02Hz')
+            else:
+                first, _, rest = rates.partition(' ')
+                lines.append('   {:<15}{}{}{}{}'.format(
+                    mode, first, '*' if mode == output['mode'] else ' ',
+                    '+' if mode == output['modes'][0] else ' ',
+                    ' ' + rest.strip() if rest else ''))
+
+    return ('\n'.join(lines) + '\n').encode()
+
+
+WACOM_KINDS = ['Pen stylus', 'Finger touch', 'Pen eraser', 'Finger pad']
+
+
+def make_devices(wacom=3, extra=0):
+    '''
+    Creates a list of input devices like the X220 Tablet has.
+
+    :param int wacom: Number of Wacom devices
+    :param int extra: Number of additional keyboards
+    :returns: List of ``(name, id, kind)`` tuples, kind being ``pointer`` or
+        ``keyboard``
+    :rtype: list
+    '''
+    devices = [
+        ('Virtual core XTEST pointer', 4, 'pointer'),
+        ('Logitech USB Optical Mouse', 11, 'pointer'),
+        ('TPPS/2 IBM TrackPoint', 17, 'pointer'),
+        ('SynPS/2 Synaptics TouchPad', 16, 'pointer'),
+        ('Virtual core XTEST keyboard', 5, 'keyboard'),
+        ('Power Button', 6, 'keyboard'),
+        ('AT Translated Set 2 keyboard', 15, 'keyboard'),
+        ('ThinkPad Extra Buttons', 18, 'keyboard'),
+    ]
+    for i in range(wacom):
+        devices.append(('Wacom ISDv4 E6 ' + WACOM_KINDS[i % len(WACOM_KINDS)],
+                        20 + i, 'pointer'))
+    for i in range(extra):
+        devices.append(('USB Keyboard {}'.format(i), 100 + i, 'keyboard'))
+    return devices
+
+
+def render_xinput(devices):
+    '''
+    Renders the output of ``xinput list``.
+
+    :rtype: bytes
+    '''
+    lines = ['⎡ Virtual core pointer                    \tid=2\t[master pointer  (3)]']
+    for name, id, kind in devices:
+        if kind == 'pointer':
+            lines.append('⎜   ↳ {:<38}\tid={}\t[slave  pointer  (2)]'.format(
+                name, id))
+    lines.append('⎣ Virtual core keyboard                   \tid=3\t[master keyboard (2)]')
+    for name, id, kind in devices:
+        if kind == 'keyboard':
+            lines.append('    ↳ {:<38}\tid={}\t[slave  keyboard (3)]'.format(
+                name, id))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def render_xsetwacom(devices):
+    '''
+    Renders the output of ``xsetwacom --list devices``.
+
+    :rtype: bytes
+    '''
+    lines = []
+    for name, id, kind in devices:
+        if name.startswith('Wacom'):
+            lines.append('{:<32}\tid: {}\ttype: {:<10}'.format(
+                name, id, name.split()[-1].upper()))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def render_list_props(name, id, properties=0, wacom=True, enabled=True,
+                      matrix=(1, 0, 0, 0, 1, 0, 0, 0, 1), rotation=0):
+    '''
+    Renders the output of ``xinput list-props``.
+
+    :param int properties: Number of additional properties
+    :param bool wacom: Include the properties of the Wacom driver
+    :param int rotation: Value of ``Wacom Rotation``
+    :rtype: bytes
+    '''
+    lines = ["Device '{}':".format(name),
+             '\tDevice Enabled (142):\t{}'.format(1 if enabled else 0),
+             '\tCoordinate Transformation Matrix (144):\t' +
+             ', '.join('{:f}'.format(value) for value in matrix)]
+    for i in range(properties):
+        lines.append('\tlibinput Property {} (3{:02d}):\t0'.format(i, i % 100))
+    if wacom:
+        lines.append('\tWacom Tablet Area (280):\t0, 0, 26312, 16520')
+        lines.append('\tWacom Rotation (289):\t{}'.format(rotation))
+        lines.append('\tWacom Enable Touch (293):\t1')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def render_nmcli_connections(count):
+    '''
+    Renders the output of ``nmcli --terse --fields NAME,TYPE con show``.
+
+    The names contain colons and backslashes, which ``nmcli`` escapes.
+
+    :rtype: bytes
+    '''
+    lines = []
+    for i in range(count):
+        kind = '802-3-ethernet' if i % 4 == 0 else '802-11-wireless'
+        lines.append('Office\\: Desk {}\\\\Port:{}'.format(i, kind))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def render_who(users):
+    '''
+    Renders the output of ``who -u`` with the graphical session last.
+
+    :rtype: bytes
+    '''
+    lines = []
+    for i in range(users - 1):
+        lines.append('user{:<4} pts/{:<8} 2017-03-14 12:02 23:25 {:>8} '
+                     '(10.0.0.{})'.format(i, i, 1000 + i, i % 250))
+    lines.append('foo      tty7         2017-03-14 12:02 23:25        683 (:0)')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def render_pactl_sinks(count):
+    '''
+    Renders the output of ``pactl list short sinks``.
+
+    :rtype: bytes
+    '''
+    lines = []
+    for i in range(count):
+        lines.append('{}\talsa_output.pci-0000_00_1b.{}.analog-stereo\t'
+                     'module-alsa-card.c\ts16le 2ch 44100Hz\tSUSPENDED'.format(
+                         i, i))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def make_accelerometer(directory, name='iio:device0', mount_matrix=None):
+    '''
+    Creates the sysfs directory of an accelerometer that is held upright.
+
+    :param str directory: Directory that stands in for
+        ``/sys/bus/iio/devices``
+    :param str name: Name of the IIO device
+    :param str mount_matrix: Contents of ``in_accel_mount_matrix``, the file
+        is left out if ``None``
+    :returns: Path of the device
+    :rtype: str
+    '''
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    with open(os.path.join(path, 'name'), 'w') as handle:
+        handle.write('accel_3d\n')
+    if mount_matrix is not None:
+        with open(os.path.join(path, 'in_accel_mount_matrix'), 'w') as handle:
+            handle.write(mount_matrix)
+    write_accel(path, 0, 980, 0)
+    return path
+
+
+def write_accel(path, x, y, z):
+    '''
+    Changes the raw readings of an accelerometer from
+    :func:`make_accelerometer`.
+    '''
+    for axis, value in zip('xyz', (x, y, z)):
+        with open(os.path.join(path, 'in_accel_{}_raw'.format(axis)),
+                  'w') as handle:
+            handle.write('{}\n'.format(value))
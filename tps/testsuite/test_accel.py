@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import tps.accel
+from tps.testsuite import synthetic
+
+
+class OrientationTestCase(unittest.TestCase):
+
+    def test_upright(self):
+        self.assertEqual(tps.accel.orientation((0, 980, 0)), 'normal')
+        self.assertEqual(tps.accel.orientation((980, 0, 0)), 'right')
+        self.assertEqual(tps.accel.orientation((0, -980, 0)), 'inverted')
+        self.assertEqual(tps.accel.orientation((-980, 0, 0)), 'left')
+
+    def test_hysteresis(self):
+        # 50 degrees from normal towards the right.
+        sample = (751, 630, 0)
+        self.assertEqual(tps.accel.orientation(sample), 'right')
+        self.assertEqual(tps.accel.orientation(sample, 'normal', 15),
+                         'normal')
+        self.assertEqual(tps.accel.orientation(sample, 'normal', 0), 'right')
+        self.assertEqual(tps.accel.orientation((900, 300, 0), 'normal', 15),
+                         'right')
+
+    def test_flat(self):
+        self.assertEqual(tps.accel.orientation((200, 0, 960), 'normal'),
+                         'normal')
+        self.assertIsNone(tps.accel.orientation((0, 0, 980)))
+
+    def test_wrap_around(self):
+        self.assertEqual(tps.accel.orientation((-100, -980, 0), 'inverted',
+                                               15), 'inverted')
+        self.assertEqual(tps.accel.orientation((100, -980, 0), 'inverted',
+                                               15), 'inverted')
+
+
+class AccelerometerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        patch = unittest.mock.patch('tps.accel.DIRECTORY', self.tempdir.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_find(self):
+        self.assertIsNone(tps.accel.find_accelerometer())
+        os.makedirs(os.path.join(self.tempdir.name, 'iio:device0'))
+        path = synthetic.make_accelerometer(self.tempdir.name, 'iio:device1')
+        self.assertEqual(tps.accel.find_accelerometer(), path)
+
+    def test_read_again(self):
+        path = synthetic.make_accelerometer(self.tempdir.name)
+        device = tps.accel.Accelerometer(path)
+        self.addCleanup(device.close)
+        self.assertEqual(device.read(), (0, 980, 0))
+        synthetic.write_accel(path, -12, 3, 975)
+        self.assertEqual(device.read(), (-12, 3, 975))
+
+    def test_mount_matrix(self):
+        path = synthetic.make_accelerometer(self.tempdir.name,
+                                  mount_matrix='0, 1, 0; -1, 0, 0; 0, 0, 1\n')
+        device = tps.accel.Accelerometer(path)
+        self.addCleanup(device.close)
+        self.assertEqual(device.read(), (980, 0, 0))
+
+    def test_broken_mount_matrix(self):
+        path = synthetic.make_accelerometer(self.tempdir.name, mount_matrix='1, 0\n')
+        device = tps.accel.Accelerometer(path)
+        self.addCleanup(device.close)
+        self.assertEqual(device.read(), (0, 980, 0))
+
+    def test_missing_device(self):
+        with self.assertRaises(OSError):
+            tps.accel.Accelerometer(os.path.join(self.tempdir.name, 'gone'))
+
+
+if __name__ == '__main__':
+    unittest.main()
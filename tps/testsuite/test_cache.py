@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import tps.cache
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.directory = os.path.join(self.tempdir.name, 'thinkpad-scripts')
+        patch = unittest.mock.patch('tps.cache.DIRECTORY', self.directory)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_round_trip(self):
+        self.assertIsNone(tps.cache.load('internal', ['a']))
+        tps.cache.store('internal', ['a'], {'name': 'LVDS1'})
+        self.assertEqual(tps.cache.load('internal', ['a']), {'name': 'LVDS1'})
+        self.assertIsNone(tps.cache.load('internal', ['b']))
+        self.assertEqual(os.listdir(self.directory), ['internal.json'])
+
+    def test_broken_file(self):
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory, 'internal.json'), 'w') as handle:
+            handle.write('{"key": ')
+        self.assertIsNone(tps.cache.load('internal', None))
+
+    def test_unwritable(self):
+        with unittest.mock.patch('tps.cache.DIRECTORY', os.devnull):
+            self.assertFalse(tps.cache.store('internal', None, 1))
+            self.assertIsNone(tps.cache.load('internal', None))
+
+    def test_other_directory(self):
+        other = os.path.join(self.tempdir.name, 'layouts')
+        self.assertTrue(tps.cache.store('layout', None, 1, other))
+        self.assertEqual(tps.cache.load('layout', None, other), 1)
+        self.assertIsNone(tps.cache.load('layout', None))
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_replay(self):
+        tps.cache.store('internal', None, 1)
+        with unittest.mock.patch('tps.record.mode', 'replay'):
+            self.assertIsNone(tps.cache.load('internal', None))
+            self.assertTrue(tps.cache.store('other', None, 2))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['internal.json'])
+
+    def test_record(self):
+        tps.cache.store('internal', None, 1)
+        with unittest.mock.patch('tps.record.mode', 'record'):
+            self.assertIsNone(tps.cache.load('internal', None))
+            self.assertTrue(tps.cache.store('internal', None, 2))
+        self.assertEqual(tps.cache.load('internal', None), 2)
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import ast
+import json
+import os
+import unittest
+
+from tps.testsuite.fake import FakeMachine
+from tps.testsuite import shim
+from tps.testsuite.shim import ShimEnvironment
+
+
+def setup_entry_points():
+    '''
+    Reads the console entry points from ``setup.py`` without running it.
+
+    :returns: Dictionary from the program names to the entry points, ``None``
+        if there is no ``setup.py``
+    :rtype: dict
+    '''
+    path = os.path.join(shim.PACKAGE_ROOT, 'setup.py')
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        tree = ast.parse(handle.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                try:
+                    name = ast.literal_eval(key)
+                except ValueError:
+                    continue
+                if name == 'console_scripts':
+                    return dict(
+                        (part.strip() for part in line.split('=', 1))
+                        for line in ast.literal_eval(value))
+    return None
+
+
+class EntryPointsTestCase(unittest.TestCase):
+
+    def test_same_as_setup(self):
+        entry_points = setup_entry_points()
+        if entry_points is None:
+            self.skipTest('setup.py is not available.')
+        self.assertEqual(shim.ENTRY_POINTS, entry_points)
+
+
+class CommandLineTestCase(unittest.TestCase):
+    '''
+    Runs the installed programs as separate processes against stubs.
+    '''
+
+    def shim(self, machine, config=''):
+        environment = ShimEnvironment(machine, config)
+        self.addCleanup(environment.__exit__, None, None, None)
+        return environment
+
+    def assertSuccess(self, process):
+        self.assertEqual(process.returncode, 0, process.stderr.decode())
+
+    def devices(self, state):
+        return {device['name']: device for device in state['devices']}
+
+    def test_rotate_left(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertSuccess(shim.run('thinkpad-rotate', 'left'))
+
+        state = shim.state
+        self.assertEqual(state['outputs'][0]['rotation'], 'left')
+        devices = self.devices(state)
+        self.assertFalse(devices['TPPS/2 IBM TrackPoint']['enabled'])
+        self.assertEqual(devices['Wacom ISDv4 E6 Pen stylus']['rotate'], 'ccw')
+
+    def test_rotate_twice_restores(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertSuccess(shim.run('thinkpad-rotate', 'left'))
+        self.assertSuccess(shim.run('thinkpad-rotate', 'normal'))
+
+        state = shim.state
+        self.assertEqual(state['outputs'][0]['rotation'], 'normal')
+        self.assertTrue(all(device['enabled'] for device in state['devices']))
+
+    def test_rotate_hook(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertSuccess(shim.run('thinkpad-rotate-hook', 'right',
+                                    '--via-hook', 'acpi1_rotated'))
+
+        self.assertEqual(shim.state['outputs'][0]['rotation'], 'right')
+        programs = [command[0] for command in shim.log]
+        self.assertEqual(programs[:2], ['who', 'sudo'])
+
+    def test_rotate_hook_disabled_trigger(self):
+        shim = self.shim(FakeMachine(wacom=3),
+                         '[trigger]\nrotate_triggers =\n')
+        self.assertSuccess(shim.run('thinkpad-rotate-hook', 'right',
+                                    '--via-hook', 'acpi1_rotated'))
+
+        self.assertEqual(shim.state['outputs'][0]['rotation'], 'normal')
+        self.assertNotIn('xrandr', [command[0] for command in shim.log])
+
+    def test_dock_on_and_off(self):
+        shim = self.shim(FakeMachine(externals=1, wacom=3))
+        self.assertSuccess(shim.run('thinkpad-dock', 'on'))
+
+        state = shim.state
+        self.assertTrue(state['outputs'][1]['enabled'])
+        self.assertTrue(state['outputs'][1]['primary'])
+        self.assertFalse(state['wifi'])
+
+        self.assertSuccess(shim.run('thinkpad-dock', 'off'))
+        state = shim.state
+        self.assertFalse(state['outputs'][1]['enabled'])
+        self.assertTrue(state['wifi'])
+
+    def test_dock_hook(self):
+        shim = self.shim(FakeMachine(externals=1, wacom=0))
+        self.assertSuccess(shim.run('thinkpad-dock-hook', 'on',
+                                    '--via-hook', 'udev1_on'))
+        self.assertTrue(shim.state['outputs'][1]['enabled'])
+
+    def test_remap_input(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertEqual(shim.run('thinkpad-remap-input').returncode, 1)
+        self.assertSuccess(shim.run('thinkpad-rotate', 'left'))
+        logged = len(shim.log)
+
+        self.assertSuccess(shim.run('thinkpad-remap-input'))
+        programs = [command[0] for command in shim.log[logged:]]
+        self.assertIn('xsetwacom', programs)
+        self.assertNotIn('xrandr', programs)
+
+    def test_remap_input_disabled_trigger(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertSuccess(shim.run('thinkpad-remap-input', '--via-hook',
+                                    'udev_wacom'))
+        self.assertEqual(shim.log, [])
+
+    def test_resume_hook(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        self.assertSuccess(shim.run('thinkpad-rotate', 'left'))
+        state = shim.state
+        state['outputs'][0]['rotation'] = 'normal'
+        with open(shim.state_file, 'w') as handle:
+            json.dump(state, handle)
+        logged = len(shim.log)
+
+        self.assertSuccess(shim.run('thinkpad-resume-hook',
+                                    '--via-hook', 'systemd_resume'))
+        self.assertEqual(shim.state['outputs'][0]['rotation'], 'left')
+        programs = [command[0] for command in shim.log[logged:]]
+        self.assertEqual(programs[:2], ['who', 'sudo'])
+
+    def test_mutemic(self):
+        shim = self.shim(FakeMachine(wacom=0))
+        self.assertSuccess(shim.run('thinkpad-mutemic'))
+        self.assertTrue(shim.state['mic_muted'])
+
+    def test_environments_are_isolated(self):
+        first = self.shim(FakeMachine(wacom=0))
+        second = self.shim(FakeMachine(wacom=0))
+        self.assertSuccess(first.run('thinkpad-rotate', 'inverted'))
+
+        self.assertEqual(first.state['outputs'][0]['rotation'], 'inverted')
+        self.assertEqual(second.state['outputs'][0]['rotation'], 'normal')
+        self.assertEqual(second.log, [])
+
+    def test_trace_and_stats(self):
+        shim = self.shim(FakeMachine(wacom=3))
+        trace_file = os.path.join(shim.root, 'trace.json')
+        process = shim.run('thinkpad-rotate', 'left', '--trace', trace_file,
+                           '--stats')
+        self.assertSuccess(process)
+        self.assertIn(b'spawned programs', process.stderr)
+
+        with open(trace_file) as handle:
+            events = json.load(handle)['traceEvents']
+        categories = {event.get('cat') for event in events}
+        self.assertTrue({'command', 'config', 'parse', 'hook', 'action'}
+                        <= categories)
+        commands = [event['name'] for event in events
+                    if event.get('cat') == 'command']
+        self.assertIn('xrandr --output LVDS1 --rotate left', commands)
+
+    def test_metrics(self):
+        shim = self.shim(FakeMachine(externals=1, wacom=3),
+                         '[metrics]\njsonl = ~/actions.jsonl\n')
+        self.assertSuccess(shim.run('thinkpad-dock', 'on'))
+        spawns = len(shim.log)
+        self.assertSuccess(shim.run('thinkpad-rotate', 'left'))
+
+        with open(os.path.join(shim.home, 'actions.jsonl')) as handle:
+            dock, rotate = [json.loads(line) for line in handle]
+        self.assertEqual(dock['action'], 'dock_on')
+        self.assertEqual(dock['outcome'], 'success')
+        self.assertEqual(dock['spawns'], spawns)
+        self.assertEqual((dock['screens'], dock['devices']), (2, 3))
+        self.assertIn('xrandr', dock['steps'])
+        self.assertEqual(rotate['action'], 'rotate')
+
+    def test_record_and_replay(self):
+        recorder = self.shim(FakeMachine(externals=1, wacom=3))
+        recording = os.path.join(recorder.root, 'recording')
+        self.assertSuccess(recorder.run('thinkpad-dock', 'on',
+                                        '--record', recording))
+        self.assertSuccess(recorder.run('thinkpad-rotate', 'left',
+                                        '--record', recording))
+
+        replayer = self.shim(FakeMachine(wacom=0))
+        for program, argument in [('thinkpad-dock', 'on'),
+                                  ('thinkpad-rotate', 'left')]:
+            process = replayer.run(program, argument, '--replay', recording,
+                                   '--stats')
+            self.assertSuccess(process)
+            self.assertIn(b'spawned programs', process.stderr)
+        self.assertEqual(replayer.log, [])
+        # The state of the recording machine must not end up in the cache.
+        cache = os.path.join(replayer.home, '.cache', 'thinkpad-scripts')
+        self.assertEqual(os.listdir(cache) if os.path.isdir(cache) else [],
+                         [])
+        self.assertFalse(os.path.exists(os.path.join(
+            replayer.home, '.config', 'thinkpad-scripts', 'layouts')))
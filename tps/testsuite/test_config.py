@@ -4,7 +4,10 @@
 # Copyright © 2014 Jim Turner <jturner314@gmail.com>
 # Licensed under The GNU Public License Version 2 (or later)
 
+import logging
+import threading
 import unittest
+import unittest.mock
 from configparser import ConfigParser
 
 import tps.config
@@ -146,3 +149,94 @@ class InterpretShellLineTestCase(ConfigTestCase):
             tps.config.interpret_shell_line('unmute="bar', actual)
         self.assertEqual('Cannot parse “unmute="bar”: No closing quotation',
                          str(cm.exception))
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self, gate=None):
+        super().__init__()
+        self.messages = []
+        self.gate = gate
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(10)
+        self.messages.append(record.getMessage())
+
+
+class SetUpLoggingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger('')
+        self.addCleanup(setattr, root, 'handlers', list(root.handlers))
+        self.addCleanup(root.setLevel, root.level)
+        self.exit_functions = []
+        patcher = unittest.mock.patch(
+            'atexit.register',
+            lambda function, *args: self.exit_functions.append(
+                lambda: function(*args)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def at_exit(self):
+        for function in reversed(self.exit_functions):
+            function()
+
+    def config(self, syslog):
+        config = ConfigParser(interpolation=None)
+        config['logging'] = {'syslog': str(syslog).lower()}
+        return config
+
+    def test_syslog_disabled(self):
+        with unittest.mock.patch.object(tps.config.LazySysLogHandler,
+                                        'connect') as connect:
+            tps.config.set_up_logging(0, self.config(False))
+        self.assertEqual(self.exit_functions, [])
+        connect.assert_not_called()
+
+    def test_records_reach_syslog(self):
+        target = RecordingHandler()
+        with unittest.mock.patch.object(tps.config.LazySysLogHandler,
+                                        'connect', return_value=target):
+            tps.config.set_up_logging(0, self.config(True))
+            logging.getLogger('tps').debug('subprocess “%s”', 'xrandr')
+            self.at_exit()
+
+        self.assertTrue(target.messages[1].startswith(
+            'Program was started with arguments'))
+        self.assertEqual(target.messages[2:],
+                         ['subprocess “xrandr”', 'Program finished'])
+
+    def test_slow_syslog_does_not_block(self):
+        release = threading.Event()
+        target = RecordingHandler(release)
+        with unittest.mock.patch.object(tps.config.LazySysLogHandler,
+                                        'connect', return_value=target):
+            tps.config.set_up_logging(0, self.config(True))
+            for i in range(100):
+                logging.getLogger('tps').debug('message %d', i)
+            self.assertEqual(target.messages, [])
+            release.set()
+            self.at_exit()
+        self.assertEqual(len(target.messages), 103)
+
+
+class LazySysLogHandlerTestCase(unittest.TestCase):
+
+    def test_connects_on_first_record(self):
+        handler = tps.config.LazySysLogHandler()
+        target = RecordingHandler()
+        record = logging.makeLogRecord({'msg': 'hello'})
+        with unittest.mock.patch.object(handler, 'connect',
+                                        return_value=target) as connect:
+            connect.assert_not_called()
+            handler.handle(record)
+            handler.handle(record)
+        connect.assert_called_once_with()
+        self.assertEqual(target.messages, ['hello', 'hello'])
+
+    def test_unavailable_syslog_drops_records(self):
+        handler = tps.config.LazySysLogHandler()
+        with unittest.mock.patch.object(handler, 'connect',
+                                        return_value=None):
+            handler.handle(logging.makeLogRecord({'msg': 'hello'}))
+        self.assertIsNone(handler.target)
@@ -4,10 +4,14 @@
 # Copyright © 2015 Jim Turner <jturner314@gmail.com>
 # Licensed under The GNU Public License Version 2 (or later)
 
+import os
+import tempfile
 import unittest
 import unittest.mock
 
+import tps.config
 import tps.dock
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
 
 class SelectDockingScreensTestCase(unittest.TestCase):
 
@@ -140,3 +144,84 @@ class SelectDockingScreensTestCase(unittest.TestCase):
         self.assertEqual(
             cm.output, ['WARNING:tps.dock:Configured screen "foo" does not '
                         'exist or is not connected.'])
+
+
+class DockFakeMachineTestCase(unittest.TestCase):
+
+    def dock(self, machine, on):
+        with FakeCommandLayer(machine) as layer:
+            tps.dock.dock(on, tps.config.get_config())
+        return layer
+
+    def test_dock_on_single_external(self):
+        machine = FakeMachine(externals=1)
+        layer = self.dock(machine, True)
+
+        internal, external = machine.state['outputs'][:2]
+        self.assertTrue(internal['enabled'])
+        self.assertTrue(external['enabled'])
+        self.assertTrue(external['primary'])
+        self.assertEqual((external['x'], internal['x']), (0, 1920))
+        self.assertFalse(machine.state['wifi'])
+        self.assertEqual(layer.format_spawns()[0], 'xrandr --query')
+
+    def test_dock_off(self):
+        machine = FakeMachine(externals=2)
+        self.dock(machine, True)
+        self.dock(machine, False)
+
+        enabled = [output['name'] for output in machine.state['outputs']
+                   if output['enabled']]
+        self.assertEqual(enabled, ['LVDS1'])
+        self.assertTrue(machine.state['outputs'][0]['primary'])
+        self.assertTrue(machine.state['wifi'])
+
+
+class IsDockedUsbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        patch = unittest.mock.patch('tps.dock.USB_DIRECTORY',
+                                    self.tempdir.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.device('usb1', '1d6b', '0002')
+        self.device('1-1', '8087', '0024')
+        self.device('1-1.4', '273F', '1007')
+        os.mkdir(os.path.join(self.tempdir.name, '1-1.4:1.0'))
+        self.config = tps.config.get_config()
+
+    def device(self, name, vendor, product):
+        path = os.path.join(self.tempdir.name, name)
+        os.mkdir(path)
+        for attribute, value in [('idVendor', vendor), ('idProduct', product)]:
+            with open(os.path.join(path, attribute), 'w') as handle:
+                handle.write(value.lower() + '\n')
+
+    def test_get_usb_device_ids(self):
+        self.assertEqual(tps.dock.get_usb_device_ids(),
+                         {'1d6b:0002', '8087:0024', '273f:1007'})
+        with unittest.mock.patch('tps.dock.USB_DIRECTORY', os.devnull):
+            self.assertEqual(tps.dock.get_usb_device_ids(), set())
+
+    def test_ids(self):
+        self.config['dock']['usb_indicator_ids'] = '1234:1234 273F:1007'
+        self.assertTrue(tps.dock.is_docked(self.config))
+        self.config['dock']['usb_indicator_ids'] = '1234:1234'
+        self.assertFalse(tps.dock.is_docked(self.config))
+
+    def test_regex_of_ids(self):
+        self.config['dock']['lsusb_indicator_regex'] = '273f:1007|1234:1234'
+        with FakeCommandLayer(FakeMachine()) as layer:
+            self.assertTrue(tps.dock.is_docked(self.config))
+        self.assertEqual(layer.spawns, [])
+
+    def test_regex_uses_lsusb(self):
+        self.config['dock']['lsusb_indicator_regex'] = 'ID 273f:100[0-9]'
+        machine = FakeMachine()
+        with FakeCommandLayer(machine) as layer:
+            self.assertFalse(tps.dock.is_docked(self.config))
+            machine.state['usb'].append('273f:1007')
+            self.assertTrue(tps.dock.is_docked(self.config))
+        self.assertEqual(layer.format_spawns(), ['lsusb', 'lsusb'])
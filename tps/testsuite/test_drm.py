@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+import tps.config
+import tps.drm
+import tps.screen
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+
+class DrmTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.cache = os.path.join(self.tempdir.name, 'cache')
+        for name, value in [('tps.drm.DIRECTORY', self.tempdir.name),
+                            ('tps.cache.DIRECTORY', self.cache)]:
+            patch = unittest.mock.patch(name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        os.mkdir(os.path.join(self.tempdir.name, 'card0'))
+        with open(os.path.join(self.tempdir.name, 'version'), 'w') as handle:
+            handle.write('drm 1.1.0 20060810\n')
+
+    def connector(self, name, status, connector_id=None):
+        path = os.path.join(self.tempdir.name, name)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'status'), 'w') as handle:
+            handle.write(status + '\n')
+        if connector_id is not None:
+            with open(os.path.join(path, 'connector_id'), 'w') as handle:
+                handle.write('{}\n'.format(connector_id))
+
+    def x_server(self, scheme):
+        # The X server has an output for every connector, named by its driver.
+        tps.drm.store_x_outputs([tps.drm.x_names(connector)[scheme]
+                                 for connector in tps.drm.connectors()])
+
+    def test_x_names(self):
+        self.assertEqual(tps.drm.x_names('card0-HDMI-A-2'),
+                         ['HDMI-2', 'HDMI2'])
+        self.assertEqual(tps.drm.x_names('card0-DVI-D-1'),
+                         ['DVI-D-1', 'DVI1'])
+        self.assertEqual(tps.drm.x_names('card0-eDP-1'), ['eDP-1', 'eDP1'])
+        self.assertEqual(tps.drm.x_names('card0'), [])
+
+    def test_connectors(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.assertEqual(tps.drm.connectors(), ['card0-LVDS-1'])
+        with unittest.mock.patch('tps.drm.DIRECTORY', os.devnull):
+            self.assertEqual(tps.drm.connectors(), [])
+
+    def test_intel_names(self):
+        self.connector('card0-LVDS-1', 'connected', 48)
+        self.connector('card0-VGA-1', 'disconnected', 55)
+        self.connector('card0-HDMI-A-1', 'connected', 59)
+        self.connector('card0-DP-1', 'connected', 65)
+        self.assertIsNone(tps.drm.connected_outputs('LVDS1'))
+        self.x_server(1)
+        self.assertEqual(tps.drm.connected_outputs('LVDS1'),
+                         ['LVDS1', 'HDMI1', 'DP1'])
+
+    def test_modesetting_names(self):
+        self.connector('card0-eDP-1', 'connected')
+        self.connector('card0-HDMI-A-1', 'connected')
+        self.connector('card0-DP-2', 'unknown')
+        self.x_server(0)
+        self.assertEqual(tps.drm.connected_outputs('eDP-1'),
+                         ['HDMI-1', 'eDP-1'])
+
+    def test_unknown_names(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.x_server(1)
+        self.assertIsNone(tps.drm.connected_outputs('LVDS-0'))
+        self.connector('card1-DP-1', 'connected')
+        self.x_server(1)
+        self.assertIsNone(tps.drm.connected_outputs('LVDS1'))
+
+    def test_mst_names(self):
+        self.connector('card0-eDP-1', 'connected', 70)
+        self.connector('card0-DP-1', 'disconnected', 78)
+        self.connector('card0-DP-2', 'connected', 84)
+        self.connector('card0-DP-3', 'connected', 95)
+        tps.drm.store_x_outputs(['eDP-1', 'DP-1', 'DP-2', 'DP-2-1'])
+        self.assertIsNone(tps.drm.connected_outputs('eDP-1'))
+        self.assertIsNone(tps.drm.connected_edids('eDP-1'))
+
+        # A new MST connector makes the stored outputs outdated.
+        tps.drm.store_x_outputs(['eDP-1', 'DP-1', 'DP-2', 'DP-3'])
+        self.connector('card0-DP-4', 'connected', 96)
+        self.assertIsNone(tps.drm.connected_outputs('eDP-1'))
+
+    def test_connected_edids(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-HDMI-A-1', 'connected')
+        self.connector('card0-DP-1', 'disconnected')
+        with open(os.path.join(self.tempdir.name, 'card0-HDMI-A-1', 'edid'),
+                  'wb') as handle:
+            handle.write(b'\x00\xff\xff\xff\xff\xff\xff\x00')
+        self.x_server(1)
+        self.assertEqual(tps.drm.connected_edids('LVDS1'), {
+            'LVDS1': b'', 'HDMI1': b'\x00\xff\xff\xff\xff\xff\xff\x00'})
+        self.assertIsNone(tps.drm.connected_edids('eDP1'))
+
+    def plug_later(self, name, delay, sender=None, status='connected'):
+        def plug():
+            time.sleep(delay)
+            self.connector(name, status)
+            if sender is not None:
+                sender.send(b'change@/devices/card0\0ACTION=change\0'
+                            b'SUBSYSTEM=drm\0HOTPLUG=1\0')
+        thread = threading.Thread(target=plug)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_wait_for_outputs(self):
+        self.connector('card0-LVDS-1', 'connected', 48)
+        self.connector('card0-DP-1', 'disconnected', 65)
+        self.connector('card0-DP-2', 'disconnected', 70)
+        self.x_server(1)
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+
+        self.plug_later('card0-DP-1', 0.02, sender)
+        self.plug_later('card0-DP-2', 0.06, sender)
+        start = time.monotonic()
+        outputs = tps.drm.wait_for_outputs('LVDS1', 5, 0.2, receiver)
+        self.assertEqual(outputs, ['LVDS1', 'DP1', 'DP2'])
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_wait_for_outputs_timeout(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.x_server(1)
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        with self.assertLogs('tps.drm', 'INFO'):
+            outputs = tps.drm.wait_for_outputs('LVDS1', 0.05, 0.01, receiver)
+        self.assertEqual(outputs, ['LVDS1'])
+        self.assertIsNone(tps.drm.wait_for_outputs('eDP1', 5, 0.01, receiver))
+
+    def test_wait_for_outputs_empty(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-DP-1', 'disconnected')
+        self.x_server(1)
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        start = time.monotonic()
+        with self.assertLogs('tps.drm', 'INFO'):
+            outputs = tps.drm.wait_for_outputs('LVDS1', 5, 0.01, receiver,
+                                               empty=0.1)
+        self.assertEqual(outputs, ['LVDS1'])
+        self.assertLess(time.monotonic() - start, 2)
+
+        # A connector that changes its status keeps the program waiting.
+        self.plug_later('card0-DP-1', 0.1, sender, 'unknown')
+        self.plug_later('card0-DP-1', 0.2, sender)
+        outputs = tps.drm.wait_for_outputs('LVDS1', 5, 0.05, receiver,
+                                           empty=0.15)
+        self.assertEqual(outputs, ['DP1', 'LVDS1'])
+
+    def test_wait_for_outputs_new_connector(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-DP-1', 'disconnected')
+        self.x_server(1)
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+
+        # An MST hub adds a connector that the X server has not reported yet.
+        self.plug_later('card0-DP-1', 0.02, sender)
+        self.plug_later('card0-DP-7', 0.06, sender)
+        start = time.monotonic()
+        outputs = tps.drm.wait_for_outputs('LVDS1', 5, 0.2, receiver)
+        self.assertGreaterEqual(time.monotonic() - start, 0.26)
+        self.assertIsNone(outputs)
+
+        self.x_server(1)
+        self.assertEqual(tps.drm.wait_for_outputs('LVDS1', 5, 0.01, receiver),
+                         ['DP1', 'DP7', 'LVDS1'])
+
+    def test_wait_for_outputs_polling(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-HDMI-A-1', 'disconnected')
+        self.x_server(1)
+        self.plug_later('card0-HDMI-A-1', 0.02)
+        with unittest.mock.patch('tps.uevent.open_socket', lambda: None):
+            outputs = tps.drm.wait_for_outputs('LVDS1', 5, 0.05)
+        self.assertEqual(outputs, ['HDMI1', 'LVDS1'])
+
+    def test_get_externals(self):
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-VGA-1', 'connected')
+        self.x_server(1)
+        layer = FakeCommandLayer(FakeMachine(externals=1, wacom=0))
+        with layer, unittest.mock.patch('tps.drm.DIRECTORY',
+                                        self.tempdir.name), \
+                unittest.mock.patch('tps.cache.DIRECTORY', self.cache):
+            config = tps.config.get_config()
+            self.assertEqual(tps.screen.get_externals('LVDS1', config),
+                             ['VGA1'])
+            self.assertEqual(layer.spawns, [])
+
+            config['screen']['drm_status'] = 'false'
+            self.assertEqual(tps.screen.get_externals('LVDS1', config),
+                             ['HDMI1'])
+            self.assertEqual(len(layer.spawns), 1)
+
+    def test_get_externals_mst(self):
+        # The X server calls the screen behind the MST hub HDMI1 here, the
+        # kernel connector DP-7 does not tell that.
+        self.connector('card0-LVDS-1', 'connected')
+        self.connector('card0-DP-7', 'connected')
+        layer = FakeCommandLayer(FakeMachine(externals=1, wacom=0))
+        with layer, unittest.mock.patch('tps.drm.DIRECTORY',
+                                        self.tempdir.name), \
+                unittest.mock.patch('tps.cache.DIRECTORY', self.cache):
+            config = tps.config.get_config()
+            self.assertEqual(tps.screen.get_externals('LVDS1', config),
+                             ['HDMI1'])
+            self.assertIn('HDMI1', tps.drm.x_outputs())
+            self.assertEqual(tps.screen.get_externals('LVDS1', config),
+                             ['HDMI1'])
+            self.assertEqual(len(layer.spawns), 2)
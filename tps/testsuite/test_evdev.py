@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import os
+import struct
+import tempfile
+import unittest
+import unittest.mock
+
+import tps.evdev
+
+
+def event(type_, code, value):
+    return tps.evdev.EVENT.pack(1571500000, 0, type_, code, value)
+
+
+class EvdevTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        data = event(tps.evdev.EV_SW, tps.evdev.SW_TABLET_MODE, 1) \
+            + event(tps.evdev.EV_SYN, 0, 0)
+        self.assertEqual(tps.evdev.parse(data), ([(5, 1, 1), (0, 0, 0)], b''))
+        events, rest = tps.evdev.parse(data[:30])
+        self.assertEqual(events, [(5, 1, 1)])
+        self.assertEqual(tps.evdev.parse(rest + data[30:]),
+                         ([(0, 0, 0)], b''))
+
+    def test_parse_bitmask(self):
+        bits = 8 * struct.calcsize('l')
+        self.assertEqual(tps.evdev.parse_bitmask('2\n'), 2)
+        self.assertEqual(tps.evdev.parse_bitmask('3 0\n'), 3 << bits)
+        self.assertEqual(tps.evdev.parse_bitmask('0\n'), 0)
+
+    def test_read_switch_of_pipe(self):
+        read, write = os.pipe()
+        self.addCleanup(os.close, read)
+        self.addCleanup(os.close, write)
+        self.assertIsNone(tps.evdev.read_switch(read))
+
+
+class FindSwitchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        patch = unittest.mock.patch('tps.evdev.DIRECTORY', self.tempdir.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def add(self, name, sw=None):
+        directory = os.path.join(self.tempdir.name, name, 'device',
+                                 'capabilities')
+        os.makedirs(directory)
+        if sw is not None:
+            with open(os.path.join(directory, 'sw'), 'w') as handle:
+                handle.write(sw)
+
+    def test_tablet_mode(self):
+        self.add('event3', '0\n')
+        self.add('event12', '2\n')
+        self.add('event2')
+        self.add('mouse0', '2\n')
+        self.assertEqual(tps.evdev.find_switch(), '/dev/input/event12')
+
+    def test_lid_only(self):
+        self.add('event0', '1\n')
+        self.assertIsNone(tps.evdev.find_switch())
+
+    def test_no_sysfs(self):
+        with unittest.mock.patch('tps.evdev.DIRECTORY', os.devnull):
+            self.assertIsNone(tps.evdev.find_switch())
+
+
+if __name__ == '__main__':
+    unittest.main()
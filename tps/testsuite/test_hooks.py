@@ -6,7 +6,7 @@
 
 import unittest
 
-import tps.input
+import tps.hooks
 
 class ParseGraphicalUserTestCase(unittest.TestCase):
 
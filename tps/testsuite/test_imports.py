@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import tps
+
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(tps.__file__)))
+
+# Modules which are slow to load and must never be pulled in at startup.
+FORBIDDEN_AT_STARTUP = {'pkg_resources', 'logging.handlers'}
+
+# Modules that every program loads.
+BASE_MODULES = {'tps', 'tps.record', 'tps.trace', 'tps.config'}
+
+# Modules that every program which works with the screens loads.
+SCREEN_MODULES = BASE_MODULES | {'tps.cache', 'tps.drm', 'tps.metrics',
+                                 'tps.screen'}
+
+
+def imported_modules(code, env=None):
+    '''
+    Runs the given code in a fresh interpreter with ``-X importtime``.
+
+    :returns: Exit code and set of module names that were imported
+    :rtype: tuple
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        cwd=PACKAGE_ROOT, env=env)
+    modules = set()
+    for line in result.stderr.decode().split('\n'):
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            if name != 'imported package':
+                modules.add(name)
+    return result.returncode, modules
+
+
+def tps_modules(modules):
+    return {module for module in modules
+            if module == 'tps' or module.startswith('tps.')}
+
+
+@unittest.skipIf(sys.version_info < (3, 7), '-X importtime needs Python 3.7')
+class StartupImportsTestCase(unittest.TestCase):
+    '''
+    Guards the modules that are imported when an entry point starts up.
+
+    If one of these tests fails, a new import has been added to the startup
+    path. Either import it lazily where it is needed or extend the expected
+    set here deliberately.
+    '''
+
+    def assertStartupImports(self, module, expected):
+        code, modules = imported_modules('import {}'.format(module))
+        self.assertEqual(code, 0)
+        self.assertEqual(tps_modules(modules), expected)
+        self.assertEqual(modules & FORBIDDEN_AT_STARTUP, set())
+
+    def test_rotate(self):
+        self.assertStartupImports('tps.rotate', SCREEN_MODULES | {'tps.rotate'})
+
+    def test_dock(self):
+        self.assertStartupImports('tps.dock', SCREEN_MODULES | {'tps.dock'})
+
+    def test_hooks(self):
+        self.assertStartupImports('tps.hooks', BASE_MODULES | {'tps.hooks'})
+
+    def test_sound(self):
+        self.assertStartupImports('tps.sound', BASE_MODULES | {'tps.sound'})
+
+    def test_remap_input(self):
+        self.assertStartupImports('tps.main_remap_input', SCREEN_MODULES | {
+            'tps.input', 'tps.main_remap_input'})
+
+    def test_resume(self):
+        self.assertStartupImports('tps.resume', SCREEN_MODULES | {
+            'tps.resume'})
+
+    def test_disabled_trigger_exits_early(self):
+        # The default config, which logs to syslog.
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home)
+            for module, function, program, expected in [
+                    ('tps.rotate', 'main', 'thinkpad-rotate', SCREEN_MODULES),
+                    ('tps.dock', 'main', 'thinkpad-dock', SCREEN_MODULES),
+                    ('tps.resume', 'main', 'thinkpad-resume',
+                     SCREEN_MODULES),
+                    ('tps.sound', 'main_mutemic', 'thinkpad-mutemic',
+                     BASE_MODULES)]:
+                code, modules = imported_modules(
+                    'import sys; '
+                    'sys.argv = ["{}", "--via-hook", "disabled"]; '
+                    'import {module}; {module}.{function}()'.format(
+                        program, module=module, function=function),
+                    env=env)
+                self.assertEqual(code, 0)
+                self.assertEqual(tps_modules(modules), expected | {module})
+                self.assertEqual(modules & (FORBIDDEN_AT_STARTUP | {'queue'}),
+                                 set())
@@ -4,9 +4,16 @@
 # Copyright © 2015 Martin Ueding <mu@martin-ueding.de>
 # Licensed under The GNU Public License Version 2 (or later)
 
+import contextlib
+import tempfile
 import unittest
+import unittest.mock
 
+import tps.config
 import tps.input
+import tps.rotate
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+from tps.testsuite.synthetic import read_sample
 
 class InputTestCase(unittest.TestCase):
     def test_matrix_mult_unity(self):
@@ -45,3 +52,73 @@ class InputTestCase(unittest.TestCase):
         prod = tps.input._matrix_mul(m1, m2)
 
         self.assertEqual(prod, m1m2)
+
+
+class ParseXinputTestCase(unittest.TestCase):
+    def test_parse_xinput_id(self):
+        lines = read_sample('X220', 'xinput')
+        self.assertEqual(tps.input.parse_xinput_id(lines, 'TrackPoint'), 17)
+        self.assertEqual(tps.input.parse_xinput_id(lines, 'TouchPad'), 16)
+        self.assertIsNone(tps.input.parse_xinput_id(lines, 'Nub'))
+
+    def test_parse_xinput_id_stops_early(self):
+        lines = iter(read_sample('X220', 'xinput'))
+        tps.input.parse_xinput_id(lines, 'Logitech USB Optical Mouse')
+        self.assertIn(b'Wacom ISDv4 E6 Pen stylus', next(lines))
+
+    def test_parse_wacom_device_ids(self):
+        lines = read_sample('X220', 'xinput')
+        self.assertEqual(tps.input.parse_wacom_device_ids(
+            lines, r'Wacom ISD.*id=(\d+)'), [13, 14, 19])
+
+    def test_parse_device_property(self):
+        lines = [
+            b"Device 'Wacom ISDv4 E6 Pen stylus':\n",
+            b'\tDevice Enabled (142):\t1\n',
+            b'\tWacom Rotation (289):\t0\n',
+        ]
+        self.assertTrue(tps.input.parse_device_property(
+            lines, 'Wacom Rotation'))
+        self.assertFalse(tps.input.parse_device_property(
+            lines, 'Wacom Enable Touch'))
+
+
+class RemapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.machine = FakeMachine()
+
+    @contextlib.contextmanager
+    def fake(self):
+        with FakeCommandLayer(self.machine) as layer, \
+                unittest.mock.patch('tps.cache.DIRECTORY', self.tempdir.name):
+            yield layer
+
+    def test_remap_after_rotation(self):
+        with self.fake():
+            tps.rotate.rotate(tps.config.get_config(), 'left')
+        rotated = [dict(device) for device in self.machine.state['devices']]
+        for device in self.machine.state['devices']:
+            device.update(matrix=[1, 0, 0, 0, 1, 0, 0, 0, 1], rotate='none',
+                          output=None)
+
+        with self.fake() as layer:
+            self.assertEqual(tps.input.remap(), [20, 21, 22])
+        self.assertEqual(self.machine.state['devices'], rotated)
+        self.assertFalse([command for command in layer.format_spawns()
+                          if command.startswith('xrandr')])
+
+    def test_stored_matrix(self):
+        with self.fake():
+            tps.input.map_rotate_all_input_devices(
+                'LVDS1', tps.INVERTED, [-1, 0, 1, 0, -1, 1, 0, 0, 1])
+            self.assertEqual(tps.input.load_mapping(), {
+                'output': 'LVDS1', 'rotation': 'inverted',
+                'matrix': [-1, 0, 1, 0, -1, 1, 0, 0, 1]})
+
+    def test_nothing_stored(self):
+        with self.fake() as layer:
+            self.assertIsNone(tps.input.remap())
+        self.assertEqual(layer.format_spawns(), [])
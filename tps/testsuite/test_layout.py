@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import tps
+import tps.config
+import tps.dock
+import tps.input
+import tps.layout
+from tps.testsuite import synthetic
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def test_parse_layout(self):
+        outputs, screen = tps.layout.parse_layout(
+            synthetic.read_sample('X220', 'xrandr_on'))
+        self.assertEqual(screen, (3286, 1200))
+        self.assertEqual(outputs, [
+            {'name': 'LVDS1', 'mode': '1366x768', 'x': 0, 'y': 0,
+             'rotation': 'normal', 'primary': False},
+            {'name': 'HDMI1', 'mode': '1920x1200', 'x': 1366, 'y': 0,
+             'rotation': 'normal', 'primary': False},
+        ])
+
+    def test_parse_layout_rotated_and_off(self):
+        outputs = synthetic.make_outputs(externals=2, disconnected=1)
+        outputs[0]['rotation'] = 'left'
+        outputs[0]['primary'] = False
+        outputs[1]['primary'] = True
+        outputs[2]['enabled'] = False
+        outputs[2]['mode'] = None
+        parsed, screen = tps.layout.parse_layout(
+            synthetic.render_xrandr(outputs).splitlines(True))
+        self.assertEqual([(output['name'], output['mode'], output['rotation'],
+                           output['primary']) for output in parsed],
+                         [('LVDS1', '1366x768', 'left', False),
+                          ('HDMI1', '1920x1200', 'normal', True),
+                          ('HDMI2', None, 'normal', False)])
+
+    def test_parse_edids(self):
+        outputs = synthetic.make_outputs(externals=1, disconnected=2)
+        edids = tps.layout.parse_edids(synthetic.render_xrandr(
+            outputs, verbose=True, properties=2).splitlines(True))
+        self.assertEqual(sorted(edids), ['HDMI1', 'LVDS1'])
+        self.assertEqual(edids['HDMI1'],
+                         bytes.fromhex(''.join(synthetic._edid('HDMI1'))))
+
+    def test_fingerprint(self):
+        first = tps.layout.fingerprint({'LVDS1': b'a', 'HDMI1': b'b'})
+        self.assertEqual(
+            first, tps.layout.fingerprint({'HDMI1': b'b', 'LVDS1': b'a'}))
+        self.assertNotEqual(
+            first, tps.layout.fingerprint({'LVDS1': b'a', 'HDMI1': b'c'}))
+        self.assertNotEqual(
+            first, tps.layout.fingerprint({'LVDS1': b'a', 'DP1': b'b'}))
+
+
+class CaptureTestCase(unittest.TestCase):
+
+    def test_mode_with_rate(self):
+        machine = FakeMachine(externals=1)
+        internal = machine.output('LVDS1')
+        internal['modes'].insert(0, '1600x900_60.00')
+        internal['rates'].insert(0, '60.0')
+        internal['mode'] = '1600x900_60.00'
+        internal['rotation'] = 'left'
+        machine.output('HDMI1').update(enabled=True, mode='1920x1200', x=900)
+        with FakeCommandLayer(machine):
+            layout = tps.layout.capture('LVDS1')
+        self.assertEqual(layout['rotation'], 'left')
+        self.assertEqual(layout['outputs'][0]['mode'], '1600x900_60.00')
+        rs = {'screen_width': 2820, 'screen_height': 1600,
+              'output_width': 900, 'output_height': 1600,
+              'output_x': 0, 'output_y': 0}
+        self.assertEqual(layout['matrix'],
+                         tps.input.coordinate_transformation_matrix(
+                             rs, tps.translate_direction('left')))
+
+
+class DockLayoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.cache = os.path.join(self.tempdir.name, 'cache')
+        self.directory = os.path.join(self.tempdir.name, 'layouts')
+
+    @contextlib.contextmanager
+    def fake(self, machine):
+        with FakeCommandLayer(machine) as layer, \
+                unittest.mock.patch('tps.cache.DIRECTORY', self.cache), \
+                unittest.mock.patch('tps.layout.DIRECTORY', self.directory):
+            yield layer
+
+    def dock(self, machine, on, config=None):
+        with self.fake(machine) as layer:
+            tps.dock.dock(on, config or tps.config.get_config())
+        return layer
+
+    def layouts(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.listdir(self.directory))
+
+    def layout_calls(self, layer):
+        return [command for command in layer.format_spawns()
+                if command.startswith('xrandr --output')]
+
+    def test_second_dock_uses_stored_layout(self):
+        machine = FakeMachine(externals=2)
+        first = self.dock(machine, True)
+        docked = [dict(output) for output in machine.state['outputs']]
+        matrices = [device['matrix'] for device in machine.state['devices']]
+        self.assertGreater(len(self.layout_calls(first)), 1)
+        self.assertEqual(len(self.layouts()), 1)
+
+        self.dock(machine, False)
+        second = self.dock(machine, True)
+        self.assertEqual(len(self.layout_calls(second)), 1)
+        self.assertEqual(machine.state['outputs'], docked)
+        self.assertEqual([device['matrix']
+                          for device in machine.state['devices']], matrices)
+        self.assertLess(second.critical_path, first.critical_path)
+
+    def test_other_monitors(self):
+        self.dock(FakeMachine(externals=1), True)
+        layer = self.dock(FakeMachine(externals=2), True)
+        self.assertGreater(len(self.layout_calls(layer)), 1)
+
+    def test_changed_config(self):
+        machine = FakeMachine(externals=1)
+        self.dock(machine, True)
+        self.dock(machine, False)
+        config = tps.config.get_config()
+        config['screen']['primary'] = 'LVDS1'
+        layer = self.dock(machine, True, config)
+        self.assertGreater(len(self.layout_calls(layer)), 1)
+        self.assertTrue(machine.output('LVDS1')['primary'])
+
+    def test_disabled(self):
+        config = tps.config.get_config()
+        config['dock']['layout_profiles'] = 'false'
+        self.dock(FakeMachine(externals=1), True, config)
+        self.assertEqual(self.layouts(), [])
+
+    def test_broken_layout_falls_back(self):
+        machine = FakeMachine(externals=1)
+        self.dock(machine, True)
+        self.dock(machine, False)
+        path = os.path.join(self.directory, self.layouts()[0])
+        with open(path) as handle:
+            entry = json.load(handle)
+        entry['value']['outputs'][1]['name'] = 'HDMI9'
+        with open(path, 'w') as handle:
+            json.dump(entry, handle)
+
+        with self.assertLogs('tps.layout', 'WARNING'):
+            layer = self.dock(machine, True)
+        self.assertGreater(len(self.layout_calls(layer)), 1)
+        self.assertTrue(machine.output('HDMI1')['primary'])
+
+    def test_save_layout(self):
+        machine = FakeMachine(externals=1)
+        self.dock(machine, True)
+        machine.output('LVDS1')['y'] = 1200
+        config = tps.config.get_config()
+        with self.fake(machine):
+            tps.dock.save_layout(config)
+        self.dock(machine, False)
+        self.dock(machine, True)
+        self.assertEqual(machine.output('LVDS1')['y'], 1200)
+        self.assertFalse(os.path.isdir(self.cache)
+                         and any(name.startswith('layout')
+                                 for name in os.listdir(self.cache)))
+
+    def test_keeps_the_rotation(self):
+        machine = FakeMachine(externals=1)
+        self.dock(machine, True)
+        self.dock(machine, False)
+        machine.output('LVDS1')['rotation'] = 'left'
+
+        layer = self.dock(machine, True)
+        self.assertGreater(len(self.layout_calls(layer)), 1)
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'left')
+        self.assertEqual(len(self.layouts()), 2)
+
+        self.dock(machine, False)
+        machine.output('LVDS1')['rotation'] = 'normal'
+        layer = self.dock(machine, True)
+        self.assertEqual(len(self.layout_calls(layer)), 1)
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'normal')
+
+
+if __name__ == '__main__':
+    unittest.main()
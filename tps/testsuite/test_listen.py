@@ -0,0 +1,430 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import glob
+import os
+import socket
+import tempfile
+import unittest
+import unittest.mock
+
+import tps.config
+import tps.evdev
+import tps.listen
+import tps.uevent
+from tps.testsuite import synthetic
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+DOCK_EVENT = (b'change@/devices/platform/dock.0\0ACTION=change\0'
+              b'DEVPATH=/devices/platform/dock.0\0SUBSYSTEM=platform\0'
+              b'EVENT=dock\0')
+USB_EVENT = (b'add@/devices/pci0000:00/0000:00:1d.0/usb2/2-1/2-1.4\0'
+             b'ACTION=add\0SUBSYSTEM=usb\0DEVTYPE=usb_device\0'
+             b'PRODUCT=273f/1007/100\0')
+DRM_EVENT = (b'change@/devices/pci0000:00/0000:00:02.0/drm/card0\0'
+             b'ACTION=change\0SUBSYSTEM=drm\0HOTPLUG=1\0')
+
+
+class ClassifyTestCase(unittest.TestCase):
+
+    def event(self, message):
+        return tps.uevent.parse(message)
+
+    def test_dock_station(self):
+        self.assertEqual(tps.listen.classify(self.event(DOCK_EVENT), set()),
+                         'dock')
+
+    def test_usb(self):
+        event = self.event(USB_EVENT)
+        self.assertEqual(tps.listen.classify(event, {'273f/1007'}), 'dock')
+        self.assertEqual(tps.listen.classify(event, None), 'dock')
+        self.assertIsNone(tps.listen.classify(event, {'46d/c05a'}))
+        self.assertIsNone(tps.listen.classify(event, set()))
+
+    def test_drm(self):
+        self.assertEqual(tps.listen.classify(self.event(DRM_EVENT), set()),
+                         'screens')
+        self.assertIsNone(tps.listen.classify(
+            {'SUBSYSTEM': 'drm', 'ACTION': 'add'}, set()))
+
+    def test_usb_product(self):
+        self.assertEqual(tps.listen._usb_product('046D:C05A'), '46d/c05a')
+
+
+class ListenerTestCase(unittest.TestCase):
+
+    def test_coalesce(self):
+        listener = tps.listen.Listener(tps.config.get_config(), 0.01)
+        calls = []
+        for i in range(5):
+            listener.schedule('dock', lambda i=i: calls.append(i))
+        listener.schedule('screens', lambda: calls.append('screens'), 0.02)
+        listener.run()
+        self.assertEqual(calls, [4, 'screens'])
+
+    def test_failing_action(self):
+        listener = tps.listen.Listener(tps.config.get_config(), 0)
+        calls = []
+        listener.schedule('a', lambda: 1 / 0)
+        listener.schedule('b', lambda: calls.append('b'))
+        with self.assertLogs('tps.listen', 'ERROR'):
+            listener.run()
+        self.assertEqual(calls, ['b'])
+
+
+class UeventSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair(socket.AF_UNIX,
+                                                       socket.SOCK_DGRAM)
+        self.addCleanup(self.sender.close)
+        self.addCleanup(self.receiver.close)
+        self.config = tps.config.get_config()
+        self.config['trigger']['dock_triggers'] = 'uevent_on uevent_off'
+        self.config['dock']['usb_indicator_ids'] = '273f:1007'
+        self.docked = False
+        patch = unittest.mock.patch('tps.dock.is_docked',
+                                    lambda config: self.docked)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def listen(self, machine, docked, messages, duration=0.2):
+        with FakeCommandLayer(machine) as layer:
+            listener = tps.listen.Listener(self.config, 0.05)
+            listener.add(tps.listen.UeventSource(self.config, self.receiver))
+            self.docked = docked
+            for message in messages:
+                self.sender.send(message)
+            listener.run(duration)
+        return layer
+
+    def test_dock_burst(self):
+        machine = FakeMachine(externals=1)
+        layer = self.listen(machine, True, [
+            DOCK_EVENT, USB_EVENT, b'libudev\0', DRM_EVENT, USB_EVENT])
+
+        self.assertTrue(machine.output('HDMI1')['enabled'])
+        self.assertEqual(layer.format_spawns().count('xrandr --query'), 1)
+
+    def test_unchanged(self):
+        layer = self.listen(FakeMachine(externals=1), False, [DOCK_EVENT])
+        self.assertNotIn('xrandr --query', layer.format_spawns())
+
+    def test_disabled_trigger(self):
+        self.config['trigger']['dock_triggers'] = 'udev1_on udev1_off'
+        machine = FakeMachine(externals=1)
+        self.listen(machine, True, [DOCK_EVENT])
+        self.assertFalse(machine.output('HDMI1')['enabled'])
+
+
+class AcpidSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.path = os.path.join(self.tempdir.name, 'acpid.socket')
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(self.server.close)
+        self.server.bind(self.path)
+        self.server.listen(1)
+        self.config = tps.config.get_config()
+        self.config['trigger']['rotate_triggers'] = \
+            'acpid_normal acpid_rotated'
+        self.config['trigger']['mutemic_triggers'] = 'acpid_mutemic'
+
+    def connect(self, listener):
+        source = tps.listen.AcpidSource(self.config, self.path)
+        listener.add(source)
+        connection, address = self.server.accept()
+        self.addCleanup(connection.close)
+        return source, connection
+
+    def test_event_files(self):
+        # The listener handles the same events as the installed files.
+        events = []
+        for path in glob.glob(os.path.join(synthetic.SAMPLE_DATA, os.pardir,
+                                           'thinkpad-*-acpi-hook*')):
+            with open(path) as handle:
+                fields = dict(line.strip().split('=', 1) for line in handle
+                              if '=' in line and not line.startswith('#'))
+            events.append((fields['event'],
+                           fields['action'].split('--via-hook ')[1]))
+        self.assertEqual(sorted(events), sorted(tps.listen.ACPI_EVENTS))
+
+    def test_match(self):
+        listener = tps.listen.Listener(self.config)
+        source, connection = self.connect(listener)
+        self.assertEqual(
+            source.match('video/tabletmode TBLT 0000008A 00000001 00000000'),
+            'acpi2_rotated')
+        self.assertEqual(source.match('ibm/hotkey HKEY 00000080 0000500a'),
+                         'acpi1_normal')
+        self.assertIsNone(source.match('button/lid LID close'))
+
+    def test_rotate_and_mutemic(self):
+        machine = FakeMachine()
+        with FakeCommandLayer(machine) as layer:
+            listener = tps.listen.Listener(self.config, 0.05)
+            source, connection = self.connect(listener)
+            # Both hinge events of one rotation, the second line in pieces.
+            connection.sendall(b'ibm/hotkey HKEY 00000080 00005009\n'
+                               b'video/tabletmode TBLT 0000008A 0000')
+            connection.sendall(b'0001 00000000\nbutton/lid LID open\n'
+                               b'ibm/hotkey HKEY 00000080 0000101b\n')
+            listener.run(0.2)
+
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'right')
+        self.assertEqual(len([command for command in layer.format_spawns()
+                              if command.startswith('amixer')]), 1)
+
+    def test_disabled_trigger(self):
+        self.config['trigger']['rotate_triggers'] = 'acpi1_rotated'
+        machine = FakeMachine()
+        with FakeCommandLayer(machine):
+            listener = tps.listen.Listener(self.config, 0)
+            source, connection = self.connect(listener)
+            connection.sendall(b'ibm/hotkey HKEY 00000080 00005009\n')
+            listener.run(0.1)
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'normal')
+
+    def test_reconnect(self):
+        listener = tps.listen.Listener(self.config)
+        source, connection = self.connect(listener)
+        connection.close()
+        with unittest.mock.patch.object(source, 'RECONNECT', 0.01), \
+                self.assertLogs('tps.listen', 'WARNING'):
+            listener.run(0.05)
+        self.assertEqual(listener.sources, [source])
+        self.server.accept()[0].close()
+
+    def test_reconnect_after_error(self):
+        listener = tps.listen.Listener(self.config)
+        source, connection = self.connect(listener)
+        self.addCleanup(source.sock.close)
+        connection.sendall(b'button/lid LID open\n')
+        # The real socket stays readable, a dead one must not be selected.
+        sock = source.sock = unittest.mock.Mock(fileno=source.sock.fileno)
+        sock.recv.side_effect = ConnectionResetError
+        with unittest.mock.patch.object(source, 'RECONNECT', 0.01), \
+                self.assertLogs('tps.listen', 'WARNING'):
+            listener.run(0.05)
+        self.addCleanup(source.sock.close)
+        self.assertEqual(sock.recv.call_count, 1)
+        sock.close.assert_called_once_with()
+        self.assertIsNot(source.sock, sock)
+        self.assertEqual(listener.sources, [source])
+        self.server.accept()[0].close()
+
+
+def switch(value):
+    return tps.evdev.EVENT.pack(0, 0, tps.evdev.EV_SW,
+                                tps.evdev.SW_TABLET_MODE, value) \
+        + tps.evdev.EVENT.pack(0, 0, tps.evdev.EV_SYN, 0, 0)
+
+
+class TabletModeSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.config = tps.config.get_config()
+        self.config['trigger']['rotate_triggers'] = \
+            'evdev_normal evdev_rotated'
+        self.config['rotate']['tablet_mode_debounce'] = '0.05'
+        self.read, self.write = os.pipe()
+        self.addCleanup(os.close, self.read)
+        self.addCleanup(os.close, self.write)
+
+    def listen(self, machine, tablet, chunks, duration=0.2):
+        path = '/dev/fd/{}'.format(self.read)
+        with FakeCommandLayer(machine) as layer:
+            listener = tps.listen.Listener(self.config)
+            source = tps.listen.TabletModeSource(self.config, path, tablet)
+            self.addCleanup(os.close, source.fd)
+            listener.add(source)
+            for chunk in chunks:
+                os.write(self.write, chunk)
+            listener.run(duration)
+        return layer
+
+    def rotations(self, layer):
+        return [command for command in layer.format_spawns()
+                if command.startswith('xrandr') and '--rotate' in command]
+
+    def test_chatter(self):
+        machine = FakeMachine()
+        layer = self.listen(machine, False, [
+            switch(1), switch(0), switch(1)[:30], switch(1)[30:] + switch(1)])
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'right')
+        self.assertEqual(len(self.rotations(layer)), 1)
+
+    def test_back_to_laptop(self):
+        machine = FakeMachine()
+        machine.output('LVDS1')['rotation'] = 'right'
+        self.listen(machine, True, [switch(0)])
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'normal')
+
+    def test_chatter_to_same_state(self):
+        layer = self.listen(FakeMachine(), False, [switch(1), switch(0)])
+        self.assertEqual(self.rotations(layer), [])
+
+    def test_disabled_trigger(self):
+        self.config['trigger']['rotate_triggers'] = 'acpi2_rotated'
+        machine = FakeMachine()
+        self.listen(machine, False, [switch(1)])
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'normal')
+
+    def test_recorded_file(self):
+        with tempfile.NamedTemporaryFile() as recording:
+            recording.write(switch(1) + switch(0) + switch(1))
+            recording.flush()
+            machine = FakeMachine()
+            with FakeCommandLayer(machine):
+                listener = tps.listen.Listener(self.config)
+                listener.add(tps.listen.TabletModeSource(
+                    self.config, recording.name, False))
+                with self.assertLogs('tps.listen', 'WARNING'):
+                    listener.run(0.2)
+            self.assertEqual(listener.sources, [])
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'right')
+
+
+
+class AccelerometerSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.path = synthetic.make_accelerometer(self.tempdir.name)
+        self.config = tps.config.get_config()
+        self.config['trigger']['rotate_triggers'] = 'accelerometer'
+        self.config['rotate']['accelerometer_interval'] = '0.01'
+        self.config['rotate']['accelerometer_idle_interval'] = '0.08'
+        self.config['rotate']['accelerometer_dwell'] = '0.1'
+        self.machine = FakeMachine()
+        layer = FakeCommandLayer(self.machine)
+        self.layer = layer.__enter__()
+        self.addCleanup(layer.__exit__, None, None, None)
+        self.listener = tps.listen.Listener(self.config)
+        self.source = tps.listen.AccelerometerSource(self.config, self.path)
+        self.addCleanup(self.source.device.close)
+        self.source.start(self.listener)
+
+    def rotations(self):
+        return [command for command in self.layer.format_spawns()
+                if command.startswith('xrandr') and '--rotate' in command]
+
+    def test_turn(self):
+        self.assertEqual(self.source.current, 'normal')
+        synthetic.write_accel(self.path, -980, 0, 0)
+        self.listener.run(0.05)
+        self.assertEqual(self.machine.output('LVDS1')['rotation'], 'normal')
+        self.listener.run(0.15)
+        self.assertEqual(self.machine.output('LVDS1')['rotation'], 'left')
+        self.assertEqual(len(self.rotations()), 1)
+
+    def test_short_turn(self):
+        synthetic.write_accel(self.path, -980, 0, 0)
+        self.listener.run(0.05)
+        synthetic.write_accel(self.path, 0, 980, 0)
+        self.listener.run(0.2)
+        self.assertEqual(self.rotations(), [])
+
+    def test_hysteresis(self):
+        # 50 degrees to the right is not far enough from normal.
+        synthetic.write_accel(self.path, 751, 630, 0)
+        self.listener.run(0.2)
+        self.assertEqual(self.rotations(), [])
+
+    def test_adaptive_rate(self):
+        self.listener.run(0.3)
+        self.assertEqual(self.source.delay, 0.08)
+        synthetic.write_accel(self.path, 0, 900, 300)
+        self.source.sample(self.listener)
+        self.assertEqual(self.source.delay, 0.01)
+
+    def test_rotated_by_hand(self):
+        self.machine.output('LVDS1')['rotation'] = 'left'
+        synthetic.write_accel(self.path, -980, 0, 0)
+        self.listener.run(0.2)
+        self.assertEqual(self.rotations(), [])
+
+    def test_device_gone(self):
+        with unittest.mock.patch.object(self.source.device, 'read',
+                                        side_effect=OSError('No such device')), \
+                self.assertLogs('tps.listen', 'WARNING'):
+            self.listener.run()
+        self.assertEqual(self.listener.pending, {})
+
+
+
+SCREEN_CHANGE = b'''RRScreenChangeNotify event, serial 18, synthetic NO, window 0x4a1,
+    root 0x4a1, timestamp 3171830, config_timestamp 3171828
+    size_index 65535, subpixel_order SubPixelHorizontalRGB
+    rotation RR_Rotate_0
+    width 3286, height 1200, mwidth 868, mheight 317
+
+'''
+OUTPUT_CHANGE = b'''RRNotify event, serial 18, synthetic NO, window 0x4a1,
+    subtype XRROutputChangeNotifyEvent
+    output HDMI1, crtc 64, mode 1920x1200 (1920x1200), rotation RR_Rotate_0
+    connection RR_Connected, subpixel_order SubPixelUnknown
+
+'''
+
+
+class RandrSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        read, write = os.pipe()
+        self.stream = os.fdopen(read, 'rb')
+        self.addCleanup(self.stream.close)
+        self.writer = os.fdopen(write, 'wb', buffering=0)
+        self.addCleanup(self.writer.close)
+        self.config = tps.config.get_config()
+        self.machine = FakeMachine(externals=1)
+        layer = FakeCommandLayer(self.machine)
+        self.layer = layer.__enter__()
+        self.addCleanup(layer.__exit__, None, None, None)
+        self.listener = tps.listen.Listener(self.config, 0.05)
+        self.listener.add(tps.listen.RandrSource(self.config, self.stream))
+        self.started = len(self.layer.format_spawns())
+
+    def spawns(self):
+        return self.layer.format_spawns()[self.started:]
+
+    def mapped(self):
+        return [self.machine.device(id)['output'] for id in (20, 21, 22)]
+
+    def test_external_screen(self):
+        external = self.machine.output('HDMI1')
+        external.update(enabled=True, mode='1920x1200', x=1366)
+        self.writer.write(SCREEN_CHANGE + OUTPUT_CHANGE + SCREEN_CHANGE[:40])
+        self.writer.write(SCREEN_CHANGE[40:] + OUTPUT_CHANGE)
+        self.listener.run(0.2)
+
+        queries = [command for command in self.spawns()
+                   if command.startswith('xrandr')]
+        self.assertEqual(queries, ['xrandr --current'])
+        self.assertEqual(self.mapped(), ['LVDS1'] * 3)
+
+    def test_unchanged(self):
+        self.writer.write(OUTPUT_CHANGE)
+        self.listener.run(0.2)
+        self.assertEqual(self.spawns(), ['xrandr --current'])
+        self.assertEqual(self.mapped(), [None] * 3)
+
+    def test_other_events(self):
+        self.writer.write(b'PropertyNotify event, serial 18, synthetic NO\n')
+        self.listener.run(0.2)
+        self.assertEqual(self.spawns(), [])
+
+    def test_xev_exits(self):
+        self.writer.close()
+        with self.assertLogs('tps.listen', 'WARNING'):
+            self.listener.run()
+        self.assertEqual(self.listener.sources, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
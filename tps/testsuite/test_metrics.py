@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import configparser
+import json
+import os
+import tempfile
+import unittest
+
+import tps
+import tps.metrics
+import tps.trace
+
+
+class ActionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.addCleanup(tps.trace.disable)
+        self.jsonl = os.path.join(self.tempdir.name, 'actions.jsonl')
+        self.textfile = os.path.join(self.tempdir.name, 'tps.prom')
+        self.config = configparser.ConfigParser()
+        self.config['metrics'] = {'jsonl': self.jsonl,
+                                  'prometheus_textfile': self.textfile}
+
+    def records(self):
+        with open(self.jsonl) as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_disabled(self):
+        self.config['metrics'] = {'jsonl': '', 'prometheus_textfile': ''}
+        with tps.metrics.Action('rotate', self.config):
+            tps.metrics.annotate(screens=1)
+        self.assertFalse(tps.trace.enabled())
+        self.assertFalse(os.path.exists(self.jsonl))
+
+    def test_record(self):
+        with tps.metrics.Action('rotate', self.config, 'acpi1_rotated'):
+            tps.check_call(['true'], tps.logger)
+            tps.check_call(['true'], tps.logger)
+            tps.metrics.annotate(screens=2, devices=3)
+
+        record, = self.records()
+        self.assertEqual(record['action'], 'rotate')
+        self.assertEqual(record['trigger'], 'acpi1_rotated')
+        self.assertEqual(record['outcome'], 'success')
+        self.assertEqual(record['spawns'], 2)
+        self.assertEqual(list(record['steps']), ['true'])
+        self.assertEqual((record['screens'], record['devices']), (2, 3))
+        self.assertGreaterEqual(record['duration'], record['steps']['true'])
+
+    def test_outcomes(self):
+        with self.assertRaises(SystemExit):
+            with tps.metrics.Action('rotate', self.config):
+                raise SystemExit(1)
+        with self.assertRaises(KeyError):
+            with tps.metrics.Action('rotate', self.config):
+                raise KeyError('foo')
+        with self.assertRaises(SystemExit):
+            with tps.metrics.Action('rotate', self.config):
+                raise SystemExit(0)
+
+        self.assertEqual([record['outcome'] for record in self.records()],
+                         ['failure', 'error', 'success'])
+        self.assertEqual(self.records()[1]['error'], 'KeyError')
+
+    def test_textfile_accumulates(self):
+        for i in range(3):
+            with tps.metrics.Action('dock_on', self.config, 'udev1_on'):
+                pass
+        with tps.metrics.Action('dock_off', self.config):
+            pass
+
+        with open(self.textfile) as handle:
+            samples = tps.metrics.parse_textfile(handle)
+        prefix = tps.metrics.PREFIX
+        self.assertEqual(samples[(prefix + '_total', (
+            ('action', 'dock_on'), ('trigger', 'udev1_on'),
+            ('outcome', 'success')))], 3)
+        self.assertEqual(samples[(prefix + '_total', (
+            ('action', 'dock_off'), ('trigger', 'manual'),
+            ('outcome', 'success')))], 1)
+        self.assertEqual(samples[(prefix + '_duration_seconds_bucket', (
+            ('action', 'dock_on'), ('le', '+Inf')))], 3)
+        self.assertEqual(samples[(prefix + '_duration_seconds_count', (
+            ('action', 'dock_on'),))], 3)
+
+    def test_textfile_format(self):
+        with tps.metrics.Action('rotate', self.config):
+            pass
+        with open(self.textfile) as handle:
+            lines = handle.read().splitlines()
+
+        buckets = [line for line in lines if '_bucket{' in line]
+        self.assertEqual([line.split('le="')[1].split('"')[0]
+                          for line in buckets],
+                         [str(bound) for bound in tps.metrics.BUCKETS]
+                         + ['+Inf'])
+        self.assertIn('# TYPE {}_duration_seconds histogram'.format(
+            tps.metrics.PREFIX), lines)
+        self.assertFalse(any(name.endswith('.tmp')
+                             for name in os.listdir(self.tempdir.name)))
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import contextlib
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+
+import tps
+import tps.record
+
+
+class RecordTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.addCleanup(tps.record.stop)
+        self.directory = os.path.join(self.tempdir.name, 'recording')
+
+    def entries(self):
+        with open(os.path.join(self.directory, tps.record.INDEX)) as handle:
+            return [json.loads(line) for line in handle]
+
+    def run_commands(self):
+        results = [
+            tps.check_call(['true'], tps.logger),
+            tps.call(['sh', '-c', 'exit 3'], tps.logger),
+            tps.check_output(['printf', 'abc'], tps.logger),
+            tps.check_output(['printf', 'abc'], tps.logger),
+            list(tps.stream_output(['printf', 'a\\nbc\\n'], tps.logger)),
+        ]
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            tps.check_output(['sh', '-c', 'printf x; exit 2'], tps.logger)
+        results.append((context.exception.returncode,
+                        context.exception.output))
+        with contextlib.closing(tps.stream_output(['yes'],
+                                                  tps.logger)) as lines:
+            results.append(next(lines))
+        with self.assertRaises(FileNotFoundError):
+            tps.call(['/nonexistent/program'], tps.logger)
+        return results
+
+    def test_record(self):
+        tps.record.start_recording(self.directory)
+        self.run_commands()
+
+        invocation, *commands = self.entries()
+        self.assertIn('invocation', invocation)
+        self.assertEqual([entry['argv'][0] for entry in commands],
+                         ['true', 'sh', 'printf', 'printf', 'printf', 'sh',
+                          'yes', '/nonexistent/program'])
+        self.assertEqual([entry['returncode'] for entry in commands],
+                         [0, 3, 0, 0, 0, 2, None, None])
+        self.assertEqual(commands[2]['stdout'], commands[3]['stdout'])
+        self.assertNotIn('stdout', commands[0])
+        self.assertFalse(commands[6]['complete'])
+        self.assertEqual(commands[7]['error'], 'FileNotFoundError')
+        self.assertEqual(len(os.listdir(os.path.join(self.directory,
+                                                     'stdout'))), 4)
+
+    def test_replay_matches_record(self):
+        tps.record.start_recording(self.directory)
+        recorded = self.run_commands()
+        tps.record.stop()
+
+        tps.record.start_replay(self.directory)
+        with unittest.mock.patch('subprocess.Popen') as popen:
+            replayed = self.run_commands()
+        popen.assert_not_called()
+        self.assertEqual(replayed, recorded)
+
+    def test_replay_sequence(self):
+        with open(os.path.join(self.tempdir.name, 'counter'), 'w') as handle:
+            handle.write('0')
+        command = ['sh', '-c', 'n=$(cat counter); echo $((n + 1)) > counter; '
+                               'cat counter']
+        tps.record.start_recording(self.directory)
+        outputs = [tps.check_output(command, tps.logger,
+                                    cwd=self.tempdir.name)
+                   for i in range(2)]
+        tps.record.stop()
+
+        tps.record.start_replay(self.directory)
+        self.assertEqual([tps.check_output(command, tps.logger)
+                          for i in range(3)],
+                         outputs + outputs[-1:])
+        with self.assertRaises(tps.record.NotRecordedException):
+            tps.check_call(['true'], tps.logger)
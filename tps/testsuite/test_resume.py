@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import contextlib
+import tempfile
+import unittest
+import unittest.mock
+
+import tps.config
+import tps.dock
+import tps.resume
+import tps.rotate
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+
+class OutputsTestCase(unittest.TestCase):
+
+    def test_rotation_only(self):
+        self.assertEqual(tps.resume.desired_outputs(
+            None, {'output': 'LVDS1', 'rotation': 'left'}, 'LVDS1'),
+            [{'name': 'LVDS1', 'rotation': 'left'}])
+
+    def test_rotated_at_the_dock(self):
+        layout = {'outputs': [
+            {'name': 'LVDS1', 'mode': '1366x768', 'x': 0, 'y': 0,
+             'rotation': 'normal', 'primary': False},
+            {'name': 'HDMI1', 'mode': None, 'x': 0, 'y': 0,
+             'rotation': 'normal', 'primary': False},
+        ]}
+        outputs = tps.resume.desired_outputs(
+            layout, {'output': 'LVDS1', 'rotation': 'right'}, 'LVDS1')
+        self.assertEqual(outputs[0]['rotation'], 'right')
+        self.assertEqual(layout['outputs'][0]['rotation'], 'normal')
+        outputs = tps.resume.desired_outputs(
+            layout, {'output': 'HDMI1', 'rotation': 'right'}, 'LVDS1')
+        self.assertEqual(outputs[1]['rotation'], 'normal')
+
+    def test_lost_outputs(self):
+        current = [{'name': 'LVDS1', 'mode': '1366x768', 'rotation': 'left'},
+                   {'name': 'HDMI1', 'mode': None, 'rotation': 'normal'}]
+        self.assertEqual(tps.resume.lost_outputs(
+            [{'name': 'LVDS1', 'rotation': 'left'}], current), [])
+        self.assertEqual(tps.resume.lost_outputs(
+            [{'name': 'LVDS1', 'rotation': 'left'},
+             {'name': 'HDMI1', 'mode': '1920x1200'},
+             {'name': 'DP1', 'mode': None}], current), ['HDMI1', 'DP1'])
+
+
+class ResumeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.config = tps.config.get_config()
+
+    @contextlib.contextmanager
+    def fake(self, machine):
+        with FakeCommandLayer(machine) as layer, \
+                unittest.mock.patch('tps.cache.DIRECTORY', self.tempdir.name):
+            yield layer
+
+    def resume(self, machine):
+        with self.fake(machine) as layer:
+            applied = tps.resume.resume(self.config)
+        return applied, layer.format_spawns()
+
+    def changes(self, spawns):
+        return [command for command in spawns
+                if command.startswith(('xrandr --output', 'xsetwacom set'))
+                or ' set-prop ' in command]
+
+    def test_nothing_recorded(self):
+        applied, spawns = self.resume(FakeMachine())
+        self.assertEqual(applied, [])
+        self.assertEqual(self.changes(spawns), [])
+
+    def test_nothing_lost(self):
+        machine = FakeMachine()
+        with self.fake(machine):
+            tps.rotate.rotate(self.config, 'left')
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, [])
+        self.assertEqual(self.changes(spawns), [])
+        self.assertEqual(len([command for command in spawns
+                              if command.startswith('xrandr')]), 1)
+
+    def test_rotation_lost(self):
+        machine = FakeMachine()
+        with self.fake(machine):
+            tps.rotate.rotate(self.config, 'left')
+        rotated = [dict(device) for device in machine.state['devices']]
+        machine.output('LVDS1')['rotation'] = 'normal'
+        for device in machine.state['devices']:
+            device.update(enabled=True, rotate='none')
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, ['rotation', 'mapping', 'TouchPad',
+                                   'TrackPoint'])
+        self.assertEqual(machine.output('LVDS1')['rotation'], 'left')
+        self.assertEqual(machine.state['devices'], rotated)
+        self.assertIn('xrandr --output LVDS1 --rotate left', spawns)
+
+    def test_pen_lost(self):
+        machine = FakeMachine()
+        with self.fake(machine):
+            tps.rotate.rotate(self.config, 'right')
+        machine.device(21)['rotate'] = 'none'
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, ['mapping'])
+        self.assertEqual(machine.device(21)['rotate'], 'cw')
+        self.assertEqual([command for command in self.changes(spawns)
+                          if command.startswith('xsetwacom')],
+                         ['xsetwacom set 21 rotate cw',
+                          'xsetwacom set 21 MapToOutput LVDS1'])
+
+    def test_pen_lost_output(self):
+        # The X server added the pen again, mapped to the whole desktop.
+        machine = FakeMachine(externals=1)
+        with self.fake(machine):
+            tps.dock.dock(True, self.config)
+        self.assertEqual(self.resume(machine)[0], [])
+        mapped = dict(machine.device(21))
+        machine.device(21).update(output=None,
+                                  matrix=[1, 0, 0, 0, 1, 0, 0, 0, 1])
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, ['mapping'])
+        self.assertEqual(machine.device(21), mapped)
+        self.assertEqual([command for command in self.changes(spawns)
+                          if command.startswith('xsetwacom')],
+                         ['xsetwacom set 21 rotate none',
+                          'xsetwacom set 21 MapToOutput LVDS1'])
+
+    def test_layout_lost(self):
+        machine = FakeMachine(externals=1)
+        with self.fake(machine):
+            tps.dock.dock(True, self.config)
+        docked = [dict(output) for output in machine.state['outputs']]
+        machine.output('HDMI1').update(enabled=False, mode=None,
+                                       primary=False)
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, ['layout', 'mapping'])
+        self.assertEqual(machine.state['outputs'], docked)
+        self.assertEqual(len([command for command in spawns
+                              if command.startswith('xrandr --output')]), 1)
+
+    def test_resumed_undocked(self):
+        machine = FakeMachine(externals=1)
+        with self.fake(machine):
+            tps.dock.dock(True, self.config)
+        hdmi = machine.output('HDMI1')
+        hdmi.update(connected=False, enabled=False, mode=None, primary=False)
+        machine.device(21)['matrix'] = [1, 0, 0, 0, 1, 0, 0, 0, 1]
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, [])
+        self.assertEqual(self.changes(spawns), [])
+
+    def test_layout_rejected(self):
+        machine = FakeMachine(externals=1)
+        with self.fake(machine):
+            tps.dock.dock(True, self.config)
+        machine.output('HDMI1').update(enabled=False, mode=None,
+                                       primary=False)
+        machine.state['crtcs'] = 1
+
+        with self.assertLogs('tps.layout', 'WARNING'):
+            applied, spawns = self.resume(machine)
+        self.assertNotIn('layout', applied)
+
+    def test_undocked(self):
+        machine = FakeMachine(externals=1)
+        with self.fake(machine):
+            tps.dock.dock(True, self.config)
+            tps.dock.dock(False, self.config)
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, [])
+        self.assertFalse(machine.output('HDMI1')['enabled'])
+
+    def test_toggled_by_hand(self):
+        machine = FakeMachine()
+        with self.fake(machine), \
+                unittest.mock.patch('sys.argv', ['thinkpad-touchpad', 'off']):
+            tps.input.state_change_ui('touchpad_device')
+        machine.device(16)['enabled'] = True
+
+        applied, spawns = self.resume(machine)
+        self.assertEqual(applied, ['TouchPad'])
+        self.assertFalse(machine.device(16)['enabled'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import unittest
+
+import tps
+import tps.config
+import tps.rotate
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+
+
+class RotateToTestCase(unittest.TestCase):
+
+    def test_rotate_to_left(self):
+        machine = FakeMachine(wacom=3)
+        with FakeCommandLayer(machine):
+            tps.rotate.rotate_to(tps.LEFT, tps.config.get_config())
+
+        self.assertEqual(machine.state['outputs'][0]['rotation'], 'left')
+        devices = {device['name']: device
+                   for device in machine.state['devices']}
+        self.assertFalse(devices['TPPS/2 IBM TrackPoint']['enabled'])
+        self.assertFalse(devices['SynPS/2 Synaptics TouchPad']['enabled'])
+        self.assertEqual(devices['Wacom ISDv4 E6 Pen stylus']['rotate'], 'ccw')
+        self.assertEqual(devices['Wacom ISDv4 E6 Pen stylus']['output'],
+                         'LVDS1')
+
+    def test_rotate_to_normal(self):
+        machine = FakeMachine(wacom=0)
+        with FakeCommandLayer(machine):
+            config = tps.config.get_config()
+            tps.rotate.rotate_to(tps.INVERTED, config)
+            tps.rotate.rotate_to(tps.NORMAL, config)
+
+        self.assertEqual(machine.state['outputs'][0]['rotation'], 'normal')
+        self.assertTrue(all(device['enabled']
+                            for device in machine.state['devices']))
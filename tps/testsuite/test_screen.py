@@ -1,9 +1,16 @@
 # Copyright © 2017 Martin Ueding <mu@martin-ueding.de>
 # Licensed under The GNU Public License Version 2 (or later)
 
+import tempfile
 import unittest
+import unittest.mock
 
+import tps.config
+import tps.dock
+import tps.rotate
 import tps.screen
+from tps.testsuite.fake import FakeCommandLayer, FakeMachine
+from tps.testsuite.synthetic import read_sample
 
 
 class XrandrParserTestCase(unittest.TestCase):
@@ -50,3 +57,146 @@ DP-3 disconnected (normal left inverted right x axis y axis)'''
         regex = r'LVDS-?1|eDP-?1'
         with self.assertRaises(AssertionError):
             tps.screen.filter_outputs(outputs, regex)
+
+
+XRANDR_VERBOSE = b'''Screen 0: minimum 320 x 200, current 3286 x 1200, maximum 8192 x 8192
+LVDS1 connected primary 768x1366+0+0 (0x48) left (normal left inverted right x axis y axis) 277mm x 156mm
+	Identifier: 0x43
+	EDID: 
+		00ffffffffffff0030aeb6d000000000
+		00150104901c10780aef1592544e8c25
+	BACKLIGHT: 15 
+		range: (0, 15)
+  1366x768 (0x48) 69.300MHz -HSync -VSync *current +preferred
+        h: width  1366 start 1401 end 1415 total 1458 skew    0 clock  47.53KHz
+        v: height  768 start  771 end  777 total  792           clock  60.02Hz
+VGA1 disconnected (normal left inverted right x axis y axis)
+	Identifier: 0x44
+HDMI1 connected 1920x1200+1366+0 (0x4f) normal (normal left inverted right x axis y axis) 518mm x 324mm
+	Identifier: 0x45
+DP1 connected (normal left inverted right x axis y axis)
+	Identifier: 0x46
+'''
+
+
+class ParseRotationTestCase(unittest.TestCase):
+
+    def test_parse_rotation(self):
+        lines = XRANDR_VERBOSE.splitlines(True)
+        self.assertEqual(tps.screen.parse_rotation(lines, 'LVDS1'), 'left')
+        self.assertEqual(tps.screen.parse_rotation(lines, 'HDMI1'), 'normal')
+
+    def test_parse_rotation_not_enabled(self):
+        lines = XRANDR_VERBOSE.splitlines(True)
+        self.assertIsNone(tps.screen.parse_rotation(lines, 'DP1'))
+        self.assertIsNone(tps.screen.parse_rotation(lines, 'VGA1'))
+        self.assertIsNone(tps.screen.parse_rotation(lines, 'eDP1'))
+
+    def test_parse_rotation_stops_early(self):
+        lines = iter(XRANDR_VERBOSE.splitlines(True))
+        tps.screen.parse_rotation(lines, 'LVDS1')
+        self.assertEqual(next(lines), b'\tIdentifier: 0x43\n')
+
+
+class ParseXrandrTestCase(unittest.TestCase):
+
+    def test_parse_externals(self):
+        lines = read_sample('X220', 'xrandr_on')
+        self.assertEqual(tps.screen.parse_externals(lines, 'LVDS1'), ['HDMI1'])
+        lines = read_sample('X220', 'xrandr_disconnected')
+        self.assertEqual(tps.screen.parse_externals(lines, 'LVDS1'), [])
+
+    def test_parse_resolution_and_shift(self):
+        lines = read_sample('X220', 'xrandr_on')
+        self.assertEqual(
+            tps.screen.parse_resolution_and_shift(lines, 'HDMI1'),
+            {'screen_width': 3286, 'screen_height': 1200,
+             'output_width': 1920, 'output_height': 1200,
+             'output_x': 1366, 'output_y': 0})
+
+    def test_parse_resolution_and_shift_disabled(self):
+        lines = read_sample('X220', 'xrandr_off')
+        self.assertIsNone(
+            tps.screen.parse_resolution_and_shift(lines, 'HDMI1'))
+
+class XrandrQueryTestCase(unittest.TestCase):
+
+    def run_action(self, action, machine):
+        with FakeCommandLayer(machine) as layer:
+            action(tps.config.get_config())
+        return [command for command, latency in layer.spawns
+                if command[0] == 'xrandr']
+
+    def assertReadOnlyCurrent(self, commands):
+        for command in commands:
+            if '--output' not in command and '--query' not in command:
+                self.assertIn('--current', command)
+
+    def test_rotate_does_not_probe(self):
+        commands = self.run_action(
+            lambda config: tps.rotate.rotate(config, 'left'), FakeMachine())
+        self.assertReadOnlyCurrent(commands)
+        self.assertNotIn(['xrandr', '--query'], commands)
+
+    def test_dock_probes_once(self):
+        commands = self.run_action(
+            lambda config: tps.dock.dock(True, config),
+            FakeMachine(externals=2))
+        self.assertReadOnlyCurrent(commands)
+        self.assertEqual(commands.count(['xrandr', '--query']), 1)
+
+
+class GetInternalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.layer = FakeCommandLayer(FakeMachine(externals=1, wacom=0))
+        self.layer.__enter__()
+        self.addCleanup(self.layer.__exit__, None, None, None)
+        for patch in [
+                unittest.mock.patch('tps.cache.DIRECTORY', self.tempdir.name),
+                unittest.mock.patch('tps.drm.connectors',
+                                    return_value=['card0-LVDS-1'])]:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.config = tps.config.get_config()
+
+    def get_internal(self):
+        tps.screen.get_internal.cached_internal = None
+        return tps.screen.get_internal(self.config)
+
+    def xrandr_spawns(self):
+        return sum(command[0] == 'xrandr'
+                   for command, latency in self.layer.spawns)
+
+    def test_cached_across_processes(self):
+        self.assertEqual(self.get_internal(), 'LVDS1')
+        self.assertEqual(self.xrandr_spawns(), 1)
+        self.assertEqual(self.get_internal(), 'LVDS1')
+        self.assertEqual(self.xrandr_spawns(), 1)
+
+    def test_invalidated(self):
+        self.get_internal()
+        with unittest.mock.patch('tps.drm.connectors',
+                                 return_value=['card0-eDP-1']):
+            self.get_internal()
+        self.assertEqual(self.xrandr_spawns(), 2)
+        self.config['screen']['internal_regex'] = 'LVDS1'
+        self.get_internal()
+        self.assertEqual(self.xrandr_spawns(), 3)
+
+    def test_no_cache(self):
+        self.get_internal()
+        tps.screen.get_internal(self.config, cache=False)
+        self.assertEqual(self.xrandr_spawns(), 2)
+
+    def test_renamed_by_driver(self):
+        self.get_internal()
+        self.layer.machine.output('LVDS1')['name'] = 'LVDS-1'
+        tps.screen.get_internal.cached_internal = None
+        tps.rotate.rotate(self.config, 'left')
+        self.assertEqual(tps.screen.get_internal(self.config), 'LVDS-1')
+        self.assertEqual(self.get_internal(), 'LVDS-1')
+        self.assertEqual(
+            self.layer.machine.output('LVDS-1')['rotation'], 'left')
@@ -0,0 +1,22 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import unittest
+
+import tps.sound
+
+
+class ParsePulseaudioSinksTestCase(unittest.TestCase):
+
+    def test_parse_pulseaudio_sinks(self):
+        lines = [
+            b'0\talsa_output.pci-0000_00_1b.0.analog-stereo\tmodule-alsa-card.c\ts16le 2ch 44100Hz\tSUSPENDED\n',
+            b'3\talsa_output.usb-Lenovo_ThinkPad_Dock_USB_Audio.analog-stereo\tmodule-alsa-card.c\ts16le 2ch 48000Hz\tRUNNING\n',
+        ]
+        self.assertEqual(tps.sound.parse_pulseaudio_sinks(lines), ['0', '3'])
+
+    def test_parse_pulseaudio_sinks_empty(self):
+        self.assertEqual(tps.sound.parse_pulseaudio_sinks([]), [])
+        self.assertEqual(tps.sound.parse_pulseaudio_sinks([b'\n']), [])
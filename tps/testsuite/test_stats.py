@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import datetime
+import gzip
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+import tps.stats
+
+SYSLOG = '''\
+Mar 14 12:00:00 x220 kernel: [ 1.0] usb 1-1: new device
+Mar 14 12:00:00 x220 thinkpad-scripts[100]: tps.config DEBUG ----------------------------------
+Mar 14 12:00:00 x220 thinkpad-scripts[100]: tps.config DEBUG Program was started with arguments: ['/usr/bin/thinkpad-dock-hook', 'on', '--via-hook', 'udev1_on']
+Mar 14 12:00:00 x220 thinkpad-scripts[100]: tps DEBUG subprocess “/usr/bin/who”
+Mar 14 12:00:00 x220 thinkpad-scripts[100]: tps DEBUG subprocess “/usr/bin/sudo -u mu -i env DISPLAY=:0.0 /usr/local/bin/thinkpad-dock on --via-hook udev1_on”
+Mar 14 12:00:01 x220 thinkpad-scripts[101]: tps.config DEBUG Program was started with arguments: ['/usr/local/bin/thinkpad-dock', 'on', '--via-hook', 'udev1_on']
+Mar 14 12:00:01 x220 thinkpad-scripts[101]: tps DEBUG subprocess “/usr/bin/xrandr”
+Mar 14 12:00:03 x220 thinkpad-scripts[101]: tps DEBUG subprocess “/usr/bin/xrandr --output VGA1 --auto”
+Mar 14 12:00:04 x220 thinkpad-scripts[101]: tps.config DEBUG Program finished
+Mar 14 12:00:04 x220 thinkpad-scripts[100]: tps.config DEBUG Program finished
+Mar 14 12:00:10 x220 thinkpad-scripts[102]: tps.config DEBUG Program was started with arguments: ['/usr/bin/thinkpad-rotate-hook', '--via-hook', 'acpi1_normal']
+Mar 14 12:00:10 x220 thinkpad-scripts[102]: tps.config DEBUG Program finished
+'''
+
+
+class LogHistogramTestCase(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = tps.stats.LogHistogram()
+        for i in range(1, 1001):
+            histogram.add(i / 1000)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.maximum, 1.0)
+        for percent in (50, 90, 99):
+            self.assertAlmostEqual(histogram.percentile(percent),
+                                   percent / 100, delta=0.04 * percent / 100)
+        self.assertLessEqual(histogram.percentile(100), 1.0)
+
+    def test_empty_and_tiny(self):
+        histogram = tps.stats.LogHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        histogram.add(0)
+        self.assertEqual(histogram.percentile(50), 0)
+
+    def test_memory_is_bounded(self):
+        histogram = tps.stats.LogHistogram()
+        for i in range(100000):
+            histogram.add(0.1 + (i % 1000) / 100)
+        self.assertLess(len(histogram.counts), 100)
+
+
+class DescribeTestCase(unittest.TestCase):
+
+    def test_describe(self):
+        self.assertEqual(tps.stats.describe(
+            ['/usr/bin/thinkpad-dock', 'on', '--via-hook', 'udev1_on', '-v']),
+            ('dock on', 'udev1_on'))
+        self.assertEqual(tps.stats.describe(
+            ['thinkpad-rotate', '--trace', 'out.json', 'left']),
+            ('rotate left', None))
+        self.assertEqual(tps.stats.describe(['thinkpad-mutemic']),
+                         ('mutemic', None))
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def test_syslog(self):
+        messages = list(tps.stats.parse_syslog(io.StringIO(SYSLOG), 2017))
+        self.assertEqual(len(messages), 11)
+        timestamp, pid, text = messages[1]
+        self.assertEqual(pid, 100)
+        self.assertTrue(text.startswith('Program was started'))
+        self.assertEqual(datetime.datetime.fromtimestamp(timestamp),
+                         datetime.datetime(2017, 3, 14, 12))
+
+    def test_syslog_year_rollover(self):
+        lines = [
+            'Dec 31 23:59:59 x220 thinkpad-scripts: tps DEBUG a',
+            'Jan  1 00:00:01 x220 thinkpad-scripts: tps DEBUG b',
+        ]
+        (first, pid, _), (second, _, _) = tps.stats.parse_syslog(lines, 2016)
+        self.assertIsNone(pid)
+        self.assertAlmostEqual(second - first, 2)
+
+    def test_syslog_iso(self):
+        lines = ['2017-03-14T12:00:00.250000+0100 x220 thinkpad-scripts[7]: '
+                 'tps DEBUG subprocess “xrandr”']
+        (timestamp, pid, text), = tps.stats.parse_syslog(lines)
+        self.assertEqual(timestamp, datetime.datetime(
+            2017, 3, 14, 11, 0, 0, 250000,
+            datetime.timezone.utc).timestamp())
+        self.assertEqual((pid, text), (7, 'subprocess “xrandr”'))
+
+    def test_journal_json(self):
+        lines = [
+            json.dumps({'SYSLOG_IDENTIFIER': 'thinkpad-scripts', '_PID': '5',
+                        '__REALTIME_TIMESTAMP': '1489489200500000',
+                        'MESSAGE': 'tps DEBUG subprocess “xrandr”'}),
+            json.dumps({'SYSLOG_IDENTIFIER': 'kernel', '_PID': '1',
+                        '__REALTIME_TIMESTAMP': '1489489200500000',
+                        'MESSAGE': 'thinkpad-scripts mentioned'}),
+        ]
+        self.assertEqual(list(tps.stats.parse_journal_json(lines)),
+                         [(1489489200.5, 5, 'subprocess “xrandr”')])
+
+    def test_journal_export(self):
+        message = 'tps DEBUG subprocess “xrandr”\n'.encode()
+        data = (b'__REALTIME_TIMESTAMP=1489489200500000\n'
+                b'_PID=5\n'
+                b'SYSLOG_IDENTIFIER=thinkpad-scripts\n'
+                b'MESSAGE\n' + struct.pack('<Q', len(message)) + message
+                + b'\n'
+                b'BLOB\n' + struct.pack('<Q', 3) + b'a\nb\n'
+                b'\n'
+                b'__REALTIME_TIMESTAMP=1489489201000000\n'
+                b'SYSLOG_IDENTIFIER=kernel\n'
+                b'MESSAGE=usb\n')
+        self.assertEqual(
+            list(tps.stats.parse_journal_export(io.BytesIO(data))),
+            [(1489489200.5, 5, 'subprocess “xrandr”')])
+
+
+class AnalyzerTestCase(unittest.TestCase):
+
+    def analyze(self):
+        analyzer = tps.stats.Analyzer(top=2)
+        for message in tps.stats.parse_syslog(io.StringIO(SYSLOG), 2017):
+            analyzer.feed(*message)
+        analyzer.finish()
+        return analyzer
+
+    def test_invocations(self):
+        analyzer = self.analyze()
+        self.assertEqual(analyzer.invocations, 3)
+        self.assertEqual(sorted(analyzer.actions),
+                         ['dock on', 'dock-hook on', 'rotate-hook'])
+        self.assertEqual(analyzer.actions['dock on'].maximum, 3)
+        self.assertEqual(analyzer.actions['dock-hook on'].maximum, 4)
+
+    def test_commands(self):
+        analyzer = self.analyze()
+        self.assertEqual(analyzer.programs['xrandr'].count, 2)
+        slowest = sorted(analyzer.slowest, reverse=True)
+        self.assertEqual([(item[0], item[3]) for item in slowest],
+                         [(4, '/usr/bin/sudo -u mu -i env DISPLAY=:0.0 '
+                              '/usr/local/bin/thinkpad-dock on --via-hook '
+                              'udev1_on'),
+                          (2, '/usr/bin/xrandr')])
+
+    def test_triggers(self):
+        analyzer = self.analyze()
+        self.assertEqual(analyzer.triggers, {'udev1_on': [1, 1],
+                                             'acpi1_normal': [1, 0]})
+
+    def test_open_invocations_are_bounded(self):
+        analyzer = tps.stats.Analyzer()
+        for pid in range(tps.stats.MAX_OPEN * 3):
+            analyzer.feed(pid, pid, "Program was started with arguments: "
+                                    "['thinkpad-rotate']")
+        self.assertLessEqual(len(analyzer._open), tps.stats.MAX_OPEN)
+        analyzer.finish()
+        self.assertEqual(analyzer.actions['rotate'].count,
+                         tps.stats.MAX_OPEN * 3)
+
+    def test_report(self):
+        stream = io.StringIO()
+        tps.stats.print_report(self.analyze(), stream)
+        output = stream.getvalue()
+        self.assertIn('3 invocations', output)
+        self.assertRegex(output, r'\ndock on\s+1 ')
+        self.assertRegex(output, r'\nudev1_on\s+1\s+1\n')
+
+
+class ReadMessagesTestCase(unittest.TestCase):
+
+    def test_detects_formats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            syslog = os.path.join(directory, 'syslog.1.gz')
+            with gzip.open(syslog, 'wt') as handle:
+                handle.write(SYSLOG)
+            journal = os.path.join(directory, 'journal.json')
+            with open(journal, 'w') as handle:
+                handle.write(json.dumps({
+                    'SYSLOG_IDENTIFIER': 'thinkpad-scripts',
+                    '__REALTIME_TIMESTAMP': '1000000',
+                    'MESSAGE': 'tps DEBUG subprocess “xrandr”'}) + '\n')
+
+            self.assertEqual(len(list(tps.stats.read_messages(syslog))), 11)
+            self.assertEqual(list(tps.stats.read_messages(journal)),
+                             [(1.0, None, 'subprocess “xrandr”')])
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import contextlib
+import os
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+
+import tps
+
+
+class WhichTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.first = os.path.join(self.tempdir.name, 'first')
+        self.second = os.path.join(self.tempdir.name, 'second')
+        os.mkdir(self.first)
+        os.mkdir(self.second)
+
+        path = os.pathsep.join([self.first, self.second])
+        self.env_patcher = unittest.mock.patch.dict(os.environ, {'PATH': path})
+        self.env_patcher.start()
+        self.cache_patcher = unittest.mock.patch.dict(tps._program_cache,
+                                                      clear=True)
+        self.cache_patcher.start()
+
+    def tearDown(self):
+        self.cache_patcher.stop()
+        self.env_patcher.stop()
+        self.tempdir.cleanup()
+
+    def install(self, dir, name, mtime):
+        path = os.path.join(dir, name)
+        with open(path, 'w') as handle:
+            handle.write('#!/bin/sh\n')
+        os.chmod(path, 0o755)
+        # Make sure that the directory modification is visible even on file
+        # systems with a coarse timestamp resolution.
+        os.utime(dir, (mtime, mtime))
+        return path
+
+    def test_which_found(self):
+        path = self.install(self.second, 'prog', 1000)
+        self.assertEqual(tps.which('prog'), path)
+        self.assertTrue(tps.has_program('prog'))
+
+    def test_which_not_found(self):
+        self.assertIsNone(tps.which('prog'))
+        self.assertFalse(tps.has_program('prog'))
+
+    def test_which_absolute_path(self):
+        path = self.install(self.first, 'hook', 1000)
+        self.assertEqual(tps.which(path), path)
+        self.assertIsNone(tps.which(os.path.join(self.first, 'missing')))
+
+    def test_which_is_cached(self):
+        path = self.install(self.second, 'prog', 1000)
+        self.assertEqual(tps.which('prog'), path)
+        with unittest.mock.patch('tps._is_exe') as is_exe:
+            self.assertEqual(tps.which('prog'), path)
+        is_exe.assert_not_called()
+
+    def test_which_notices_installation(self):
+        self.assertIsNone(tps.which('prog'))
+        path = self.install(self.second, 'prog', 2000)
+        self.assertEqual(tps.which('prog'), path)
+
+    def test_which_notices_shadowing(self):
+        self.install(self.second, 'prog', 1000)
+        tps.which('prog')
+        path = self.install(self.first, 'prog', 2000)
+        self.assertEqual(tps.which('prog'), path)
+
+    def test_which_notices_path_change(self):
+        path = self.install(self.second, 'prog', 1000)
+        self.assertEqual(tps.which('prog'), path)
+        os.environ['PATH'] = self.first
+        self.assertIsNone(tps.which('prog'))
+
+    def test_which_notices_appended_directory(self):
+        os.environ['PATH'] = self.first
+        self.assertIsNone(tps.which('prog'))
+        path = self.install(self.second, 'prog', 1000)
+        os.environ['PATH'] = os.pathsep.join([self.first, self.second])
+        self.assertEqual(tps.which('prog'), path)
+
+
+class StreamOutputTestCase(unittest.TestCase):
+
+    def test_stream_output_lines(self):
+        lines = list(tps.stream_output(['printf', 'a\\nb\\n'], tps.logger))
+        self.assertEqual(lines, [b'a\n', b'b\n'])
+
+    def test_stream_output_failure(self):
+        lines = tps.stream_output(['sh', '-c', 'echo a; exit 3'], tps.logger)
+        self.assertEqual(next(lines), b'a\n')
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            next(lines)
+        self.assertEqual(cm.exception.returncode, 3)
+
+    def test_stream_output_stops_early(self):
+        # `yes` never ends on its own, it has to be terminated.
+        with contextlib.closing(tps.stream_output(['yes'],
+                                                  tps.logger)) as lines:
+            self.assertEqual(next(lines), b'y\n')
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import contextlib
+import io
+import subprocess
+import unittest
+
+import tps
+import tps.trace
+
+
+class TraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tps.trace.enable()
+        self.addCleanup(tps.trace.disable)
+
+    def test_disabled_records_nothing(self):
+        tps.trace.disable()
+        with tps.trace.span('step', 'parse'):
+            pass
+        tps.check_call(['true'], tps.logger)
+        self.assertEqual(tps.trace.spans(), [])
+
+    def test_command_spans(self):
+        tps.check_call(['true'], tps.logger)
+        self.assertEqual(tps.call(['false'], tps.logger), 1)
+        tps.check_output(['printf', 'abc'], tps.logger)
+        with self.assertRaises(subprocess.CalledProcessError):
+            tps.check_call(['sh', '-c', 'exit 3'], tps.logger)
+
+        spans = tps.trace.spans()
+        self.assertEqual([span.name for span in spans],
+                         ['true', 'false', 'printf abc', 'sh -c \'exit 3\''])
+        self.assertTrue(all(span.category == 'command' for span in spans))
+        self.assertEqual([span.args['returncode'] for span in spans],
+                         [0, 1, 0, 3])
+        self.assertEqual(spans[2].args['output_bytes'], 3)
+
+    def test_stream_span_covers_iteration(self):
+        lines = tps.stream_output(['printf', 'a\\nbc\\n'], tps.logger)
+        self.assertEqual(tps.trace.spans(), [])
+        self.assertEqual(list(lines), [b'a\n', b'bc\n'])
+
+        span, = tps.trace.spans()
+        self.assertEqual(span.args, {'returncode': 0, 'output_bytes': 5})
+
+    def test_stream_span_stopped_early(self):
+        with contextlib.closing(tps.stream_output(['yes'],
+                                                  tps.logger)) as lines:
+            next(lines)
+
+        span, = tps.trace.spans()
+        self.assertTrue(span.args['stopped_early'])
+        self.assertEqual(span.args['output_bytes'], 2)
+
+    def test_traced(self):
+        @tps.trace.traced('parse')
+        def parse(lines):
+            return len(lines)
+
+        self.assertEqual(parse([1, 2]), 2)
+        span, = tps.trace.spans()
+        self.assertEqual(span.category, 'parse')
+        self.assertTrue(span.name.endswith('parse'))
+
+    def test_critical_path_merges_overlaps(self):
+        spans = []
+        for start, duration, category in [(0, 2, 'command'), (1, 2, 'command'),
+                                          (5, 1, 'command'), (0, 10, 'action')]:
+            span = tps.trace.Span('step', category)
+            span.start, span.duration = start, duration
+            spans.append(span)
+        self.assertEqual(tps.trace.critical_path(spans), 4)
+
+    def test_chrome_events(self):
+        tps.check_call(['true'], tps.logger)
+        events = tps.trace.to_chrome_events(tps.trace.spans())
+        self.assertEqual(events[0]['ph'], 'M')
+        self.assertEqual(events[1]['name'], 'true')
+        self.assertEqual(events[1]['ph'], 'X')
+        self.assertGreaterEqual(events[1]['dur'], 0)
+
+    def test_print_stats(self):
+        tps.check_call(['true'], tps.logger)
+        tps.check_call(['true'], tps.logger)
+        stream = io.StringIO()
+        tps.trace.print_stats(tps.trace.spans(), 1.0, stream)
+        output = stream.getvalue()
+        self.assertRegex(output, r'spawned programs\s+2')
+        self.assertRegex(output, r'\ntrue\s+2 ')
+        self.assertIn('slowest steps', output)
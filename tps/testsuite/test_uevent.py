@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+import socket
+import unittest
+
+import tps.uevent
+
+
+class UeventTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        message = (b'change@/devices/pci0000:00/0000:00:02.0/drm/card0\0'
+                   b'ACTION=change\0DEVPATH=/devices/pci0000:00/0000:00:02.0/'
+                   b'drm/card0\0SUBSYSTEM=drm\0HOTPLUG=1\0SEQNUM=2811\0')
+        self.assertEqual(tps.uevent.parse(message), {
+            'ACTION': 'change',
+            'DEVPATH': '/devices/pci0000:00/0000:00:02.0/drm/card0',
+            'SUBSYSTEM': 'drm',
+            'HOTPLUG': '1',
+            'SEQNUM': '2811',
+        })
+
+    def test_parse_udev_message(self):
+        self.assertIsNone(tps.uevent.parse(b'libudev\0\xfe\xed\xca\xfe'))
+
+    def test_receive(self):
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        self.assertIsNone(tps.uevent.receive(receiver, 0))
+
+        sender.send(b'libudev\0')
+        sender.send(b'add@/devices/dock.0\0ACTION=add\0SUBSYSTEM=platform\0')
+        self.assertEqual(tps.uevent.receive(receiver, 1),
+                         {'ACTION': 'add', 'SUBSYSTEM': 'platform'})
+        self.assertIsNone(tps.uevent.receive(receiver, 0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Integration tests against a headless X server.
+
+They are skipped unless ``Xvfb``, ``xrandr`` and ``xinput`` are installed. If
+``TPS_XVFB_RECORDS`` names a file, the latency and the server state after each
+operation are written there as JSON.
+'''
+
+import json
+import os
+import subprocess
+import unittest
+
+import tps
+import tps.input
+import tps.screen
+from tps.testsuite import xvfb
+
+MISSING = xvfb.missing_programs()
+
+
+@unittest.skipIf(MISSING, 'not installed: ' + ', '.join(MISSING))
+class XvfbTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = xvfb.XvfbServer()
+        cls.server.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__(None, None, None)
+        path = os.environ.get('TPS_XVFB_RECORDS')
+        if path:
+            with open(path, 'w') as handle:
+                json.dump(cls.server.records, handle, indent=2)
+
+    def setUp(self):
+        self.output = self.server.outputs()[0]
+
+    def test_rotate(self):
+        try:
+            self.server.timed('screen.rotate left', tps.screen.rotate,
+                              self.output, tps.LEFT)
+        except subprocess.CalledProcessError:
+            self.skipTest('the server cannot rotate')
+        state = self.server.records[-1]['state']['outputs'][self.output]
+        self.assertEqual(state['rotation'], 'left')
+        width, height = state['geometry']['output_width'], \
+            state['geometry']['output_height']
+        self.assertGreater(height, width)
+
+        self.server.timed('screen.rotate normal', tps.screen.rotate,
+                          self.output, tps.NORMAL)
+        state = self.server.records[-1]['state']['outputs'][self.output]
+        self.assertEqual(state['rotation'], 'normal')
+
+    def test_disable_enable(self):
+        outputs = self.server.outputs()
+        if len(outputs) < 2:
+            self.skipTest('the server has a single output')
+
+        self.server.timed('screen.disable', tps.screen.disable, outputs[1])
+        state = self.server.records[-1]['state']['outputs']
+        self.assertIsNone(state[outputs[1]]['geometry'])
+
+        self.server.timed('screen.enable', tps.screen.enable, outputs[1],
+                          position=('right-of', outputs[0]))
+        state = self.server.records[-1]['state']['outputs']
+        self.assertEqual(state[outputs[1]]['geometry']['output_x'],
+                         state[outputs[0]]['geometry']['output_width'])
+
+    def test_map_rotate_input_device(self):
+        device = self.server.xtest_pointer()
+        for direction in (tps.LEFT, tps.NORMAL):
+            matrix = tps.input.generate_xinput_coordinate_transformation_matrix(
+                self.output, direction)
+            self.server.timed(
+                'input.map_rotate_input_device ' + direction.xrandr,
+                tps.input.map_rotate_input_device, device, matrix)
+            for actual, expected in zip(
+                    self.server.records[-1]['state']['matrix'], matrix):
+                self.assertAlmostEqual(actual, expected, places=5)
+
+
+class ParseMatrixTestCase(unittest.TestCase):
+
+    def test_parse_matrix(self):
+        props = ("Device 'Virtual core XTEST pointer':\n"
+                 "\tDevice Enabled (115):\t1\n"
+                 "\tCoordinate Transformation Matrix (117):\t0.000000, "
+                 "-1.000000, 1.000000, 1.000000, 0.000000, 0.000000, "
+                 "0.000000, 0.000000, 1.000000\n")
+        self.assertEqual(xvfb.parse_matrix(props), tps.LEFT.rot_mat)
+        self.assertIsNone(xvfb.parse_matrix("Device 'foo':\n"))
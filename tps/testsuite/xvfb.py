@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Headless X server for the integration tests and benchmarks.
+
+:class:`XvfbServer` starts ``Xvfb`` with the RandR extension on a free display
+and points ``DISPLAY`` at it. The screen and input functions of tps then
+run the real ``xrandr`` and ``xinput`` against a real server. Which outputs
+exist depends on the server, a current ``Xvfb`` has a single output called
+``screen``. The only slave input device is the ``Virtual core XTEST pointer``,
+which has a coordinate transformation matrix like any other pointer.
+
+Every operation run through :meth:`XvfbServer.timed` is recorded with its
+wall-clock latency and the server state afterwards.
+'''
+
+import contextlib
+import os
+import shutil
+import subprocess
+import time
+import unittest.mock
+
+import tps
+import tps.input
+import tps.screen
+
+XTEST_POINTER = 'Virtual core XTEST pointer'
+'Input device that every X server has'
+
+REQUIRED = ['Xvfb', 'xrandr', 'xinput']
+'Programs that the integration tier needs'
+
+
+def missing_programs():
+    '''
+    Lists the programs from :data:`REQUIRED` that are not installed.
+
+    :rtype: list
+    '''
+    return [program for program in REQUIRED if shutil.which(program) is None]
+
+
+def parse_matrix(props):
+    '''
+    Extracts the coordinate transformation matrix from the output of
+    ``xinput list-props``.
+
+    :param str props: Output of ``xinput list-props``
+    :returns: Nine matrix elements, ``None`` if the device has no matrix
+    :rtype: list
+    '''
+    for line in props.splitlines():
+        if 'Coordinate Transformation Matrix' in line:
+            return [float(value) for value in line.split(':')[1].split(',')]
+
+
+class XvfbServer(object):
+    '''
+    ``Xvfb`` process with RandR for the duration of a ``with`` block.
+
+    :param str geometry: Size and depth of the screen, for instance
+        ``1366x768x24``
+    :param float timeout: Seconds to wait for the server to come up
+    '''
+
+    def __init__(self, geometry='1366x768x24', timeout=10):
+        self.geometry = geometry
+        self.timeout = timeout
+        self.display = None
+        self.records = []
+        self._process = None
+        self._stack = contextlib.ExitStack()
+
+    def __enter__(self):
+        read_fd, write_fd = os.pipe()
+        self._process = subprocess.Popen(
+            ['Xvfb', '-displayfd', str(write_fd), '-screen', '0',
+             self.geometry, '+extension', 'RANDR', '-nolisten', 'tcp',
+             '-noreset'],
+            pass_fds=[write_fd], stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        os.close(write_fd)
+
+        # The server writes the display number once it accepts clients.
+        with os.fdopen(read_fd) as handle:
+            number = handle.readline().strip()
+        if not number:
+            self._process.kill()
+            self._process.wait()
+            raise RuntimeError('Xvfb did not start')
+
+        self.display = ':' + number
+        self._stack.enter_context(unittest.mock.patch.dict(
+            os.environ, {'DISPLAY': self.display}))
+        self._stack.enter_context(unittest.mock.patch.object(
+            tps.screen.get_internal, 'cached_internal', None))
+        self._stack.enter_context(unittest.mock.patch(
+            'tps.cache.DIRECTORY', os.devnull))
+        self._stack.enter_context(unittest.mock.patch(
+            'tps.drm.DIRECTORY', os.devnull))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._process.terminate()
+        try:
+            self._process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+    def outputs(self):
+        '''
+        Lists the connected outputs of the server.
+
+        :rtype: list
+        '''
+        output = tps.check_output(['xrandr', '--current'], tps.logger)
+        return tps.screen.get_available_screens(output.decode())
+
+    def xtest_pointer(self):
+        '''
+        Gives the ID of the :data:`XTEST_POINTER`.
+
+        :rtype: int
+        '''
+        return tps.input.get_xinput_id(XTEST_POINTER)
+
+    def state(self):
+        '''
+        Reads the state of the outputs and of the :data:`XTEST_POINTER`.
+
+        :returns: Dictionary with the rotation and geometry of each connected
+            output, the geometry being ``None`` for disabled outputs, and the
+            coordinate transformation matrix of the pointer
+        :rtype: dict
+        '''
+        lines = tps.check_output(['xrandr', '--current', '--verbose'],
+                                 tps.logger).splitlines(True)
+        outputs = {}
+        for output in self.outputs():
+            outputs[output] = {
+                'rotation': tps.screen.parse_rotation(lines, output),
+                'geometry': tps.screen.parse_resolution_and_shift(lines,
+                                                                  output),
+            }
+        props = tps.check_output(
+            ['xinput', 'list-props', str(self.xtest_pointer())], tps.logger)
+        return {'outputs': outputs, 'matrix': parse_matrix(props.decode())}
+
+    def timed(self, name, function, *args, **kwargs):
+        '''
+        Runs an operation and records its latency and the resulting state.
+
+        :param str name: Name of the operation in the records
+        :returns: Return value of the function
+        '''
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        latency = time.perf_counter() - start
+        self.records.append({'operation': name, 'latency': latency,
+                             'state': self.state()})
+        return result
@@ -0,0 +1,322 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Tracing of the steps that the programs take.
+
+Every external command, hook, configuration load, parse step and action is a
+*span* with a start time, a duration and some attributes like the exit code
+and the output size of a command. Tracing is off by default, then a span costs
+next to nothing. The entry points enable it with ``--trace FILE``, which
+writes the spans in the `Chrome trace event format`__ that Perfetto and
+``chrome://tracing`` open, and ``--stats``, which prints a summary table when
+the program exits.
+
+__ https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+'''
+
+import functools
+import os
+import subprocess
+import sys
+import time
+
+_origin = time.perf_counter()
+
+_spans = None
+'List of finished spans, ``None`` while tracing is disabled'
+
+
+class Span(object):
+    '''
+    Context manager that records the time spent in its ``with`` block.
+
+    :param str name: Name of the step, for instance the command line
+    :param str category: Kind of the step: ``command``, ``hook``, ``config``,
+        ``parse`` or ``action``
+    :param dict args: Attributes of the step, more can be added to
+        :attr:`args` while the span is running
+    '''
+
+    __slots__ = ['name', 'category', 'args', 'start', 'duration']
+
+    def __init__(self, name, category, args=None):
+        self.name = name
+        self.category = category
+        self.args = args if args is not None else {}
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        if _spans is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if _spans is None or self.start is None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if isinstance(exc_value, subprocess.CalledProcessError):
+            self.args['returncode'] = exc_value.returncode
+        elif exc_type is GeneratorExit:
+            self.args['stopped_early'] = True
+        elif exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _spans.append(self)
+
+
+def span(name, category, **args):
+    '''
+    Creates a :class:`Span`.
+
+    :rtype: Span
+    '''
+    return Span(name, category, args)
+
+
+def traced(category):
+    '''
+    Decorates a function such that each call is a span.
+
+    :param str category: Category of the spans
+    '''
+    def decorator(function):
+        name = '{}.{}'.format(function.__module__, function.__qualname__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _spans is None:
+                return function(*args, **kwargs)
+            with Span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def command_span(shell_command):
+    '''
+    Creates the span of an external command.
+
+    :param str shell_command: Command line as a shell would show it
+    :rtype: Span
+    '''
+    return Span(shell_command, 'command')
+
+
+def record_result(span_, result):
+    '''
+    Adds the exit code or the output size of a finished command to its span.
+
+    :param Span span_: Span of the command
+    :param result: Return value of the function from :mod:`subprocess`
+    '''
+    if isinstance(result, int):
+        span_.args['returncode'] = result
+    elif isinstance(result, bytes):
+        span_.args['returncode'] = 0
+        span_.args['output_bytes'] = len(result)
+
+
+def trace_lines(span_, lines):
+    '''
+    Wraps a generator of output lines such that the span covers the whole
+    iteration and records the output size.
+
+    :param Span span_: Span of the command
+    :param lines: Generator from :func:`tps._stream_output`
+    '''
+    size = 0
+    try:
+        with span_:
+            for line in lines:
+                size += len(line)
+                yield line
+            span_.args['returncode'] = 0
+    finally:
+        span_.args['output_bytes'] = size
+        lines.close()
+
+
+def enabled():
+    '''
+    Tells whether spans are recorded.
+
+    :rtype: bool
+    '''
+    return _spans is not None
+
+
+def enable():
+    '''
+    Starts to record spans.
+    '''
+    global _spans
+    if _spans is None:
+        _spans = []
+
+
+def disable():
+    '''
+    Stops to record spans and drops the recorded ones.
+    '''
+    global _spans
+    _spans = None
+
+
+def spans():
+    '''
+    Gives the spans that have finished so far.
+
+    :rtype: list
+    '''
+    return list(_spans or [])
+
+
+def add_arguments(parser):
+    '''
+    Adds the ``--trace`` and ``--stats`` options to a command line parser.
+
+    :param argparse.ArgumentParser parser: Parser of an entry point
+    '''
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Write a trace of all steps in the Chrome trace '
+                             'event format to FILE.')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print a summary of the spawned programs and '
+                             'the slowest steps on exit.')
+
+
+def set_up(options):
+    '''
+    Enables tracing if the options from :func:`add_arguments` ask for it. The
+    trace and the summary are written when the program exits, even via
+    :func:`sys.exit`.
+
+    :param argparse.Namespace options: Parsed command line
+    '''
+    if not options.trace and not options.stats:
+        return
+
+    import atexit
+
+    enable()
+    atexit.register(_finish, options.trace, options.stats)
+
+
+def _finish(trace_file, stats):
+    end = time.perf_counter()
+    if trace_file:
+        write_chrome_trace(trace_file, spans(), end)
+    if stats:
+        print_stats(spans(), end - _origin, sys.stderr)
+
+
+def to_chrome_events(spans_, end=None):
+    '''
+    Converts spans to complete events of the Chrome trace event format.
+
+    :param list spans_: Spans from :func:`spans`
+    :param float end: End of the process on the :func:`time.perf_counter`
+        clock, adds an event for the whole process
+    :rtype: list
+    '''
+    pid = os.getpid()
+    name = os.path.basename(sys.argv[0])
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid,
+               'args': {'name': name}}]
+    if end is not None:
+        events.append({'name': name, 'cat': 'process', 'ph': 'X',
+                       'ts': 0, 'dur': (end - _origin) * 1e6,
+                       'pid': pid, 'tid': pid, 'args': {'argv': sys.argv}})
+    for span_ in spans_:
+        events.append({'name': span_.name, 'cat': span_.category, 'ph': 'X',
+                       'ts': (span_.start - _origin) * 1e6,
+                       'dur': span_.duration * 1e6,
+                       'pid': pid, 'tid': pid, 'args': span_.args})
+    return events
+
+
+def write_chrome_trace(filename, spans_, end=None):
+    '''
+    Writes spans to a JSON file in the Chrome trace event format.
+
+    :param str filename: Output file
+    :param list spans_: Spans from :func:`spans`
+    :param float end: See :func:`to_chrome_events`
+    '''
+    import json
+
+    with open(filename, 'w') as handle:
+        json.dump({'traceEvents': to_chrome_events(spans_, end),
+                   'displayTimeUnit': 'ms'}, handle)
+
+
+def critical_path(spans_):
+    '''
+    Computes the time during which at least one external command was running.
+
+    The programs are started one after the other, so this is the time that the
+    process spent waiting for them.
+
+    :param list spans_: Spans from :func:`spans`
+    :returns: Time in seconds
+    :rtype: float
+    '''
+    intervals = sorted((span_.start, span_.start + span_.duration)
+                       for span_ in spans_ if span_.category == 'command')
+    total = 0.0
+    current_start = current_end = None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def print_stats(spans_, total, stream, slowest=10):
+    '''
+    Prints a summary of the spans.
+
+    :param list spans_: Spans from :func:`spans`
+    :param float total: Run time of the process in seconds
+    :param stream: File to print to
+    :param int slowest: Number of slowest steps to list
+    '''
+    commands = [span_ for span_ in spans_ if span_.category == 'command']
+    print('{:<24} {:>10}'.format('spawned programs', len(commands)),
+          file=stream)
+    print('{:<24} {:>7.1f} ms'.format('total time', total * 1e3),
+          file=stream)
+    print('{:<24} {:>7.1f} ms'.format('critical path',
+                                      critical_path(spans_) * 1e3),
+          file=stream)
+
+    programs = {}
+    for span_ in commands:
+        program = os.path.basename(span_.name.split()[0])
+        count, duration = programs.get(program, (0, 0.0))
+        programs[program] = (count + 1, duration + span_.duration)
+    if programs:
+        print(file=stream)
+        print('{:<24} {:>10} {:>10}'.format('program', 'spawns', 'time'),
+              file=stream)
+        for program, (count, duration) in sorted(
+                programs.items(), key=lambda item: -item[1][1]):
+            print('{:<24} {:>10} {:>7.1f} ms'.format(
+                program, count, duration * 1e3), file=stream)
+
+    if spans_:
+        print(file=stream)
+        print('slowest steps', file=stream)
+        for span_ in sorted(spans_, key=lambda span_: -span_.duration)[
+                :slowest]:
+            print('{:>9.1f} ms  {:<8} {}'.format(
+                span_.duration * 1e3, span_.category, span_.name),
+                file=stream)
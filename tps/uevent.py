@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Licensed under The GNU Public License Version 2 (or later)
+
+'''
+Kernel uevents from a netlink socket.
+
+The kernel announces every device that is added, removed or changed on a
+netlink socket, before udev processes the event. Any user may listen to
+that. Each message starts with a header like ``change@/devices/…/card0``,
+followed by ``KEY=value`` fields that are separated by null bytes.
+'''
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NETLINK_KOBJECT_UEVENT = 15
+'Netlink protocol of the kernel uevents'
+
+KERNEL_GROUP = 1
+'Multicast group of the events as the kernel sends them'
+
+BUFFER_SIZE = 16384
+'Size of the receive buffer for a single message'
+
+
+def open_socket():
+    '''
+    Opens a netlink socket that receives the kernel uevents.
+
+    :returns: Socket, ``None`` if the system does not support this
+    :rtype: socket.socket
+    '''
+    import socket
+
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM,
+                             NETLINK_KOBJECT_UEVENT)
+    except (AttributeError, OSError) as e:
+        logger.debug('Unable to open a uevent socket: %s', e)
+        return None
+    try:
+        sock.bind((0, KERNEL_GROUP))
+    except OSError as e:
+        logger.debug('Unable to listen to uevents: %s', e)
+        sock.close()
+        return None
+    return sock
+
+
+def parse(message):
+    '''
+    Parses a uevent message.
+
+    >>> parse(b'change@/devices/card0\\0ACTION=change\\0SUBSYSTEM=drm\\0')
+    {'ACTION': 'change', 'SUBSYSTEM': 'drm'}
+
+    :param bytes message: Message as received from the socket
+    :returns: Fields of the event, ``None`` if this is not a kernel uevent
+    :rtype: dict
+    '''
+    header, *fields = message.split(b'\0')
+    # udev sends its own messages with a ``libudev`` header.
+    if b'@' not in header:
+        return None
+    event = {}
+    for field in fields:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            event[key.decode()] = value.decode(errors='replace')
+    return event
+
+
+def receive(sock, timeout):
+    '''
+    Waits for the next kernel uevent.
+
+    :param socket.socket sock: Socket from :func:`open_socket`
+    :param float timeout: Maximum time to wait in seconds
+    :returns: Fields of the event, ``None`` if there was none within the
+        timeout
+    :rtype: dict
+    '''
+    import select
+    import time
+
+    deadline = time.monotonic() + timeout
+    while True:
+        readable, writable, exceptional = select.select(
+            [sock], [], [], max(deadline - time.monotonic(), 0))
+        if not readable:
+            return None
+        event = parse(sock.recv(BUFFER_SIZE))
+        if event is not None:
+            return event
@@ -31,9 +31,10 @@ def toggle(program, state):
         try:
             tps.check_output(['pgrep', program], logger)
         except subprocess.CalledProcessError:
-            if tps.has_program(program):
-                logger.debug(program)
-                subprocess.Popen([program])
+            path = tps.which(program)
+            if path is not None:
+                logger.debug(path)
+                subprocess.Popen([path])
             else:
                 logger.warning('{} is not installed'.format(program))
     else: